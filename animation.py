@@ -0,0 +1,372 @@
+'''
+Headless animation exporter.
+
+Renders density frames of a map from chaotic_maps.default_maps while its
+parameters are interpolated linearly between keyframes, and writes them
+into an animated GIF or an MP4 video. Frames are rendered in a pool of
+worker processes and written in order as soon as they are ready, with only
+a few frames in flight at a time:
+
+    py animation.py "Clifford Attractor" --keyframe a=-1.4,b=1.6 --keyframe a=-1.8,b=1.6 --frames 60 --output clifford.gif
+
+A keyframe is given as comma separated name=value pairs. Every keyframe
+has to set the same parameters, the ones of the GUI: a, b, c, d, x0, y0
+and, for maps that require multi point sim, xmin, xmax, ymin, ymax, step_size.
+MP4 videos are encoded by ffmpeg, which has to be on the PATH.
+'''
+import argparse
+import collections
+import os
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import GifImagePlugin, Image
+import chaotic_maps
+import density
+from batch_render import PARAMETERS
+
+
+def parse_keyframe(text: str) -> dict:
+    '''
+    Parse a keyframe of format name=value,name=value,...
+
+    :param text: str keyframe
+    :return: dict of parameter names and float values
+    '''
+    keyframe = {}
+    for part in text.split(','):
+        name, separator, value = part.partition('=')
+        name = name.strip()
+        if not separator or name not in PARAMETERS:
+            raise ValueError(f'Invalid keyframe {text!r}. Expected name=value,... with names of {", ".join(PARAMETERS)}.')
+        keyframe[name] = float(value)
+    return keyframe
+
+
+def interpolate(keyframes: list, frame_n: int) -> list:
+    '''
+    Interpolate parameter values linearly between keyframes.
+    Keyframes are evenly spaced, the first frame has the values of the
+    first keyframe and the last frame the values of the last one.
+
+    :param keyframes: list of dicts of parameter names and values, all with the same names
+    :param frame_n: int number of frames
+    :return: list of frame_n dicts of parameter names and values
+    '''
+    if not keyframes:
+        raise ValueError('At least one keyframe is required.')
+    names = list(keyframes[0])
+    if any(set(keyframe) != set(names) for keyframe in keyframes):
+        raise ValueError('Every keyframe has to set the same parameters.')
+    positions = np.linspace(0, len(keyframes) - 1, frame_n)
+    columns = {
+        name: np.interp(positions, np.arange(len(keyframes)), [keyframe[name] for keyframe in keyframes])
+        for name in names
+    }
+    return [{name: float(columns[name][i]) for name in names} for i in range(frame_n)]
+
+
+def make_map(map_name: str, values: dict) -> chaotic_maps.ChaoticMap:
+    '''
+    Create a map from chaotic_maps.default_maps with given parameter values.
+
+    :param map_name: str name of a map in chaotic_maps.default_maps
+    :param values: dict of parameter names and values
+    :return: instance inheriting from the abstract ChaoticMap class
+    '''
+    chaotic_map = chaotic_maps.default_maps[map_name]()
+    for name, value in values.items():
+        chaotic_map.set_attribute(name, value)
+    return chaotic_map
+
+
+def fit_bounds(map_name: str, keyframes: list, iter_n: int) -> tuple:
+    '''
+    Fit bounds enclosing the points of all keyframes, so every frame
+    of an animation shares the same view.
+
+    :param map_name: str name of a map in chaotic_maps.default_maps
+    :param keyframes: list of dicts of parameter names and values
+    :param iter_n: int number of iterations simulated per keyframe
+    :return: tuple of format (xmin, xmax, ymin, ymax)
+    '''
+    xs, ys = [], []
+    for keyframe in keyframes:
+        keyframe_xs, keyframe_ys = chaotic_maps.Simulator(make_map(map_name, keyframe), iter_n).simulate()
+        finite = np.isfinite(keyframe_xs) & np.isfinite(keyframe_ys)
+        xs.append(keyframe_xs[finite])
+        ys.append(keyframe_ys[finite])
+    xs, ys = np.concatenate(xs), np.concatenate(ys)
+    if not xs.size:
+        raise ValueError(f'All orbits of {map_name} diverged, bounds have to be given.')
+    return density.DensityAccumulator().fit_bounds(xs, ys)
+
+
+def make_frame_jobs(
+    map_name: str,
+    keyframes: list,
+    frame_n: int,
+    iter_n: int,
+    width: int,
+    height: int,
+    bounds: tuple = None
+) -> list:
+    '''
+    Make a render job for every frame of an animation.
+    If bounds are not given, they are fitted to the keyframes.
+
+    :param map_name: str name of a map in chaotic_maps.default_maps
+    :param keyframes: list of dicts of parameter names and values
+    :param frame_n: int number of frames
+    :param iter_n: int number of iterations for simulation of a frame
+    :param width: int image width
+    :param height: int image height
+    :param bounds: tuple of format (xmin, xmax, ymin, ymax) or None
+    :return: list of dicts with map_name, values, iter_n, width, height and bounds
+    '''
+    if map_name not in chaotic_maps.default_maps:
+        raise ValueError(f'Unknown map {map_name!r}. Expected one of {", ".join(chaotic_maps.default_maps)}.')
+    parameters = chaotic_maps.default_maps[map_name]().get_parameters()
+    frames = interpolate(keyframes, frame_n)
+    for name in keyframes[0]:
+        if name not in parameters:
+            raise ValueError(f'{map_name} has no parameter {name}. Expected one of {", ".join(parameters)}.')
+    if bounds is None:
+        bounds = fit_bounds(map_name, keyframes, min(iter_n, 100000))
+    return [
+        {'map_name': map_name, 'values': values, 'iter_n': iter_n, 'width': width, 'height': height, 'bounds': tuple(bounds)}
+        for values in frames
+    ]
+
+
+def render_frame(job: dict) -> np.ndarray:
+    '''
+    Simulate the map of a frame job and render its density image.
+
+    :param job: dict made by make_frame_jobs
+    :return: np.ndarray of dtype uint8 and shape (height, width), see density.to_grayscale
+    '''
+    simulator = chaotic_maps.Simulator(make_map(job['map_name'], job['values']), job['iter_n'])
+    accumulator = density.DensityAccumulator(job['width'], job['height'], job['bounds'])
+    return density.to_grayscale(density.accumulate(simulator, accumulator).image())
+
+
+def iter_frames(jobs: list, workers: int = None, in_flight: int = None):
+    '''
+    Render frames in a pool of worker processes and yield them in order.
+    At most in_flight frames are rendered or waiting to be consumed
+    at a time, so memory doesn't grow with the number of frames.
+
+    :param jobs: list of dicts made by make_frame_jobs
+    :param workers: int number of worker processes, None for one per CPU
+    :param in_flight: int maximum number of frames in flight, by default twice the workers
+    :return: generator of np.ndarray frames
+    '''
+    if workers == 1:
+        for job in jobs:
+            yield render_frame(job)
+        return
+    workers = workers or os.cpu_count() or 1
+    in_flight = max(in_flight or 2 * workers, 1)
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for job in jobs:
+            pending.append(pool.submit(render_frame, job))
+            if len(pending) >= in_flight:
+                break
+        while pending:
+            frame = pending.popleft().result()
+            job = next(jobs, None)
+            if job is not None:
+                pending.append(pool.submit(render_frame, job))
+            yield frame
+
+
+class GifWriter:
+    '''
+    Represents an animated GIF file written frame by frame.
+    Frames are 8-bit grayscale and share the grayscale palette
+    of the file, so only the current frame is in memory.
+    '''
+    def __init__(self, path: str, fps: float = 25, loop: int = 0) -> None:
+        '''
+        Initialize a GIF writer. The file is created with the first frame.
+
+        :param path: str path of the GIF file
+        :param fps: float frames per second
+        :param loop: int number of loops, 0 for an endless loop
+        '''
+        self.path = path
+        # GIF durations are stored in hundredths of a second.
+        self.duration = 10 * max(round(100 / fps), 1)
+        self.loop = loop
+        self.file = None
+        self.size = None
+
+    def write(self, frame: np.ndarray) -> None:
+        '''
+        Append a frame.
+
+        :param frame: np.ndarray of dtype uint8 and shape (height, width)
+        '''
+        image = Image.fromarray(np.ascontiguousarray(frame, dtype=np.uint8))
+        if self.file is None:
+            self.file = open(self.path, 'wb')
+            self.size = image.size
+            header, _ = GifImagePlugin.getheader(image, info={'loop': self.loop, 'duration': self.duration, 'optimize': False})
+            self.file.writelines(header)
+        elif image.size != self.size:
+            raise ValueError(f'Frame size {image.size} differs from {self.size}.')
+        self.file.writelines(GifImagePlugin.getdata(image, duration=self.duration))
+
+    def close(self) -> None:
+        '''
+        Finish the file.
+        '''
+        if self.file is not None:
+            self.file.write(b';')
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class Mp4Writer:
+    '''
+    Represents an MP4 video encoded by ffmpeg frame by frame.
+    Raw frames are piped into ffmpeg, so only the current frame is in memory.
+    '''
+    def __init__(self, path: str, fps: float = 25) -> None:
+        '''
+        Initialize an MP4 writer. ffmpeg is started with the first frame.
+
+        :param path: str path of the MP4 file
+        :param fps: float frames per second
+        '''
+        self.ffmpeg = shutil.which('ffmpeg')
+        if self.ffmpeg is None:
+            raise RuntimeError('ffmpeg is required to write MP4 videos, but it was not found on the PATH.')
+        self.path = path
+        self.fps = fps
+        self.process = None
+        self.size = None
+
+    def write(self, frame: np.ndarray) -> None:
+        '''
+        Append a frame.
+
+        :param frame: np.ndarray of dtype uint8 and shape (height, width)
+        '''
+        height, width = frame.shape
+        if self.process is None:
+            self.size = (width, height)
+            # yuv420p, which players expect, needs even dimensions.
+            self.process = subprocess.Popen([
+                self.ffmpeg, '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'gray', '-s', f'{width}x{height}', '-r', str(self.fps), '-i', '-',
+                '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2:color=white', '-pix_fmt', 'yuv420p', '-vcodec', 'libx264',
+                self.path
+            ], stdin=subprocess.PIPE)
+        elif (width, height) != self.size:
+            raise ValueError(f'Frame size {(width, height)} differs from {self.size}.')
+        self.process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+
+    def close(self) -> None:
+        '''
+        Finish the video and wait for ffmpeg.
+        '''
+        if self.process is not None:
+            self.process.stdin.close()
+            returncode = self.process.wait()
+            self.process = None
+            if returncode != 0:
+                raise RuntimeError(f'ffmpeg failed with exit code {returncode}.')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def open_writer(path: str, fps: float = 25):
+    '''
+    Open a frame writer for the extension of a path, .gif or .mp4.
+
+    :param path: str path of the animation file
+    :param fps: float frames per second
+    :return: GifWriter or Mp4Writer
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.gif':
+        return GifWriter(path, fps)
+    if extension == '.mp4':
+        return Mp4Writer(path, fps)
+    raise ValueError(f'Unsupported animation format {extension!r}. Expected .gif or .mp4.')
+
+
+def export_animation(jobs: list, path: str, fps: float = 25, workers: int = None, in_flight: int = None) -> int:
+    '''
+    Render frames and write them into an animation file in order.
+
+    :param jobs: list of dicts made by make_frame_jobs
+    :param path: str path of the GIF or MP4 file
+    :param fps: float frames per second
+    :param workers: int number of worker processes, None for one per CPU
+    :param in_flight: int maximum number of frames in flight, see iter_frames
+    :return: int number of written frames
+    '''
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    frame_n = 0
+    with open_writer(path, fps) as writer:
+        for frame in iter_frames(jobs, workers, in_flight):
+            writer.write(frame)
+            frame_n += 1
+    return frame_n
+
+
+def parse_bounds(text: str) -> tuple:
+    '''
+    Parse bounds of format xmin,xmax,ymin,ymax.
+
+    :param text: str bounds
+    :return: tuple of 4 floats
+    '''
+    bounds = tuple(float(value) for value in text.split(','))
+    if len(bounds) != 4:
+        raise ValueError(f'Invalid bounds {text!r}. Expected xmin,xmax,ymin,ymax.')
+    return bounds
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Export an animation of a chaotic map whose parameters move between keyframes.')
+    parser.add_argument('map', choices=list(chaotic_maps.default_maps), help='name of the map')
+    parser.add_argument('--keyframe', action='append', default=[], type=parse_keyframe, required=True, help='name=value,name=value,...')
+    parser.add_argument('--frames', type=int, default=50, help='number of frames')
+    parser.add_argument('--fps', type=float, default=25, help='frames per second')
+    parser.add_argument('--iter-n', type=int, default=200000, help='number of iterations for simulation of a frame')
+    parser.add_argument('--width', type=int, default=512, help='image width')
+    parser.add_argument('--height', type=int, default=512, help='image height')
+    parser.add_argument('--bounds', type=parse_bounds, default=None, help='xmin,xmax,ymin,ymax, by default fitted to the keyframes')
+    parser.add_argument('--output', default='animation.gif', help='path of the .gif or .mp4 file')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes, by default one per CPU')
+    parser.add_argument('--in-flight', type=int, default=None, help='maximum number of frames in flight, by default twice the workers')
+    args = parser.parse_args(argv)
+
+    jobs = make_frame_jobs(args.map, args.keyframe, args.frames, args.iter_n, args.width, args.height, args.bounds)
+    frame_n = export_animation(jobs, args.output, args.fps, args.workers, args.in_flight)
+    print(f'Wrote {frame_n} frames into {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+'''
+Headless batch renderer for parameter sweeps.
+
+Renders density PNGs of a map from chaotic_maps.default_maps for every
+combination of a parameter grid, in a pool of worker processes.
+Doesn't need a display and doesn't import PyQt5 or pyqtgraph:
+
+    py batch_render.py "Clifford Attractor" --param a=-2:-1:5 --param b=-2.4,-2.2 --output-dir renders
+
+A parameter is given as name=value, as a comma separated list of values,
+or as start:stop:count for count evenly spaced values from start to stop.
+Parameters are the ones of the GUI: a, b, c, d, x0, y0 and, for maps that
+require multi point sim, xmin, xmax, ymin, ymax, step_size.
+'''
+import argparse
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import chaotic_maps
+import density
+
+PARAMETERS = ['a', 'b', 'c', 'd', 'x0', 'y0', 'xmin', 'xmax', 'ymin', 'ymax', 'step_size']
+
+
+def parse_param(text: str) -> tuple:
+    '''
+    Parse a parameter of format name=value, name=v1,v2,... or name=start:stop:count.
+
+    :param text: str parameter
+    :return: tuple of name (str) and values (list of float)
+    '''
+    name, separator, values = text.partition('=')
+    name = name.strip()
+    if not separator or name not in PARAMETERS:
+        raise ValueError(f'Invalid parameter {text!r}. Expected name=value with name one of {", ".join(PARAMETERS)}.')
+    if ':' in values:
+        start, stop, count = values.split(':')
+        return name, [float(value) for value in np.linspace(float(start), float(stop), int(count))]
+    return name, [float(value) for value in values.split(',')]
+
+
+def make_jobs(map_name: str, params: list, iter_n: int, width: int, height: int, output_dir: str) -> list:
+    '''
+    Make a render job for every combination of parameter values.
+
+    :param map_name: str name of a map in chaotic_maps.default_maps
+    :param params: list of tuples of name (str) and values (list of float)
+    :param iter_n: int number of iterations for simulation
+    :param width: int image width
+    :param height: int image height
+    :param output_dir: str directory of the PNG files
+    :return: list of dicts with map_name, values, iter_n, width, height and path
+    '''
+    if map_name not in chaotic_maps.default_maps:
+        raise ValueError(f'Unknown map {map_name!r}. Expected one of {", ".join(chaotic_maps.default_maps)}.')
+    parameters = chaotic_maps.default_maps[map_name]().get_parameters()
+    for name, _ in params:
+        if name not in parameters:
+            raise ValueError(f'{map_name} has no parameter {name}. Expected one of {", ".join(parameters)}.')
+    names = [name for name, _ in params]
+    jobs = []
+    paths = set()
+    for combination in itertools.product(*[values for _, values in params]):
+        values = dict(zip(names, combination))
+        jobs.append({
+            'map_name': map_name,
+            'values': values,
+            'iter_n': iter_n,
+            'width': width,
+            'height': height,
+            'path': os.path.join(output_dir, job_file_name(map_name, values))
+        })
+        if jobs[-1]['path'] in paths:
+            raise ValueError(f'Parameter values {values} are given more than once.')
+        paths.add(jobs[-1]['path'])
+    return jobs
+
+
+def job_file_name(map_name: str, values: dict) -> str:
+    '''
+    Get the PNG file name of a render job, such as
+    clifford_attractor_a=-2_b=-2.4.png
+    Values are written in full precision, so different values
+    never share a file name.
+
+    :param map_name: str name of a map
+    :param values: dict of parameter names and values
+    :return: str file name
+    '''
+    parts = [map_name.lower().replace(' ', '_').replace('-', '_')]
+    parts += [f'{name}={_format_value(value)}' for name, value in values.items()]
+    return '_'.join(parts) + '.png'
+
+
+def _format_value(value: float) -> str:
+    # The shortest repr that parses back to the same float, without a trailing .0
+    text = repr(float(value))
+    return text[:-2] if text.endswith('.0') else text
+
+
+def render_job(job: dict) -> str:
+    '''
+    Simulate the map of a render job and save its density image.
+    The image is written to a temporary file first, so an interrupted
+    job never leaves a partial PNG behind.
+
+    :param job: dict made by make_jobs
+    :return: str path of the PNG file
+    '''
+    chaotic_map = chaotic_maps.default_maps[job['map_name']]()
+    for name, value in job['values'].items():
+        chaotic_map.set_attribute(name, value)
+    simulator = chaotic_maps.Simulator(chaotic_map, job['iter_n'])
+    accumulator = density.accumulate(simulator, density.DensityAccumulator(job['width'], job['height']))
+    temporary_path = f"{job['path']}.{os.getpid()}.tmp"
+    density.save_png(accumulator.image(), temporary_path)
+    os.replace(temporary_path, job['path'])
+    return job['path']
+
+
+def render_jobs(jobs: list, workers: int = None, skip_existing: bool = False) -> list:
+    '''
+    Render jobs in a pool of worker processes.
+
+    :param jobs: list of dicts made by make_jobs
+    :param workers: int number of worker processes, None for one per CPU
+    :param skip_existing: bool whether to skip jobs whose PNG file exists
+    :return: list of str paths of the rendered PNG files
+    '''
+    if skip_existing:
+        jobs = [job for job in jobs if not os.path.exists(job['path'])]
+    for directory in {os.path.dirname(job['path']) for job in jobs}:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    if workers == 1:
+        return [render_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_job, jobs))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Render density PNGs of a chaotic map over a parameter grid.')
+    parser.add_argument('map', choices=list(chaotic_maps.default_maps), help='name of the map')
+    parser.add_argument('--param', action='append', default=[], type=parse_param, help='name=value, name=v1,v2,... or name=start:stop:count')
+    parser.add_argument('--iter-n', type=int, default=1000000, help='number of iterations for simulation')
+    parser.add_argument('--width', type=int, default=512, help='image width')
+    parser.add_argument('--height', type=int, default=512, help='image height')
+    parser.add_argument('--output-dir', default='renders', help='directory of the PNG files')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes, by default one per CPU')
+    parser.add_argument('--skip-existing', action='store_true', help='skip jobs whose PNG file already exists')
+    args = parser.parse_args(argv)
+
+    jobs = make_jobs(args.map, args.param, args.iter_n, args.width, args.height, args.output_dir)
+    paths = render_jobs(jobs, args.workers, args.skip_existing)
+    print(f'Rendered {len(paths)} of {len(jobs)} images into {args.output_dir}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,340 @@
+'''
+Benchmark suite for chaotic map simulations.
+
+Reports points per second for every map in chaotic_maps.default_maps,
+for single orbit and multi point (simulate_in_range) simulations, several
+iteration counts and grid densities, and every engine backend. It also
+times the GUI path from MainWindow.simulate_map to the plot update,
+headless. Results are saved as JSON and can be compared against
+a stored baseline:
+
+    py benchmarks.py --output results.json
+    py benchmarks.py --baseline results.json --tolerance 0.25
+
+It also compares float32 simulations against float64 ones:
+
+    py benchmarks.py --precision
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+import chaotic_maps
+import density
+
+# Engine backends as keyword arguments of Simulator.
+BACKENDS = {
+    'scalar': {'batch': False},
+    'batch': {'batch': True},
+    'parallel': {'batch': True, 'workers': None}
+}
+
+# Grid for maps that don't require multi point sim,
+# as offsets (xmin, xmax, ymin, ymax, step_size) around their origin.
+SINGLE_MAP_RANGE = (-0.2, 0.2, -0.2, 0.2, 0.05)
+
+
+def get_sim_range(chaotic_map: chaotic_maps.ChaoticMap, density: float) -> tuple:
+    '''
+    Get the sim range of a map for a given grid density.
+    The density divides the step size, so density 2 has
+    four times as many starting points as density 1.
+
+    :param chaotic_map: instance inheriting from the abstract ChaoticMap class
+    :param density: float grid density
+    :return: tuple of format (xmin, xmax, ymin, ymax, step_size)
+    '''
+    if chaotic_map.is_multi_point_sim:
+        xmin, xmax, ymin, ymax, step_size = chaotic_map.default_range
+    else:
+        xmin, xmax, ymin, ymax, step_size = SINGLE_MAP_RANGE
+        xmin, xmax = xmin + chaotic_map.x0, xmax + chaotic_map.x0
+        ymin, ymax = ymin + chaotic_map.y0, ymax + chaotic_map.y0
+    return (xmin, xmax, ymin, ymax, step_size / density)
+
+
+def time_call(function, repeat: int) -> tuple:
+    '''
+    Call a function several times and get the best time.
+
+    :param function: function without arguments returning (xs, ys)
+    :param repeat: int number of calls
+    :return: tuple of best time in seconds (float) and number of points (int)
+    '''
+    best = float('inf')
+    points = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        xs, ys = function()
+        best = min(best, time.perf_counter() - start)
+        points = len(xs)
+    return best, points
+
+
+def make_record(map_name: str, mode: str, backend: str, iter_n: int, density, seconds: float, points: int) -> dict:
+    '''
+    Make a benchmark result record.
+
+    :return: dict with name, parameters, seconds, points and points_per_second
+    '''
+    return {
+        'name': f'{map_name}|{mode}|{backend}|iter_n={iter_n}|density={density}',
+        'map': map_name,
+        'mode': mode,
+        'backend': backend,
+        'iter_n': iter_n,
+        'density': density,
+        'seconds': seconds,
+        'points': points,
+        'points_per_second': points / seconds if seconds > 0 else float('inf')
+    }
+
+
+def run_kernel_benchmarks(iter_ns=(10000, 100000), densities=(1, 2), backends=tuple(BACKENDS), maps=None, repeat: int = 3) -> list:
+    '''
+    Benchmark single orbit and multi point simulations of maps.
+    Single orbit simulations don't depend on the grid density
+    and always run one orbit, so they are only run once per
+    iteration count with the scalar backend. All simulations run
+    with the default Simulator options, since simulate_single
+    supports no dtype, burn in, decimation or escape radius.
+    Multi point simulations run iter_n / 100 iterations per starting
+    point, like Simulator.simulate.
+
+    :param iter_ns: sequence of int iteration counts
+    :param densities: sequence of float grid densities, see get_sim_range
+    :param backends: sequence of str backend names, keys of BACKENDS
+    :param maps: dict of map names and classes, by default chaotic_maps.default_maps
+    :param repeat: int number of runs, the best one is reported
+    :return: list of result records
+    '''
+    maps = maps if maps is not None else chaotic_maps.default_maps
+    records = []
+    for map_name, Map in maps.items():
+        for iter_n in iter_ns:
+            seconds, points = time_call(lambda: chaotic_maps.Simulator(Map(), iter_n, batch=False).simulate_single(), repeat)
+            records.append(make_record(map_name, 'single', 'scalar', iter_n, None, seconds, points))
+            for density in densities:
+                for backend in backends:
+                    chaotic_map = Map()
+                    sim_range = get_sim_range(chaotic_map, density)
+                    simulator = chaotic_maps.Simulator(chaotic_map, max(1, iter_n // 100), **BACKENDS[backend])
+                    seconds, points = time_call(lambda: simulator.simulate_in_range(sim_range), repeat)
+                    records.append(make_record(map_name, 'in_range', backend, iter_n, density, seconds, points))
+    return records
+
+
+def run_gui_benchmarks(maps=None, repeat: int = 3) -> list:
+    '''
+    Time the GUI path from MainWindow.simulate_map to the plot update
+    for every map, without a display. Also time a full background
+    redraw through MainWindow.draw_map.
+    Returns an empty list if PyQt5 or pyqtgraph are not installed.
+
+    :param maps: sequence of map names, by default all default maps
+    :param repeat: int number of runs, the best one is reported
+    :return: list of result records
+    '''
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PyQt5 import QtWidgets
+        import gui
+    except ImportError:
+        return []
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    window = gui.MainWindow()
+    window.resize(800, 600)
+    window.show()
+    wait_for_simulation(app, window)
+    records = []
+    for map_name in maps if maps is not None else window.default_maps:
+        window.dropdown_list_box.setCurrentText(map_name)
+        wait_for_simulation(app, window)
+
+        def simulate_and_plot():
+            xs, ys = window.simulate_map()
+            window.points_item.setData(xs, ys)
+            app.processEvents()
+            return xs, ys
+        seconds, points = time_call(simulate_and_plot, repeat)
+        records.append(make_record(map_name, 'gui', 'simulate_map', 50000, None, seconds, points))
+
+        def draw():
+            window.result_cache.clear()
+            window.draw_map()
+            wait_for_simulation(app, window)
+            return window.points_item.getData()
+        seconds, points = time_call(draw, repeat)
+        records.append(make_record(map_name, 'gui', 'draw_map', 50000, None, seconds, points))
+    window.close()
+    return records
+
+
+def run_precision_comparison(maps=None, iter_n: int = 1000000, size: int = 256) -> list:
+    '''
+    Compare float32 simulations of maps against float64 ones.
+    Chaotic orbits of both precisions part after a few dozen iterations,
+    so they are compared as density images instead of point by point:
+    the difference is the total variation distance of their normalized
+    histograms, from 0 (identical) to 1 (disjoint). The same distance
+    between two float64 simulations whose origins differ by 1e-9 is the
+    reference, since it is the difference chaos and sampling alone cause.
+    A map stays visually identical in float32 if its difference is at most
+    twice the reference, or below 0.01.
+
+    :param maps: dict of map names and classes, by default chaotic_maps.default_maps
+    :param iter_n: int number of iterations for simulation
+    :param size: int width and height of the density images
+    :return: list of dicts with map, compute, difference, reference,
+        visually_identical, bytes_float64 and bytes_float32
+    '''
+    maps = maps if maps is not None else chaotic_maps.default_maps
+    records = []
+    for map_name, Map in maps.items():
+        simulator = chaotic_maps.Simulator(Map(), iter_n)
+        float32_simulator = chaotic_maps.Simulator(Map(), iter_n, dtype=np.float32)
+        x0s, y0s = simulator.get_origins()
+        lane_iter_n = simulator.get_lane_iter_n()
+        results = {
+            'float64': simulator.simulate_lanes(x0s, y0s, lane_iter_n),
+            'float32': float32_simulator.simulate_lanes(x0s, y0s, lane_iter_n),
+            'perturbed': simulator.simulate_lanes(x0s + 1e-9, y0s, lane_iter_n)
+        }
+        reference = density.DensityAccumulator(size, size)
+        reference.add(*results['float64'])
+        distances = {}
+        for name in ['float32', 'perturbed']:
+            accumulator = density.DensityAccumulator(size, size, reference.bounds)
+            accumulator.add(*results[name])
+            distances[name] = total_variation(reference.counts, accumulator.counts)
+        records.append({
+            'map': map_name,
+            'compute': 'float32' if float32_simulator.has_batch_step() and x0s.size > 1 else 'float64, rounded',
+            'difference': distances['float32'],
+            'reference': distances['perturbed'],
+            'visually_identical': distances['float32'] <= max(2 * distances['perturbed'], 0.01),
+            'bytes_float64': results['float64'][0].nbytes + results['float64'][1].nbytes,
+            'bytes_float32': results['float32'][0].nbytes + results['float32'][1].nbytes
+        })
+    return records
+
+
+def total_variation(counts, other_counts) -> float:
+    '''
+    Get the total variation distance of two histograms, normalized to sum 1.
+
+    :param counts: np.ndarray histogram counts
+    :param other_counts: np.ndarray histogram counts of the same shape
+    :return: float distance in range [0, 1]
+    '''
+    return 0.5 * float(np.abs(counts / max(counts.sum(), 1) - other_counts / max(other_counts.sum(), 1)).sum())
+
+
+def wait_for_simulation(app, window, timeout: float = 600) -> None:
+    '''
+    Process Qt events until the background simulation of a window finished.
+
+    :param app: QApplication
+    :param window: gui.MainWindow
+    :param timeout: float maximum number of seconds to wait
+    '''
+    start = time.perf_counter()
+    while window.worker is not None and time.perf_counter() - start < timeout:
+        app.processEvents()
+        time.sleep(0.001)
+    app.processEvents()
+
+
+def compare_results(results: list, baseline: list, tolerance: float = 0.25) -> list:
+    '''
+    Compare benchmark results against a baseline.
+    A result is a regression when its points per second are more than
+    tolerance lower than the ones of the baseline result with the same name.
+    Results without a baseline are ignored.
+
+    :param results: list of result records
+    :param baseline: list of baseline result records
+    :param tolerance: float allowed relative slowdown
+    :return: list of dicts with name, points_per_second, baseline_points_per_second and ratio
+    '''
+    baseline = {record['name']: record for record in baseline}
+    regressions = []
+    for record in results:
+        reference = baseline.get(record['name'])
+        if reference is None:
+            continue
+        ratio = record['points_per_second'] / reference['points_per_second']
+        if ratio < 1 - tolerance:
+            regressions.append({
+                'name': record['name'],
+                'points_per_second': record['points_per_second'],
+                'baseline_points_per_second': reference['points_per_second'],
+                'ratio': ratio
+            })
+    return regressions
+
+
+def environment() -> dict:
+    '''
+    Describe the machine the benchmarks run on.
+
+    :return: dict with python, numpy, platform and cpu_count
+    '''
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark chaotic map simulations.')
+    parser.add_argument('--output', help='path of the JSON file to save results to')
+    parser.add_argument('--baseline', help='path of a JSON file with baseline results')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown against the baseline')
+    parser.add_argument('--iter-n', type=int, nargs='+', default=[10000, 100000], help='iteration counts')
+    parser.add_argument('--density', type=float, nargs='+', default=[1, 2], help='grid densities')
+    parser.add_argument('--backend', nargs='+', default=list(BACKENDS), choices=list(BACKENDS), help='engine backends')
+    parser.add_argument('--map', nargs='+', choices=list(chaotic_maps.default_maps), help='maps to benchmark, by default all')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    parser.add_argument('--no-gui', action='store_true', help='skip the GUI benchmarks')
+    parser.add_argument('--precision', action='store_true', help='compare float32 against float64 simulations instead')
+    args = parser.parse_args(argv)
+
+    if args.precision:
+        print('| Map | Compute | float32 difference | Reference | Visually identical |')
+        print('| --- | --- | --- | --- | --- |')
+        for record in run_precision_comparison():
+            identical = 'yes' if record['visually_identical'] else 'no'
+            print(f"| {record['map']} | {record['compute']} | {record['difference']:.4f} | {record['reference']:.4f} | {identical} |")
+        return 0
+
+    maps = chaotic_maps.default_maps
+    if args.map:
+        maps = {map_name: maps[map_name] for map_name in args.map}
+    records = run_kernel_benchmarks(args.iter_n, args.density, args.backend, maps, args.repeat)
+    if not args.no_gui:
+        records += run_gui_benchmarks(list(maps), args.repeat)
+    for record in records:
+        print(f"{record['name']:<70} {record['points_per_second']:>14,.0f} points/s")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'environment': environment(), 'results': records}, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        regressions = compare_results(records, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['name']}: {regression['ratio']:.2f}x of baseline")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
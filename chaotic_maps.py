@@ -1,4 +1,12 @@
 from math import sin, cos, pi
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from multiprocessing import shared_memory
+import inspect
+import os
+import struct
+import time
+import weakref
 import numpy as np
 
 class ChaoticMap:
@@ -63,19 +71,28 @@ class ChaoticMap:
     def calculate(self, i: int) -> None:
         '''
         Caclculate next values of i^th iteration.
-        Add the new values to the lists of xs and ys.
+        Store the new values at index i + 1 of the xs and ys buffers.
+        The buffers grow if they are too small.
 
         :param i: int interation index
         '''
         x = self.xs[i]
         y = self.ys[i]
         x_new, y_new = self.step(x, y)
-        self.xs.append(x_new)
-        self.ys.append(y_new)
+        self.reserve(i + 2)
+        self.xs[i + 1] = x_new
+        self.ys[i + 1] = y_new
+        self.n_points = i + 2
 
     def step(self, x, y):
         '''
         Perform calculations with given x and y.
+        Subclasses may also define step_batch(xs, ys), which
+        performs the same calculations on np.ndarray values.
+        The Simulator uses it whenever it is present.
+        jacobian_batch(xs, ys) returns the partial derivatives
+        (dx/dx, dx/dy, dy/dx, dy/dy) of step_batch, which
+        lyapunov uses to calculate Lyapunov exponents.
 
         :param x: float x value
         :param y: float y value
@@ -83,19 +100,52 @@ class ChaoticMap:
         return x,y 
     def reset_origin(self, x0, y0) -> None:
         '''
-        Reset map to a specified origin (x0, y0)
+        Reset map to a specified origin (x0, y0).
+        Already allocated trajectory buffers are reused.
 
         :param x0: float origin point x value
         :param y0: float origin point y value
         '''
-        self.xs = [x0]
-        self.ys = [y0]
+        if not hasattr(self, 'xs'):
+            self.xs = np.empty(1)
+            self.ys = np.empty(1)
+        self.xs[0] = x0
+        self.ys[0] = y0
+        self.n_points = 1
+    def reserve(self, n_points: int) -> None:
+        '''
+        Make sure the trajectory buffers can hold n_points points.
+        Buffers are at least doubled when they grow, and the points
+        calculated so far are kept.
+
+        :param n_points: int number of points
+        '''
+        capacity = len(self.xs)
+        if n_points <= capacity:
+            return
+        capacity = max(n_points, 2*capacity)
+        xs = np.empty(capacity)
+        ys = np.empty(capacity)
+        xs[:self.n_points] = self.xs[:self.n_points]
+        ys[:self.n_points] = self.ys[:self.n_points]
+        self.xs = xs
+        self.ys = ys
+    def get_identity(self) -> str:
+        '''
+        Get a str identifying the calculations of the map,
+        its class unless a subclass defines more.
+
+        :return: str identity
+        '''
+        map_class = type(self)
+        return f'{map_class.__module__}.{map_class.__qualname__}'
     def get_points(self):
         '''
-        Return lists of points for x and y axis
-        of the the chaotic map.
+        Return arrays of points for x and y axis
+        of the the chaotic map. The arrays are views
+        of the trajectory buffers.
         '''
-        return self.xs, self.ys
+        return self.xs[:self.n_points], self.ys[:self.n_points]
     def get_attribute(self, attribute):
         '''
         Get a value of a given attribute (str).
@@ -126,6 +176,26 @@ class ChaoticMap:
         '''
         attributes = {'a': self.a, 'b': self.b, 'c': self.c, 'd': self.d, 'x0': self.x0, 'y0': self.y0}
         return attributes
+    def get_constants(self) -> list:
+        '''
+        Get the names of the constants a, b, c, d the map uses,
+        which are the ones its class can be created with.
+
+        :return: list of str names of constants
+        '''
+        parameters = inspect.signature(type(self).__init__).parameters
+        return [name for name in ['a', 'b', 'c', 'd'] if name in parameters]
+    def get_parameters(self) -> list:
+        '''
+        Get the names of the attributes that change the simulation of
+        the map: its constants, and its origin x0, y0 or, if the map
+        requires multi point sim, its sim range xmin, xmax, ymin, ymax, step_size.
+
+        :return: list of str names of attributes
+        '''
+        if self.is_multi_point_sim:
+            return self.get_constants() + ['xmin', 'xmax', 'ymin', 'ymax', 'step_size']
+        return self.get_constants() + ['x0', 'y0']
     def set_attribute(self, attribute, value):
         '''
         Set a value (int) of a given attribute (str).
@@ -153,79 +223,826 @@ class ChaoticMap:
         self.reset_origin(self.x0, self.y0)
 
 
+class SimulationMetrics:
+    '''
+    Represents measurements of the simulations of a Simulator.
+    Measurements add up over all simulations until reset is called.
+    Phases are named parts of a simulation:
+        grid_setup - calculating starting points
+        allocate - allocating and growing trajectory buffers
+        step - calculating iterations
+        cache - looking up and storing cached results
+    '''
+    def __init__(self) -> None:
+        '''
+        Initialize empty metrics.
+        '''
+        self.reset()
+
+    def reset(self) -> None:
+        '''
+        Reset all measurements to zero.
+        '''
+        self.phase_seconds = {}
+        self.wall_seconds = 0.0
+        self.iterations = 0
+        self.points = 0
+        self.peak_buffer_bytes = 0
+        self.diverged = 0
+
+    @contextmanager
+    def measure(self, phase: str):
+        '''
+        Measure the wall time of a phase, used as
+        with metrics.measure('step'): ...
+
+        :param phase: str name of the phase
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + time.perf_counter() - start
+
+    def observe_buffer(self, nbytes: int) -> None:
+        '''
+        Record the size of a trajectory buffer that is in use.
+
+        :param nbytes: int number of bytes of the buffer
+        '''
+        self.peak_buffer_bytes = max(self.peak_buffer_bytes, int(nbytes))
+
+    def iterations_per_second(self) -> float:
+        '''
+        Get the number of iterations per second of the step phase.
+        Every starting point counts, so a simulation of 100 starting
+        points for 10 iterations has 1000 iterations.
+
+        :return: float iterations per second, 0 if nothing was stepped
+        '''
+        seconds = self.phase_seconds.get('step', 0.0)
+        return self.iterations / seconds if seconds > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        '''
+        Get all measurements.
+
+        :return: dict of measurements
+        '''
+        return {
+            'phase_seconds': dict(self.phase_seconds),
+            'wall_seconds': self.wall_seconds,
+            'iterations': self.iterations,
+            'iterations_per_second': self.iterations_per_second(),
+            'points': self.points,
+            'peak_buffer_bytes': self.peak_buffer_bytes,
+            'diverged': self.diverged
+        }
+
+
 class Simulator:
     '''
     Represents a simulator that runs
     calculations for a given chaotic map.
     '''
-    def __init__(self, chaotic_map: ChaoticMap, iter_n: int) -> None:
+    def __init__(self, chaotic_map: ChaoticMap, iter_n: int, workers: int = 1, cache=None, batch: bool = True, metrics: bool = False, escape_radius: float = None, burn_in: int = 0, decimate: int = 1, dtype=np.float64) -> None:
         '''
         Initialize a simulator. An instance of 
         a chaotic map should inherit from the abstract class
         Chaotic Map.
+        Multi point simulations can be split across a pool of
+        worker processes. By default, workers = 1 and everything runs
+        in the current process. If workers is None, one worker per CPU is used.
+        The pool is started by the first parallel simulation and reused
+        by later ones, see close.
+        Results of simulate can be kept in a cache, such as
+        result_cache.ResultCache. By default, nothing is cached.
+        If batch is False, step_batch of the map is never used
+        and every starting point is simulated with step.
+        If metrics is True, simulations are measured in a
+        SimulationMetrics available as the metrics attribute.
+        Otherwise, the metrics attribute is None.
+        If escape_radius is given, a starting point whose orbit gets farther
+        than escape_radius from (0, 0), or stops being finite, escapes.
+        It is no longer calculated, the rest of its trajectory is nan,
+        and simulate and iter_chunks drop those points. Iterations at
+        which starting points escaped are available from get_escape_times.
+        The first burn_in iterations of every orbit are calculated but not
+        kept, and afterwards only every decimate-th point is kept.
+        Skipped points are never stored, so memory shrinks accordingly.
+        Trajectories are stored as dtype, np.float64 or np.float32.
+        With np.float32, step_batch also calculates in single precision,
+        which halves memory and memory bandwidth. The scalar step
+        calculates in double precision and rounds every point.
 
         :param chaotic_map: instance inheriting from the abstract ChaoticMap class
         :param iter_n: int number of iterations for simulation
+        :param workers: int number of worker processes or None
+        :param cache: cache with get(key) and put(key, result) methods or None
+        :param batch: bool whether to use step_batch when the map provides it
+        :param metrics: bool whether to measure simulations
+        :param escape_radius: float distance from (0, 0) at which orbits escape or None
+        :param burn_in: int number of transient iterations dropped from every orbit
+        :param decimate: int keep every decimate-th point after the burn in
+        :param dtype: np.float64 or np.float32 precision of trajectories
         '''
+        if burn_in < 0 or decimate < 1:
+            raise ValueError('Expected burn_in >= 0 and decimate >= 1.')
+        if np.dtype(dtype) not in (np.float64, np.float32):
+            raise ValueError(f'Unsupported dtype {dtype}. Expected float64 or float32.')
         self.chaotic_map = chaotic_map
         self.iter_n = iter_n
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.cache = cache
+        self.batch = batch
+        self.metrics = SimulationMetrics() if metrics else None
+        self.escape_radius = escape_radius
+        self.burn_in = burn_in
+        self.decimate = decimate
+        self.dtype = np.dtype(dtype)
+        # Functions called at the start of a simulation, for every chunk
+        # of iter_chunks and at the end of a simulation, see add_callback.
+        self.callbacks = {'start': [], 'chunk': [], 'finish': []}
+        # Kept points of the trajectories calculated by simulate, one column
+        # per starting point. The last calculated row is the state
+        # simulations continue from.
+        self.result_xs = None
+        self.result_ys = None
+        self.state_rows = 0
+        self.state_key = None
+        self.state_escape_times = None
+        # Iteration at which every starting point of the last calculated
+        # simulation escaped, -1 if it didn't, see get_escape_times.
+        self.escape_times = None
+        # Worker pool and shared memory buffer of simulate_lanes_parallel,
+        # created on first use and released by close or garbage collection.
+        self._resources = {'pool': None, 'shm': None}
+        self._finalizer = weakref.finalize(self, _release_resources, self._resources)
+
+    def close(self) -> None:
+        '''
+        Shut the worker pool down and free the shared memory buffer
+        of parallel simulations. A later parallel simulation starts
+        a new pool. Simulators are also context managers that close
+        on exit.
+        '''
+        _release_resources(self._resources)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
     def simulate(self):
         '''
-        Calculate lists of points for x and y axis
-        of the chaotic map.
-        Returns list of lists of points for x and y axis
-        of the the chaotic map.
+        Calculate arrays of points for x and y axis
+        of the chaotic map. Maps that require multi point sim
+        are simulated from every point of their sim range with
+        a hundredth of iter_n iterations each, see get_lane_iter_n.
+        Points of the burn in and points skipped by decimate are not returned.
+        The simulator keeps the calculated trajectories, so repeated calls
+        return the same points and raising iter_n only calculates the
+        new iterations. Changing the map starts over from its origins.
+        If the simulator has a cache, results are looked up in it
+        first and stored in it afterwards.
+
+        :return: tuple of xs (np.ndarray) and ys (np.ndarray)
         '''
-        if self.chaotic_map.is_multi_point_sim:
-            self.change_iter_n(int(self.iter_n/100))
-            if not self.chaotic_map.sim_range:
-                sim_range = self.chaotic_map.default_range
+        start = self.notify('start')
+        result = None
+        if self.cache is not None:
+            key = self.cache_key()
+            with self.measure('cache'):
+                result = self.cache.get(key)
+        if result is None:
+            # Diverged starting points are counted by advance,
+            # for the iterations it calculates.
+            xs, ys = self.advance(self.get_lane_rows())
+            self.escape_times = self.state_escape_times.copy()
+            result = self.drop_escaped(xs, ys)
+            if self.cache is not None:
+                with self.measure('cache'):
+                    result = self.cache.put(key, result)
+        self.notify('finish', start, result[0], result[1])
+        return result
+    def add_callback(self, event: str, function) -> None:
+        '''
+        Call a function on an event of a simulation.
+        Events are
+            start - a simulation starts, called as function(simulator)
+            chunk - iter_chunks produced a chunk, called as function(simulator, xs, ys)
+            finish - a simulation ended, called as function(simulator)
+        simulate has start and finish events, iter_chunks has all of them.
+
+        :param event: str 'start', 'chunk' or 'finish'
+        :param function: function to call
+        '''
+        if event not in self.callbacks:
+            raise ValueError(f'Unknown simulation event {event}. Expected start, chunk or finish.')
+        self.callbacks[event].append(function)
+    def notify(self, event: str, start: float = None, xs=None, ys=None, state=None):
+        '''
+        Call the functions of an event and update metrics.
+        Chunk events, and finish events with points, count the produced
+        points. Finish events add the time since a given start, and
+        with a state also count its diverged starting points.
+
+        :param event: str 'start', 'chunk' or 'finish'
+        :param start: float time.perf_counter() at the start event
+        :param xs: np.ndarray points of a chunk or of the result or None
+        :param ys: np.ndarray points of a chunk or of the result or None
+        :param state: tuple of last xs and ys of every starting point or None
+        :return: float time.perf_counter() if metrics are on, otherwise None
+        '''
+        for function in self.callbacks[event]:
+            if event == 'chunk':
+                function(self, xs, ys)
             else:
-                sim_range = self.chaotic_map.sim_range
-            return self.simulate_in_range(sim_range)
-        else:
-            return self.simulate_single()
+                function(self)
+        if self.metrics is None:
+            return None
+        if xs is not None:
+            self.metrics.points += len(xs)
+        if event == 'finish':
+            self.metrics.wall_seconds += time.perf_counter() - start
+            if state is not None:
+                self.metrics.diverged += int(np.count_nonzero(~(np.isfinite(state[0]) & np.isfinite(state[1]))))
+        return time.perf_counter()
+    def measure(self, phase: str):
+        '''
+        Measure the wall time of a phase if metrics are on.
+
+        :param phase: str name of the phase, see SimulationMetrics
+        :return: context manager
+        '''
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.measure(phase)
+    def advance(self, lane_rows: int):
+        '''
+        Make sure every starting point was simulated for lane_rows kept
+        points after its first one and return the trajectories, see
+        get_lane_rows. Only points that were not calculated before are
+        calculated, starting from the last point of every trajectory.
+        If the map changed since the last call, the trajectories start
+        over from the origins of the map, which run through the burn in first.
+
+        :param lane_rows: int number of kept points per starting point after the first one
+        :return: tuple of xs (np.ndarray) and ys (np.ndarray)
+            of shape (lane_rows + 1, number of starting points)
+        '''
+        state_key = self.cache_key()[:-1]
+        if state_key != self.state_key:
+            with self.measure('grid_setup'):
+                x0s, y0s = self.get_origins()
+            x0s, y0s = self.burn_in_lanes(x0s, y0s)
+            # New buffers rather than reused ones, since earlier
+            # results may still be in use.
+            with self.measure('allocate'):
+                self.result_xs = np.empty((max(lane_rows, 0) + 1, x0s.size), dtype=self.dtype)
+                self.result_ys = np.empty((max(lane_rows, 0) + 1, y0s.size), dtype=self.dtype)
+            self.result_xs[0] = x0s
+            self.result_ys[0] = y0s
+            self.state_escape_times = np.full(x0s.size, -1)
+            self.update_escape_times(self.state_escape_times, self.result_xs[:1], self.result_ys[:1], 0)
+            self.state_rows = 0
+            self.state_key = state_key
+            # Starting points that escaped during the burn in diverged in this call.
+            self.count_diverged(np.ones(x0s.size, dtype=bool))
+        done = self.state_rows
+        if lane_rows > done:
+            with self.measure('allocate'):
+                self.reserve_rows(lane_rows + 1)
+            rows = slice(done, lane_rows + 1)
+            state_xs, state_ys = self.get_state()
+            finite = np.isfinite(state_xs) & np.isfinite(state_ys)
+            with self.measure('step'):
+                if self.workers > 1 and state_xs.size > 1:
+                    self.result_xs[rows], self.result_ys[rows] = self.simulate_lanes_parallel(state_xs, state_ys, lane_rows - done)
+                else:
+                    self.simulate_lanes_into(state_xs, state_ys, self.result_xs[rows], self.result_ys[rows])
+            self.update_escape_times(self.state_escape_times, self.result_xs[rows], self.result_ys[rows], done)
+            self.state_rows = lane_rows
+            self.count_diverged(finite)
+            if self.metrics is not None:
+                self.metrics.iterations += (lane_rows - done) * self.decimate * state_xs.size
+                self.metrics.observe_buffer(self.result_xs.nbytes + self.result_ys.nbytes)
+        return self.result_xs[:lane_rows + 1], self.result_ys[:lane_rows + 1]
+    def count_diverged(self, finite) -> None:
+        '''
+        Add the starting points that were finite before and aren't
+        at the last calculated point to the diverged metric.
+
+        :param finite: np.ndarray of bool, whether every starting point was finite before
+        '''
+        if self.metrics is not None:
+            state_xs, state_ys = self.get_state()
+            self.metrics.diverged += int(np.count_nonzero(finite & ~(np.isfinite(state_xs) & np.isfinite(state_ys))))
+    def burn_in_lanes(self, x0s, y0s):
+        '''
+        Calculate the burn in iterations of several starting points
+        without keeping any of their points.
+
+        :param x0s: np.ndarray starting x points
+        :param y0s: np.ndarray starting y points
+        :return: tuple of xs (np.ndarray) and ys (np.ndarray) after the burn in
+        '''
+        if self.burn_in == 0:
+            return x0s, y0s
+        with self.measure('step'):
+            if self.workers > 1 and x0s.size > 1:
+                xs, ys = self.simulate_lanes_parallel(x0s, y0s, 1, stride=self.burn_in)
+            else:
+                xs, ys = np.empty((2, x0s.size), dtype=self.dtype), np.empty((2, y0s.size), dtype=self.dtype)
+                self.simulate_lanes_into(x0s, y0s, xs, ys, stride=self.burn_in)
+        if self.metrics is not None:
+            self.metrics.iterations += self.burn_in * x0s.size
+        return xs[1], ys[1]
+    def get_state(self):
+        '''
+        Get the last calculated point of every starting point.
+
+        :return: tuple of xs (np.ndarray) and ys (np.ndarray), otherwise None
+            if nothing was simulated
+        '''
+        if self.result_xs is None:
+            return None
+        return self.result_xs[self.state_rows].copy(), self.result_ys[self.state_rows].copy()
+    def get_escape_times(self):
+        '''
+        Get the iteration at which every starting point of the last
+        simulate or iter_chunks call escaped, see escape_radius.
+        With burn_in or decimate, escapes are detected at every iteration
+        but reported at the first kept point that is dropped.
+        Results served from the cache don't change them.
+        Starting points are ordered like get_origins.
+        Without an escape radius, orbits escape when they stop being finite.
+
+        :return: np.ndarray of int iterations, -1 for points that didn't escape,
+            otherwise None if nothing was calculated
+        '''
+        if self.escape_times is None:
+            return None
+        # Escape times are stored as rows of kept points.
+        return np.where(self.escape_times < 0, -1, self.burn_in + self.escape_times * self.decimate)
+    def calculate_escape_times(self):
+        '''
+        Get the escape times of the starting points of the current map
+        and iter_n, see get_escape_times. Unlike simulate, this never
+        serves from the cache, whose results carry no escape times:
+        the trajectories are advanced like in simulate, which only
+        calculates what is missing.
+
+        :return: np.ndarray of int iterations, -1 for points that didn't escape
+        '''
+        lane_rows = self.get_lane_rows()
+        self.advance(lane_rows)
+        # The trajectories may have run further than lane_rows before.
+        self.escape_times = np.where(self.state_escape_times > lane_rows, -1, self.state_escape_times)
+        return self.get_escape_times()
+    def update_escape_times(self, escape_times, block_xs, block_ys, offset: int) -> None:
+        '''
+        Record the escape times of starting points that escaped in a block
+        of trajectories, that is the first row that is not finite.
+        Escape times are rows of kept points, see get_escape_times.
+
+        :param escape_times: np.ndarray of int escape times, updated in place
+        :param block_xs: np.ndarray x values of shape (rows, number of starting points)
+        :param block_ys: np.ndarray y values of shape (rows, number of starting points)
+        :param offset: int row of the first row of the block
+        '''
+        lanes = np.flatnonzero((escape_times < 0) & ~(np.isfinite(block_xs[-1]) & np.isfinite(block_ys[-1])))
+        if lanes.size:
+            escaped = ~(np.isfinite(block_xs[:, lanes]) & np.isfinite(block_ys[:, lanes]))
+            escape_times[lanes] = offset + np.argmax(escaped, axis=0)
+    def drop_escaped(self, xs, ys):
+        '''
+        Ravel trajectories into arrays of points. With an escape radius,
+        points of escaped orbits are dropped.
+
+        :param xs: np.ndarray x values
+        :param ys: np.ndarray y values
+        :return: tuple of xs (np.ndarray) and ys (np.ndarray)
+        '''
+        xs, ys = xs.ravel(), ys.ravel()
+        if self.escape_radius is None:
+            return xs, ys
+        inside = np.isfinite(xs)
+        if inside.all():
+            return xs, ys
+        return xs[inside], ys[inside]
+    def reserve_rows(self, rows: int) -> None:
+        '''
+        Make sure the trajectory buffers of simulate can hold a given
+        number of rows. Buffers are at least doubled when they grow,
+        and the rows calculated so far are kept.
+
+        :param rows: int number of rows
+        '''
+        capacity = len(self.result_xs)
+        if rows <= capacity:
+            return
+        capacity = max(rows, 2*capacity)
+        for name in ['result_xs', 'result_ys']:
+            old = getattr(self, name)
+            new = np.empty((capacity, old.shape[1]), dtype=old.dtype)
+            new[:self.state_rows + 1] = old[:self.state_rows + 1]
+            setattr(self, name, new)
+    def cache_key(self) -> tuple:
+        '''
+        Get a key identifying the result of simulate.
+        The key consists of the map identity (see ChaoticMap.get_identity), constants a, b, c, d,
+        origin x0, y0, sim range, escape radius, burn in, decimation,
+        dtype and number of iterations.
+
+        :return: tuple key
+        '''
+        chaotic_map = self.chaotic_map
+        sim_range = chaotic_map.sim_range or chaotic_map.default_range
+        return (
+            chaotic_map.get_identity(),
+            chaotic_map.a, chaotic_map.b, chaotic_map.c, chaotic_map.d,
+            chaotic_map.x0, chaotic_map.y0,
+            tuple(sim_range),
+            self.escape_radius,
+            self.burn_in,
+            self.decimate,
+            self.dtype.name,
+            self.iter_n
+        )
+    def get_origins(self):
+        '''
+        Get the starting points of a simulation.
+        A map that requires multi point sim starts from every point
+        of its sim range (or default range), other maps start from (x0, y0).
+
+        :return: tuple of x0s (np.ndarray) and y0s (np.ndarray)
+        '''
+        if self.chaotic_map.is_multi_point_sim:
+            return self.grid_origins(self.chaotic_map.sim_range or self.chaotic_map.default_range)
+        return np.array([self.chaotic_map.x0], dtype=float), np.array([self.chaotic_map.y0], dtype=float)
+    def get_lane_iter_n(self) -> int:
+        '''
+        Get the number of iterations simulate runs for each starting point.
+        Maps that require multi point sim use a hundredth of iter_n
+        for every starting point.
+
+        :return: int number of iterations per starting point
+        '''
+        if self.chaotic_map.is_multi_point_sim:
+            return int(self.iter_n/100)
+        return self.iter_n
+    def get_lane_rows(self, lane_iter_n: int = None) -> int:
+        '''
+        Get the number of points kept for each starting point after
+        the first one, that is after the burn in every decimate-th point.
+        A simulation shorter than the burn in keeps nothing, which is -1.
+
+        :param lane_iter_n: int number of iterations per starting point,
+            by default the one of simulate, see get_lane_iter_n
+        :return: int number of kept points after the first one
+        '''
+        if lane_iter_n is None:
+            lane_iter_n = self.get_lane_iter_n()
+        return max(-1, (lane_iter_n - self.burn_in) // self.decimate)
     def simulate_single(self) -> None:
         '''
-        Calculate lists of points for x and y axis
-        of the chaotic map.
-        Returns lists of points for x and y axis
+        Calculate arrays of points for x and y axis
+        of the chaotic map from its current origin. The trajectory
+        buffers of the map are allocated once for all iterations.
+        Points already in the buffers are kept, and only the missing
+        iterations are calculated.
+        This is the raw float64 orbit of the map: a simulator with
+        another dtype, a burn in, decimation or an escape radius
+        raises ValueError, simulate applies them.
+        Returns arrays of points for x and y axis
         of the the chaotic map.
 
-        :return: tuple of xs (list) and ys (list)
+        :return: tuple of xs (np.ndarray) and ys (np.ndarray)
         '''
-        for i in range(self.iter_n):
-            self.chaotic_map.calculate(i)
-        return self.chaotic_map.get_points()
+        if self.dtype != np.float64 or self.burn_in or self.decimate != 1 or self.escape_radius is not None:
+            raise ValueError('simulate_single does not support dtype, burn_in, decimate or escape_radius. Use simulate instead.')
+        chaotic_map = self.chaotic_map
+        done = chaotic_map.n_points - 1
+        if self.iter_n > done:
+            with self.measure('allocate'):
+                chaotic_map.reserve(self.iter_n + 1)
+            xs, ys = chaotic_map.xs, chaotic_map.ys
+            step = chaotic_map.step
+            x, y = float(xs[done]), float(ys[done])
+            with self.measure('step'):
+                for i in range(done + 1, self.iter_n + 1):
+                    x, y = step(x, y)
+                    xs[i] = x
+                    ys[i] = y
+            chaotic_map.n_points = self.iter_n + 1
+            if self.metrics is not None:
+                self.metrics.iterations += self.iter_n - done
+                self.metrics.observe_buffer(xs.nbytes + ys.nbytes)
+        return chaotic_map.xs[:self.iter_n + 1], chaotic_map.ys[:self.iter_n + 1]
     def simulate_in_range(self, sim_range):
         '''
-        Calclulate lists of points for x and y axis
+        Calclulate arrays of points for x and y axis
         of the chaotic map with starting points in a range [x0, x1] and [y0, y1]
-        with a given step. Returns lists of points for
-        x and y axis of the the chaotic map simulated in range.
-
-        :param x0: float starting x point
-        :param x1: float last x point
-        :param y0: float starting y point
-        :param y1: float last y point
-        :param step: float step of the simulation.
-        :return: tuple of xs (list) and ys (list)
-        '''
-        result_xs = []
-        result_ys = []
-        x0 = sim_range[0]
-        x1 = sim_range[1]
-        y0 = sim_range[2]
-        y1 = sim_range[3]
-        step = sim_range[4]
-        for x in np.arange(x0, x1, step):
-            for y in np.arange(y0, y1, step):
-                self.chaotic_map.reset_origin(x, y)
-                xs, ys = self.simulate_single()
-                result_xs += xs
-                result_ys += ys
+        with a given step. Every starting point is a lane of
+        simulate_lanes, so all of them are advanced together.
+        The points are ordered by iteration: the starting points first,
+        then the first iteration of every starting point, and so on.
+
+        :param sim_range: sequence of format (xmin, xmax, ymin, ymax, step_size)
+        :return: tuple of xs (np.ndarray) and ys (np.ndarray)
+        '''
+        with self.measure('grid_setup'):
+            x0s, y0s = self.grid_origins(sim_range)
+        xs, ys = self.simulate_lanes(x0s, y0s)
+        return xs.ravel(), ys.ravel()
+
+    def grid_origins(self, sim_range):
+        '''
+        Calculate the starting points of a multi point simulation
+        in a range [x0, x1] and [y0, y1] with a given step.
+        Starting points are ordered by x first, then by y.
+
+        :param sim_range: sequence of format (xmin, xmax, ymin, ymax, step_size)
+        :return: tuple of x0s (np.ndarray) and y0s (np.ndarray)
+        '''
+        x0, x1, y0, y1, step = sim_range[:5]
+        grid_xs, grid_ys = np.meshgrid(np.arange(x0, x1, step), np.arange(y0, y1, step), indexing='ij')
+        return grid_xs.ravel(), grid_ys.ravel()
+
+    def simulate_lanes(self, x0s, y0s, iter_n: int = None):
+        '''
+        Calculate trajectories of several starting points at once.
+        Every starting point is a lane of the state vector.
+        The result is written into preallocated arrays with one row per
+        iteration and one column per starting point.
+        If the chaotic map provides step_batch and there is more than one
+        lane, all lanes are advanced together, otherwise each lane is
+        simulated with step. With an escape radius, escaped lanes are
+        retired and continue as nan without being calculated.
+        Rows are the kept points after the burn in, see get_lane_rows.
+        If the simulator has more than one worker, the lanes are split
+        across worker processes.
+
+        :param x0s: np.ndarray starting x points
+        :param y0s: np.ndarray starting y points
+        :param iter_n: int number of iterations, by default the one of the simulator
+        :return: tuple of xs (np.ndarray) and ys (np.ndarray)
+            of shape (get_lane_rows(iter_n) + 1, number of starting points)
+        '''
+        if iter_n is None:
+            iter_n = self.iter_n
+        x0s = np.asarray(x0s, dtype=float).ravel()
+        y0s = np.asarray(y0s, dtype=float).ravel()
+        rows = self.get_lane_rows(iter_n)
+        if rows < 0:
+            return np.empty((0, x0s.size), dtype=self.dtype), np.empty((0, y0s.size), dtype=self.dtype)
+        x0s, y0s = self.burn_in_lanes(x0s, y0s)
+        if self.metrics is not None:
+            self.metrics.iterations += rows * self.decimate * x0s.size
+            self.metrics.observe_buffer(2 * (rows + 1) * x0s.size * self.dtype.itemsize)
+        if self.workers > 1 and x0s.size > 1:
+            with self.measure('step'):
+                return self.simulate_lanes_parallel(x0s, y0s, rows)
+        with self.measure('allocate'):
+            result_xs = np.empty((rows + 1, x0s.size), dtype=self.dtype)
+            result_ys = np.empty((rows + 1, y0s.size), dtype=self.dtype)
+        with self.measure('step'):
+            self.simulate_lanes_into(x0s, y0s, result_xs, result_ys)
         return result_xs, result_ys
+
+    def simulate_lanes_into(self, x0s, y0s, result_xs, result_ys, stride: int = None) -> None:
+        '''
+        Calculate trajectories of several starting points at once
+        and write them into given arrays of shape
+        (number of rows, number of starting points).
+        Consecutive rows are stride iterations apart, the iterations
+        in between are calculated but never stored.
+
+        :param x0s: np.ndarray starting x points
+        :param y0s: np.ndarray starting y points
+        :param result_xs: np.ndarray output array for x values
+        :param result_ys: np.ndarray output array for y values
+        :param stride: int number of iterations per row, by default decimate
+        '''
+        if stride is None:
+            stride = self.decimate
+        result_xs[0] = x0s
+        result_ys[0] = y0s
+        if self.escape_radius is not None:
+            self.simulate_escaping_lanes_into(x0s, y0s, result_xs, result_ys, stride)
+        elif self.has_batch_step() and x0s.size > 1:
+            step_batch = self.chaotic_map.step_batch
+            xs, ys = result_xs[0], result_ys[0]
+            # Diverging lanes overflow to inf and nan instead of raising.
+            with np.errstate(over='ignore', invalid='ignore'):
+                for i in range(1, len(result_xs)):
+                    for _ in range(stride):
+                        xs, ys = step_batch(xs, ys)
+                    result_xs[i] = xs
+                    result_ys[i] = ys
+        else:
+            step = self.get_scalar_step()
+            for lane in range(x0s.size):
+                x, y = float(result_xs[0, lane]), float(result_ys[0, lane])
+                i = 1
+                try:
+                    for i in range(1, len(result_xs)):
+                        for _ in range(stride):
+                            x, y = step(x, y)
+                        result_xs[i, lane] = x
+                        result_ys[i, lane] = y
+                except OverflowError:
+                    # Like step_batch, a diverged lane continues as nan.
+                    result_xs[i:, lane] = np.nan
+                    result_ys[i:, lane] = np.nan
+
+    def simulate_escaping_lanes_into(self, x0s, y0s, result_xs, result_ys, stride: int = 1) -> None:
+        '''
+        Calculate trajectories like simulate_lanes_into, but retire lanes
+        that escape the escape radius. Only active lanes are calculated,
+        and the rows of retired lanes are nan from the escaping point on.
+        Lanes are checked at every iteration, not only at stored rows.
+        The first row (starting points) is expected to be set already.
+
+        :param x0s: np.ndarray starting x points
+        :param y0s: np.ndarray starting y points
+        :param result_xs: np.ndarray output array for x values
+        :param result_ys: np.ndarray output array for y values
+        :param stride: int number of iterations per row
+        '''
+        radius_squared = self.escape_radius**2
+        # Comparisons with nan are False, so non-finite lanes escape too.
+        active = np.flatnonzero(x0s*x0s + y0s*y0s <= radius_squared)
+        if self.has_batch_step() and x0s.size > 1:
+            step_batch = self.chaotic_map.step_batch
+            # Starting points as stored, so lanes are stepped in the result dtype.
+            xs, ys = result_xs[0][active], result_ys[0][active]
+            with np.errstate(over='ignore', invalid='ignore'):
+                for i in range(1, len(result_xs)):
+                    if active.size == 0:
+                        result_xs[i:] = np.nan
+                        result_ys[i:] = np.nan
+                        break
+                    for _ in range(stride):
+                        xs, ys = step_batch(xs, ys)
+                        inside = xs*xs + ys*ys <= radius_squared
+                        if not inside.all():
+                            active, xs, ys = active[inside], xs[inside], ys[inside]
+                    if active.size == x0s.size:
+                        result_xs[i] = xs
+                        result_ys[i] = ys
+                    else:
+                        result_xs[i] = np.nan
+                        result_ys[i] = np.nan
+                        result_xs[i, active] = xs
+                        result_ys[i, active] = ys
+        else:
+            step = self.get_scalar_step()
+            result_xs[1:] = np.nan
+            result_ys[1:] = np.nan
+            for lane in active:
+                x, y = float(result_xs[0, lane]), float(result_ys[0, lane])
+                try:
+                    for i in range(1, len(result_xs)):
+                        for _ in range(stride):
+                            x, y = step(x, y)
+                            if not x*x + y*y <= radius_squared:
+                                raise OverflowError
+                        result_xs[i, lane] = x
+                        result_ys[i, lane] = y
+                except OverflowError:
+                    # Rows from the escaping one on stay nan.
+                    pass
+
+    def get_scalar_step(self):
+        '''
+        Get the step method of the chaotic map for scalar lanes.
+        With dtype np.float32, every calculated point is rounded to single
+        precision, so a lane continues from exactly its stored point
+        and results don't depend on how a simulation is split into blocks.
+        Points out of the single precision range become infinite.
+
+        :return: function step(x, y) returning the next x and y
+        '''
+        step = self.chaotic_map.step
+        if self.dtype == np.float64:
+            return step
+        single = struct.Struct('f')
+
+        def rounded_step(x, y):
+            x, y = step(x, y)
+            return single.unpack(single.pack(x))[0], single.unpack(single.pack(y))[0]
+        return rounded_step
+
+    def simulate_lanes_parallel(self, x0s, y0s, iter_n: int = None, stride: int = None):
+        '''
+        Calculate trajectories of several starting points in a pool
+        of worker processes. Every worker gets a contiguous slice of lanes
+        and writes its trajectories straight into a shared memory
+        buffer, so nothing is pickled back. The result is the same
+        as the one of a single process simulation.
+
+        :param x0s: np.ndarray starting x points
+        :param y0s: np.ndarray starting y points
+        :param iter_n: int number of rows after the first one, by default the number of iterations of the simulator
+        :param stride: int number of iterations per row, by default decimate
+        :return: tuple of xs (np.ndarray) and ys (np.ndarray)
+            of shape (iter_n + 1, number of starting points)
+        '''
+        if iter_n is None:
+            iter_n = self.iter_n
+        if stride is None:
+            stride = self.decimate
+        shape = (2, iter_n + 1, x0s.size)
+        workers = min(self.workers, x0s.size)
+        bounds = np.linspace(0, x0s.size, workers + 1).astype(int)
+        pool = self._resources['pool']
+        if pool is None:
+            pool = self._resources['pool'] = ProcessPoolExecutor(max_workers=self.workers)
+        # The buffer is kept for later calls and grows by at least doubling.
+        nbytes = int(np.prod(shape)) * self.dtype.itemsize
+        shm = self._resources['shm']
+        if shm is None or shm.size < nbytes:
+            size = nbytes
+            if shm is not None:
+                size = max(nbytes, 2 * shm.size)
+                self._resources['shm'] = None
+                shm.close()
+                shm.unlink()
+            shm = self._resources['shm'] = shared_memory.SharedMemory(create=True, size=size)
+        futures = [
+            pool.submit(
+                _simulate_lanes_worker, self.chaotic_map, iter_n, self.batch, self.escape_radius, stride, self.dtype,
+                shm.name, shape, start, stop, x0s[start:stop], y0s[start:stop]
+            )
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        for future in futures:
+            future.result()
+        result = np.ndarray(shape, dtype=self.dtype, buffer=shm.buf).copy()
+        return result[0], result[1]
+
+    def iter_chunks(self, chunk_size: int = 65536):
+        '''
+        Generate the points of simulate chunk by chunk.
+        Every chunk holds whole rows of kept points of all starting points,
+        that is chunk_size // (number of starting points) rows, but at least one.
+        Only one chunk is in memory at a time, so simulations of any
+        length can be consumed while they run. Concatenated chunks are
+        equal to the result of simulate. With an escape radius, chunks
+        don't hold points of escaped orbits, and escape times are
+        available from get_escape_times when the generator is exhausted.
+
+        :param chunk_size: int maximum number of points per chunk
+        :return: generator of tuples of xs (np.ndarray) and ys (np.ndarray)
+        '''
+        start = self.notify('start')
+        with self.measure('grid_setup'):
+            xs, ys = self.get_origins()
+        lane_rows = self.get_lane_rows()
+        escape_times = np.full(xs.size, -1)
+        if lane_rows >= 0:
+            xs, ys = self.burn_in_lanes(xs, ys)
+        remaining = lane_rows
+        rows = max(1, chunk_size // xs.size)
+        first_row = 0
+        while remaining > 0:
+            block_rows = min(rows - 1 + first_row, remaining)
+            with self.measure('allocate'):
+                block_xs = np.empty((block_rows + 1, xs.size), dtype=self.dtype)
+                block_ys = np.empty((block_rows + 1, ys.size), dtype=self.dtype)
+            with self.measure('step'):
+                self.simulate_lanes_into(xs, ys, block_xs, block_ys)
+            if self.metrics is not None:
+                self.metrics.iterations += block_rows * self.decimate * xs.size
+                self.metrics.observe_buffer(block_xs.nbytes + block_ys.nbytes)
+            self.update_escape_times(escape_times, block_xs, block_ys, lane_rows - remaining)
+            # The first row of a block is the last row of the previous one,
+            # so only the first block yields its starting points.
+            chunk_xs, chunk_ys = self.drop_escaped(block_xs[first_row:], block_ys[first_row:])
+            self.notify('chunk', start, chunk_xs, chunk_ys)
+            yield chunk_xs, chunk_ys
+            xs, ys = block_xs[-1].copy(), block_ys[-1].copy()
+            remaining -= block_rows
+            first_row = 1
+        if lane_rows == 0:
+            self.update_escape_times(escape_times, xs[np.newaxis], ys[np.newaxis], 0)
+            chunk_xs, chunk_ys = self.drop_escaped(xs, ys)
+            self.notify('chunk', start, chunk_xs, chunk_ys)
+            yield chunk_xs, chunk_ys
+        self.escape_times = escape_times
+        self.notify('finish', start, state=(xs, ys))
+
+    def has_batch_step(self) -> bool:
+        '''
+        Check whether the chaotic map provides a vectorized step_batch
+        and the simulator is allowed to use it.
+
+        :return: bool
+        '''
+        return self.batch and callable(getattr(self.chaotic_map, 'step_batch', None))
                 
     def change_chaotic_map(self, chaotic_map: ChaoticMap):
         '''
@@ -243,6 +1060,46 @@ class Simulator:
         self.iter_n = iter_n
     
 
+def _release_resources(resources: dict) -> None:
+    # Shuts the worker pool of a Simulator down and frees its shared memory.
+    pool, shm = resources['pool'], resources['shm']
+    resources['pool'] = resources['shm'] = None
+    if pool is not None:
+        pool.shutdown()
+    if shm is not None:
+        shm.close()
+        shm.unlink()
+
+
+def _simulate_lanes_worker(chaotic_map, iter_n, batch, escape_radius, stride, dtype, shm_name, shape, start, stop, x0s, y0s) -> None:
+    '''
+    Simulate lanes start to stop of a parallel multi point simulation
+    and write them into the shared memory buffer named shm_name.
+
+    :param chaotic_map: instance inheriting from the abstract ChaoticMap class
+    :param iter_n: int number of rows after the first one
+    :param batch: bool whether to use step_batch when the map provides it
+    :param escape_radius: float distance from (0, 0) at which orbits escape or None
+    :param stride: int number of iterations per row
+    :param dtype: np.dtype of the buffer
+    :param shm_name: str name of the shared memory buffer
+    :param shape: tuple shape (2, iter_n + 1, number of lanes) of the buffer
+    :param start: int first lane of the slice
+    :param stop: int lane after the last lane of the slice
+    :param x0s: np.ndarray starting x points of the slice
+    :param y0s: np.ndarray starting y points of the slice
+    '''
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        result = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        Simulator(chaotic_map, iter_n, batch=batch, escape_radius=escape_radius, dtype=dtype).simulate_lanes_into(
+            x0s, y0s, result[0, :, start:stop], result[1, :, start:stop], stride
+        )
+        del result
+    finally:
+        shm.close()
+
+
 class TinkerbellMap(ChaoticMap):
     '''
     Represents a ChaoticMap
@@ -283,6 +1140,27 @@ class TinkerbellMap(ChaoticMap):
         x_new = x**2 - y**2 + self.a*x + self.b*y
         y_new = 2*x*y + self.c*x + self.d*y
         return x_new, y_new 
+
+    def step_batch(self, xs, ys):
+        '''
+        Perform calculations with given arrays of x and y values.
+
+        :param xs: np.ndarray x values
+        :param ys: np.ndarray y values
+        '''
+        x_new = xs**2 - ys**2 + self.a*xs + self.b*ys
+        y_new = 2*xs*ys + self.c*xs + self.d*ys
+        return x_new, y_new
+
+    def jacobian_batch(self, xs, ys):
+        '''
+        Calculate the Jacobian matrix of step_batch at given arrays of x and y values.
+
+        :param xs: np.ndarray x values
+        :param ys: np.ndarray y values
+        :return: tuple of partial derivatives (dx/dx, dx/dy, dy/dx, dy/dy)
+        '''
+        return 2*xs + self.a, -2*ys + self.b, 2*ys + self.c, 2*xs + self.d
     
 
 class BogdanovMap(ChaoticMap):
@@ -320,6 +1198,16 @@ class BogdanovMap(ChaoticMap):
         x_new = x+y_new
         return x_new, y_new 
 
+    def step_batch(self, xs, ys):
+        ys_new = ys*(1+self.a+self.c*xs) + self.b*xs*(xs-1)
+        xs_new = xs+ys_new
+        return xs_new, ys_new
+
+    def jacobian_batch(self, xs, ys):
+        dys_dxs = self.c*ys + self.b*(2*xs-1)
+        dys_dys = 1 + self.a + self.c*xs
+        return 1 + dys_dxs, dys_dys, dys_dxs, dys_dys
+
 class IkedaMap(ChaoticMap):
     '''
     Represents an Ikeada Map
@@ -351,6 +1239,30 @@ class IkedaMap(ChaoticMap):
         y_new = self.a * (x*sin(t) + y*cos(t))
         return x_new, y_new
 
+    def step_batch(self, xs, ys):
+        t = 0.4 - 6/(1+xs**2+ys**2)
+        cos_t = np.cos(t)
+        sin_t = np.sin(t)
+        xs_new = 1 + self.a * (xs*cos_t - ys*sin_t)
+        ys_new = self.a * (xs*sin_t + ys*cos_t)
+        return xs_new, ys_new
+
+    def jacobian_batch(self, xs, ys):
+        r = 1 + xs**2 + ys**2
+        t = 0.4 - 6/r
+        cos_t = np.cos(t)
+        sin_t = np.sin(t)
+        dt_dxs = 12*xs / r**2
+        dt_dys = 12*ys / r**2
+        u = xs*cos_t - ys*sin_t
+        v = xs*sin_t + ys*cos_t
+        return (
+            self.a * (cos_t - v*dt_dxs),
+            self.a * (-sin_t - v*dt_dys),
+            self.a * (sin_t + u*dt_dxs),
+            self.a * (cos_t + u*dt_dys)
+        )
+
 class GingerbreadMap(ChaoticMap):
     '''
     Represents a Gingerbread Map
@@ -378,6 +1290,14 @@ class GingerbreadMap(ChaoticMap):
         y_new = x
         return x_new, y_new
 
+    def step_batch(self, xs, ys):
+        xs_new = 1 - ys + np.abs(xs)
+        ys_new = xs.copy()
+        return xs_new, ys_new
+
+    def jacobian_batch(self, xs, ys):
+        return np.sign(xs), -np.ones_like(ys), np.ones_like(xs), np.zeros_like(ys)
+
 class StandardMap(ChaoticMap):
     '''
     Represents a Standard Map
@@ -410,6 +1330,18 @@ class StandardMap(ChaoticMap):
 
         return x_new, y_new
 
+    def step_batch(self, xs, ys):
+        xs = np.mod(xs, 2*pi)
+
+        ys_new = ys + self.a * np.sin(xs)
+        xs_new = xs + ys_new
+
+        return xs_new, ys_new
+
+    def jacobian_batch(self, xs, ys):
+        dys_dxs = self.a * np.cos(xs)
+        return 1 + dys_dxs, np.ones_like(ys), dys_dxs, np.ones_like(ys)
+
 class CliffordAttractor(ChaoticMap):
     '''
     Represents a Clifford Attractor.
@@ -450,6 +1382,32 @@ class CliffordAttractor(ChaoticMap):
         x_new = sin(self.a * y) + self.c * cos(self.a * x)
         y_new = sin(self.b * x) + self.d * cos(self.b * y)
         return x_new, y_new 
+
+    def step_batch(self, xs, ys):
+        '''
+        Perform calculations with given arrays of x and y values.
+
+        :param xs: np.ndarray x values
+        :param ys: np.ndarray y values
+        '''
+        x_new = np.sin(self.a * ys) + self.c * np.cos(self.a * xs)
+        y_new = np.sin(self.b * xs) + self.d * np.cos(self.b * ys)
+        return x_new, y_new
+
+    def jacobian_batch(self, xs, ys):
+        '''
+        Calculate the Jacobian matrix of step_batch at given arrays of x and y values.
+
+        :param xs: np.ndarray x values
+        :param ys: np.ndarray y values
+        :return: tuple of partial derivatives (dx/dx, dx/dy, dy/dx, dy/dy)
+        '''
+        return (
+            -self.a * self.c * np.sin(self.a * xs),
+            self.a * np.cos(self.a * ys),
+            self.b * np.cos(self.b * xs),
+            -self.b * self.d * np.sin(self.b * ys)
+        )
     
 class GumowskiMiraAttractor(ChaoticMap):
     '''
@@ -483,9 +1441,23 @@ class GumowskiMiraAttractor(ChaoticMap):
         y_new = self.supporting_func(x_new) - x
         return x_new, y_new 
     
+    def step_batch(self, xs, ys):
+        xs_new = self.b*ys + self.supporting_func(xs)
+        ys_new = self.supporting_func(xs_new) - xs
+        return xs_new, ys_new
+
+    def jacobian_batch(self, xs, ys):
+        xs_new = self.b*ys + self.supporting_func(xs)
+        dxs_dxs = self.supporting_derivative(xs)
+        dys_dxs_new = self.supporting_derivative(xs_new)
+        return dxs_dxs, self.b * np.ones_like(ys), dys_dxs_new*dxs_dxs - 1, dys_dxs_new*self.b
+
     def supporting_func(self, x):
         return self.a*x + 2*(1-self.a) * x**2 * (1+x**2)**(-2)
 
+    def supporting_derivative(self, x):
+        return self.a + 4*(1-self.a) * x * (1-x**2) * (1+x**2)**(-3)
+
 default_maps = {
             'TinkerBell Map': TinkerbellMap,
             'Ikeda Map': IkedaMap,
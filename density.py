@@ -0,0 +1,150 @@
+import numpy as np
+from PIL import Image
+from chaotic_maps import Simulator
+
+class DensityAccumulator:
+    '''
+    Represents a fixed-size 2D histogram of points of a chaotic map.
+    Points are added chunk by chunk, so memory is bounded by
+    the size of the image rather than by the number of points.
+    '''
+    def __init__(self, width: int = 512, height: int = 512, bounds: tuple = ()) -> None:
+        '''
+        Initialize a density accumulator with a given image size.
+        Bounds can be specified as a tuple of format (xmin, xmax, ymin, ymax).
+        If they are not, they are taken from the first added chunk of points.
+        Points outside of the bounds are dropped.
+
+        :param width: int number of bins along x axis
+        :param height: int number of bins along y axis
+        :param bounds: tuple of format (xmin, xmax, ymin, ymax) or empty tuple
+        '''
+        self.width = width
+        self.height = height
+        self.bounds = tuple(bounds)
+        self.counts = np.zeros((width, height), dtype=np.int64)
+        self.n_points = 0
+
+    def add(self, xs, ys) -> None:
+        '''
+        Add a chunk of points to the histogram.
+        Non-finite points and points outside of the bounds are dropped.
+
+        :param xs: np.ndarray x values
+        :param ys: np.ndarray y values
+        '''
+        xs = np.asarray(xs, dtype=float).ravel()
+        ys = np.asarray(ys, dtype=float).ravel()
+        finite = np.isfinite(xs) & np.isfinite(ys)
+        if not finite.all():
+            xs = xs[finite]
+            ys = ys[finite]
+        if not xs.size:
+            return
+        if not self.bounds:
+            self.bounds = self.fit_bounds(xs, ys)
+        xmin, xmax, ymin, ymax = self.bounds
+        # Bin by hand instead of np.histogram2d: one bincount on
+        # flat indices is several times faster for large chunks.
+        ix = np.floor((xs - xmin) * (self.width / (xmax - xmin))).astype(np.int64)
+        iy = np.floor((ys - ymin) * (self.height / (ymax - ymin))).astype(np.int64)
+        inside = (ix >= 0) & (ix < self.width) & (iy >= 0) & (iy < self.height)
+        flat = ix[inside] * self.height + iy[inside]
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+        self.n_points += int(inside.sum())
+
+    def fit_bounds(self, xs, ys, margin: float = 0.1) -> tuple:
+        '''
+        Calculate bounds enclosing given points with a relative margin.
+        The extreme 0.1% of points on each side are ignored, so a few
+        diverging orbits don't stretch the bounds.
+
+        :param xs: np.ndarray finite x values
+        :param ys: np.ndarray finite y values
+        :param margin: float margin as a fraction of the extent
+        :return: tuple of format (xmin, xmax, ymin, ymax)
+        '''
+        xmin, xmax = (float(value) for value in np.quantile(xs, [0.001, 0.999]))
+        ymin, ymax = (float(value) for value in np.quantile(ys, [0.001, 0.999]))
+        x_pad = (xmax - xmin) * margin or 0.5
+        y_pad = (ymax - ymin) * margin or 0.5
+        return (xmin - x_pad, xmax + x_pad, ymin - y_pad, ymax + y_pad)
+
+    def image(self):
+        '''
+        Get the log-scaled density image.
+        Values are in range [0, 1], the image is indexed as image[x, y].
+
+        :return: np.ndarray of shape (width, height)
+        '''
+        image = np.log1p(self.counts, dtype=float)
+        peak = image.max()
+        if peak > 0:
+            image /= peak
+        return image
+
+
+def to_grayscale(image) -> np.ndarray:
+    '''
+    Convert a density image with values in range [0, 1], indexed as
+    image[x, y], to 8-bit grayscale pixel rows with y increasing upwards.
+    Empty bins are white and the densest bins are black.
+
+    :param image: np.ndarray image of shape (width, height)
+    :return: np.ndarray of dtype uint8 and shape (height, width)
+    '''
+    pixels = np.rint(255 * (1 - np.clip(image, 0, 1))).astype(np.uint8)
+    return np.ascontiguousarray(pixels.T[::-1])
+
+
+def save_png(image, path: str) -> None:
+    '''
+    Save a density image as a grayscale PNG file, see to_grayscale.
+
+    :param image: np.ndarray image of shape (width, height) with values in range [0, 1]
+    :param path: str path of the PNG file
+    '''
+    Image.fromarray(to_grayscale(image)).save(path, format='PNG')
+
+
+def accumulate(simulator: Simulator, accumulator: DensityAccumulator, chunk_size: int = 65536) -> DensityAccumulator:
+    '''
+    Simulate the chaotic map of a simulator and add its points to an
+    accumulator chunk by chunk. Only one chunk of at most chunk_size
+    points is in memory at a time.
+
+    :param simulator: Simulator of the chaotic map
+    :param accumulator: DensityAccumulator to add the points to
+    :param chunk_size: int maximum number of points per chunk
+    :return: the accumulator
+    '''
+    for xs, ys in simulator.iter_chunks(chunk_size):
+        accumulator.add(xs, ys)
+    return accumulator
+
+
+def escape_time_image(simulator: Simulator):
+    '''
+    Make an escape time image of a map that requires multi point sim.
+    Every pixel is a starting point of the sim range, drawn lighter
+    the sooner its orbit escaped. Starting points that never
+    escaped are 1, so bounded basins are the darkest.
+    Escape times are calculated for the current map and iter_n, see
+    Simulator.calculate_escape_times, so the simulator should have
+    an escape radius.
+
+    :param simulator: Simulator of a map that requires multi point sim
+    :return: tuple of image (np.ndarray indexed as image[x, y])
+        and bounds (tuple of format (xmin, xmax, ymin, ymax))
+    '''
+    chaotic_map = simulator.chaotic_map
+    if not chaotic_map.is_multi_point_sim:
+        raise ValueError('Escape time images require a map with multi point sim.')
+    xmin, xmax, ymin, ymax, step_size = (chaotic_map.sim_range or chaotic_map.default_range)[:5]
+    escape_times = simulator.calculate_escape_times()
+    width = len(np.arange(xmin, xmax, step_size))
+    height = len(np.arange(ymin, ymax, step_size))
+    lane_iter_n = max(simulator.get_lane_iter_n(), 1)
+    image = np.where(escape_times < 0, 1, escape_times / lane_iter_n).reshape(width, height)
+    bounds = (xmin - step_size/2, xmin + (width - 0.5)*step_size, ymin - step_size/2, ymin + (height - 0.5)*step_size)
+    return image, bounds
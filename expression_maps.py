@@ -0,0 +1,311 @@
+'''
+Chaotic maps defined by expression strings.
+
+An ExpressionMap is given the expressions of x_new and y_new in terms of
+x, y and the constants a, b, c, d, for example the Clifford Attractor:
+
+    ExpressionMap('sin(a*y) + c*cos(a*x)', 'sin(b*x) + d*cos(b*y)', a=-2, b=-2.4, c=1.1, d=-0.9)
+
+Expressions are validated against a small subset of Python: numbers, the
+names above, pi and e, arithmetic operators and the functions of FUNCTIONS.
+They are compiled once into a scalar step and a NumPy step_batch kernel,
+and compiled kernels are cached by expression, so an ExpressionMap is
+stepped like the built-in maps. register_map adds a map to
+chaotic_maps.default_maps, which makes it selectable in the GUI and the
+command line tools.
+'''
+import ast
+import copy
+import functools
+import math
+import numpy as np
+import chaotic_maps
+from chaotic_maps import ChaoticMap
+
+# Functions available in expressions, as scalar (math) and NumPy versions
+# with their number of arguments.
+FUNCTIONS = {
+    'sin': (math.sin, np.sin, 1),
+    'cos': (math.cos, np.cos, 1),
+    'tan': (math.tan, np.tan, 1),
+    'asin': (math.asin, np.arcsin, 1),
+    'acos': (math.acos, np.arccos, 1),
+    'atan': (math.atan, np.arctan, 1),
+    'atan2': (math.atan2, np.arctan2, 2),
+    'sinh': (math.sinh, np.sinh, 1),
+    'cosh': (math.cosh, np.cosh, 1),
+    'tanh': (math.tanh, np.tanh, 1),
+    'exp': (math.exp, np.exp, 1),
+    'log': (math.log, np.log, 1),
+    'sqrt': (math.sqrt, np.sqrt, 1),
+    'abs': (abs, np.abs, 1),
+    'floor': (math.floor, np.floor, 1),
+    'hypot': (math.hypot, np.hypot, 2)
+}
+VARIABLES = ['x', 'y', 'a', 'b', 'c', 'd']
+CONSTANTS = {'pi': math.pi, 'e': math.e}
+OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.UAdd, ast.USub)
+# Relative step of the central differences in ExpressionMap.jacobian_batch.
+JACOBIAN_STEP = 1e-6
+
+
+def parse_expression(expression: str) -> ast.Expression:
+    '''
+    Parse an expression and check that it only uses numbers, the names of
+    VARIABLES and CONSTANTS, arithmetic operators and calls of FUNCTIONS.
+
+    :param expression: str expression
+    :return: ast.Expression validated syntax tree
+    '''
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as error:
+        raise ValueError(f'Invalid expression {expression!r}: {error.msg}.') from None
+    # Calls are walked before their function names.
+    called = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Load) + OPERATORS):
+            continue
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            try:
+                float(node.value)
+            except OverflowError:
+                raise ValueError(f'Number {node.value} is too large in expression {expression!r}.') from None
+            continue
+        if isinstance(node, ast.Name):
+            if node.id in VARIABLES or node.id in CONSTANTS or id(node) in called:
+                continue
+            if node.id in FUNCTIONS:
+                raise ValueError(f'Function {node.id!r} has to be called in expression {expression!r}.')
+            raise ValueError(f'Unknown name {node.id!r} in expression {expression!r}. Expected one of {", ".join(VARIABLES + list(CONSTANTS))}.')
+        if isinstance(node, ast.Call):
+            name = node.func.id if isinstance(node.func, ast.Name) else None
+            if name not in FUNCTIONS:
+                raise ValueError(f'Cannot call {ast.unparse(node.func)!r} in expression {expression!r}. Expected one of {", ".join(FUNCTIONS)}.')
+            if node.keywords or len(node.args) != FUNCTIONS[name][2] or any(isinstance(arg, ast.Starred) for arg in node.args):
+                raise ValueError(f'{name} takes {FUNCTIONS[name][2]} positional argument(s) in expression {expression!r}.')
+            called.add(id(node.func))
+            continue
+        raise ValueError(f'{type(node).__name__} is not allowed in expression {expression!r}.')
+    return tree
+
+
+class _FloatConstants(ast.NodeTransformer):
+    '''
+    Replaces integer constants by floats, so constant subexpressions such
+    as 9**9**9 overflow instead of being calculated as Python integers.
+    '''
+    def visit_Constant(self, node):
+        return ast.copy_location(ast.Constant(value=float(node.value)), node)
+
+
+def _uses_point(tree) -> bool:
+    return any(isinstance(node, ast.Name) and node.id in ('x', 'y') for node in ast.walk(tree))
+
+
+class _BatchPower(ast.NodeTransformer):
+    '''
+    Replaces the ** operator of operands that don't depend on x or y,
+    which are Python floats, by np.power, which returns inf instead of
+    raising OverflowError.
+    '''
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow) and not _uses_point(node):
+            return ast.Call(func=ast.Name(id='pow', ctx=ast.Load()), args=[node.left, node.right], keywords=[])
+        return node
+
+
+class _ScalarPower(ast.NodeTransformer):
+    '''
+    Replaces the ** operator by math.pow, which raises ValueError
+    instead of returning a complex number for a negative base.
+    '''
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.Call(func=ast.Name(id='pow', ctx=ast.Load()), args=[node.left, node.right], keywords=[])
+        return node
+
+
+@functools.lru_cache(maxsize=128)
+def compile_kernels(x_expression: str, y_expression: str) -> tuple:
+    '''
+    Compile expressions of x_new and y_new into a scalar and a NumPy kernel.
+    Both kernels take arguments (x, y, a, b, c, d) and return x_new and y_new,
+    calculated from the same x and y. Domain errors and divisions by zero
+    of the scalar kernel return nan like the NumPy kernel does, an overflow
+    still raises OverflowError like it does in the built-in maps, where the
+    NumPy kernel returns inf. Numbers are calculated as floats, so a
+    constant subexpression such as 9**9**9 overflows instead of running
+    as Python integer arithmetic.
+    Kernels are cached by expression.
+
+    :param x_expression: str expression of x_new
+    :param y_expression: str expression of y_new
+    :return: tuple of scalar and NumPy kernel functions
+    '''
+    trees = [_FloatConstants().visit(parse_expression(expression)) for expression in (x_expression, y_expression)]
+    batch_bodies = []
+    for tree in trees:
+        body = ast.unparse(ast.fix_missing_locations(_BatchPower().visit(copy.deepcopy(tree))))
+        # A result that doesn't depend on x or y still needs one value per lane.
+        if not _uses_point(tree):
+            body = f'({body}) + zeros_like(x)'
+        batch_bodies.append(body)
+    scalar_bodies = [ast.unparse(ast.fix_missing_locations(_ScalarPower().visit(tree))) for tree in trees]
+    source = (
+        'def step(x, y, a, b, c, d):\n'
+        '    try:\n'
+        f'        return {scalar_bodies[0]}, {scalar_bodies[1]}\n'
+        '    except (ZeroDivisionError, ValueError):\n'
+        '        return nan, nan\n'
+        'def step_batch(x, y, a, b, c, d):\n'
+        f'    return {batch_bodies[0]}, {batch_bodies[1]}\n'
+    )
+    code = compile(source, f'<ExpressionMap {x_expression!r}, {y_expression!r}>', 'exec')
+    scalar_namespace = {
+        '__builtins__': {}, 'ZeroDivisionError': ZeroDivisionError, 'ValueError': ValueError,
+        'pow': math.pow, 'nan': math.nan, **CONSTANTS
+    }
+    batch_namespace = {'__builtins__': {}, 'pow': np.power, 'zeros_like': np.zeros_like, **CONSTANTS}
+    for name, (scalar_function, batch_function, _) in FUNCTIONS.items():
+        scalar_namespace[name] = scalar_function
+        batch_namespace[name] = batch_function
+    exec(code, scalar_namespace)
+    exec(code, batch_namespace)
+    return scalar_namespace['step'], batch_namespace['step_batch']
+
+
+class ExpressionMap(ChaoticMap):
+    '''
+    Represents a chaotic map defined by expressions of x_new and y_new.
+    '''
+    def __init__(
+        self,
+        x_expression: str,
+        y_expression: str,
+        a: float = 0,
+        b: float = 0,
+        c: float = 0,
+        d: float = 0,
+        x0: float = 0.1,
+        y0: float = 0.1,
+        default_range: tuple = ()
+    ) -> None:
+        '''
+        Initialize an expression map. Expressions use x, y, the constants
+        a, b, c, d, pi, e, arithmetic operators and the functions of FUNCTIONS.
+        They are compiled when the map is created, and an invalid
+        expression raises ValueError.
+        If a default range of format (xmin, xmax, ymin, ymax, step_size)
+        is given, the map requires multi point sim.
+
+        :param x_expression: str expression of x_new
+        :param y_expression: str expression of y_new
+        :param a: float constant
+        :param b: float constant
+        :param c: float constant
+        :param d: float constant
+        :param x0: float origin point x value
+        :param y0: float origin point y value
+        :param default_range: tuple of format (xmin, xmax, ymin, ymax, step_size) or empty tuple
+        '''
+        self.x_expression = ast.unparse(parse_expression(x_expression))
+        self.y_expression = ast.unparse(parse_expression(y_expression))
+        self.compile()
+        super().__init__(x0, y0, a, b, c, d, is_multi_point_sim=bool(default_range), default_range=tuple(default_range))
+
+    def compile(self) -> None:
+        '''
+        Get the compiled kernels of the expressions.
+        '''
+        self.scalar_kernel, self.batch_kernel = compile_kernels(self.x_expression, self.y_expression)
+
+    def __getstate__(self):
+        # Compiled kernels can't be pickled, they are compiled again
+        # (or taken from the cache) when the map is unpickled.
+        state = self.__dict__.copy()
+        del state['scalar_kernel'], state['batch_kernel']
+        return state
+
+    def __setstate__(self, state) -> None:
+        self.__dict__.update(state)
+        self.compile()
+
+    def get_identity(self) -> str:
+        return f'{super().get_identity()}({self.x_expression!r}, {self.y_expression!r})'
+
+    def get_constants(self) -> list:
+        '''
+        Get the names of the constants a, b, c, d the expressions use.
+
+        :return: list of str names of constants
+        '''
+        names = {node.id for expression in (self.x_expression, self.y_expression) for node in ast.walk(ast.parse(expression, mode='eval')) if isinstance(node, ast.Name)}
+        return [name for name in ['a', 'b', 'c', 'd'] if name in names]
+
+    def step(self, x, y):
+        '''
+        Perform calculations with given x and y.
+
+        :param x: float x value
+        :param y: float y value
+        '''
+        return self.scalar_kernel(x, y, self.a, self.b, self.c, self.d)
+
+    def step_batch(self, xs, ys):
+        '''
+        Perform calculations with given arrays of x and y values.
+
+        :param xs: np.ndarray x values
+        :param ys: np.ndarray y values
+        '''
+        return self.batch_kernel(xs, ys, self.a, self.b, self.c, self.d)
+
+    def jacobian_batch(self, xs, ys):
+        '''
+        Calculate the Jacobian matrix of step_batch at given arrays of x and y
+        values by central differences.
+
+        :param xs: np.ndarray x values
+        :param ys: np.ndarray y values
+        :return: tuple of partial derivatives (dx/dx, dx/dy, dy/dx, dy/dy)
+        '''
+        x_steps = JACOBIAN_STEP * np.maximum(1, np.abs(xs))
+        y_steps = JACOBIAN_STEP * np.maximum(1, np.abs(ys))
+        right_xs, right_ys = self.step_batch(xs + x_steps, ys)
+        left_xs, left_ys = self.step_batch(xs - x_steps, ys)
+        upper_xs, upper_ys = self.step_batch(xs, ys + y_steps)
+        lower_xs, lower_ys = self.step_batch(xs, ys - y_steps)
+        return (
+            (right_xs - left_xs) / (2*x_steps),
+            (upper_xs - lower_xs) / (2*y_steps),
+            (right_ys - left_ys) / (2*x_steps),
+            (upper_ys - lower_ys) / (2*y_steps)
+        )
+
+
+def register_map(name: str, x_expression: str, y_expression: str, replace: bool = False, **parameters):
+    '''
+    Add an expression map to chaotic_maps.default_maps, which makes it
+    selectable in the GUI and in the command line tools.
+    Built-in maps can't be replaced, expression maps only if replace is True.
+    Maps registered at runtime are not known to worker processes
+    started with the spawn method.
+
+    :param name: str name of the map
+    :param x_expression: str expression of x_new
+    :param y_expression: str expression of y_new
+    :param replace: bool whether to replace an expression map of the same name
+    :param parameters: a, b, c, d, x0, y0 and default_range of ExpressionMap
+    :return: function creating the map, stored in default_maps
+    '''
+    existing = chaotic_maps.default_maps.get(name)
+    if existing is not None and not (replace and getattr(existing, 'func', None) is ExpressionMap):
+        raise ValueError(f'A map named {name!r} already exists.')
+    # Validate and compile the expressions before the map is added.
+    ExpressionMap(x_expression, y_expression, **parameters)
+    factory = functools.partial(ExpressionMap, x_expression, y_expression, **parameters)
+    chaotic_maps.default_maps[name] = factory
+    return factory
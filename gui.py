@@ -1,12 +1,184 @@
 from PyQt5 import QtWidgets
-from PyQt5.QtCore import QSize, Qt
+from PyQt5.QtCore import QSize, Qt, QRectF, QThread, QTimer, pyqtSignal
 from pyqtgraph import PlotWidget, plot
 import pyqtgraph as pg
 import sys
+import copy
+import time
 from typing import Union
 import chaotic_maps
+import density
+import expression_maps
+import lyapunov
+import result_cache
+import numpy as np
 import os
 
+# Orbits farther than this from (0, 0) escaped and are not plotted.
+ESCAPE_RADIUS = 1e6
+# A zoomed or panned view is simulated again once it stopped changing
+# for this many milliseconds, with up to VIEWPORT_ITERATIONS_FACTOR
+# times the usual number of iterations.
+VIEWPORT_DELAY_MS = 300
+VIEWPORT_ITERATIONS_FACTOR = 100
+# Moving a slider draws a preview with 1/PREVIEW_ITERATIONS_DIVISOR
+# of the usual number of iterations at most once per PREVIEW_DELAY_MS
+# milliseconds (one frame), and the full plot once the slider stopped
+# moving for REFINE_DELAY_MS milliseconds.
+PREVIEW_DELAY_MS = 16
+PREVIEW_ITERATIONS_DIVISOR = 20
+REFINE_DELAY_MS = 300
+# Number of slider steps, spanning the current value plus or minus
+# its magnitude, at least 1.
+SLIDER_STEPS = 1000
+# Density images are drawn darker where there are more points.
+# Empty bins stay white to match the background.
+GRAYSCALE_LOOKUP_TABLE = np.linspace(255, 0, 256).astype(np.uint8)
+
+class SimulationWorker(QThread):
+    '''
+    Represents a simulation running in a background thread.
+    The worker simulates a snapshot of a chaotic map chunk by chunk
+    and reports the points simulated so far, so the plot can be
+    updated progressively. A cancelled worker stops at the next chunk
+    and doesn't report anything else.
+    Finished results are stored in a result cache, if one is given,
+    and a cached result is reported at once.
+    A worker with bounds only keeps points inside of them and
+    simulates until target_points points were kept.
+    '''
+    points_ready = pyqtSignal(object, object)
+    image_ready = pyqtSignal(object, object)
+    progress = pyqtSignal(int)
+    done = pyqtSignal()
+
+    def __init__(self, chaotic_map: chaotic_maps.ChaoticMap, n: int, density_mode: bool = False, update_interval: float = 0.1, cache: result_cache.ResultCache = None, bounds: tuple = None, target_points: int = None) -> None:
+        '''
+        Initialize a simulation worker. The chaotic map is copied,
+        so it can be changed while the worker runs.
+        If bounds are given, n is the maximum number of iterations,
+        and the simulation stops early once target_points points
+        inside of the bounds were kept.
+
+        :param chaotic_map: instance inheriting from the abstract ChaoticMap class
+        :param n: int number of iterations for simulation
+        :param density_mode: bool whether to bin points into a density image
+        :param update_interval: float minimum number of seconds between plot updates
+        :param cache: ResultCache shared between workers or None
+        :param bounds: tuple of format (xmin, xmax, ymin, ymax) or None
+        :param target_points: int number of points to keep inside of the bounds
+        :return: None
+        '''
+        super(SimulationWorker, self).__init__()
+        self.chaotic_map = copy.deepcopy(chaotic_map)
+        self.n = n
+        self.density_mode = density_mode
+        self.update_interval = update_interval
+        self.cache = cache
+        self.bounds = tuple(bounds) if bounds is not None else None
+        self.target_points = target_points
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        '''
+        Stop the simulation at the next chunk.
+
+        :return: None
+        '''
+        self.cancelled = True
+
+    def run(self) -> None:
+        '''
+        Simulate the chaotic map and report its points.
+
+        :return: None
+        '''
+        simulator = chaotic_maps.Simulator(self.chaotic_map, self.n, metrics=True, escape_radius=ESCAPE_RADIUS)
+        key = simulator.cache_key() + (('density',) if self.density_mode else ())
+        if self.bounds is not None:
+            key += ('viewport',) + self.bounds + (self.target_points,)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.progress.emit(100)
+                if self.density_mode:
+                    self.image_ready.emit(cached[0], tuple(cached[1]))
+                else:
+                    self.points_ready.emit(cached[0], cached[1])
+                self.done.emit()
+                return
+        x0s, y0s = simulator.get_origins()
+        # Points of escaped orbits are dropped, so progress is measured
+        # in iterations rather than in points.
+        total = (simulator.get_lane_iter_n() + 1) * x0s.size
+        iterations = max(simulator.get_lane_iter_n() * x0s.size, 1)
+        if self.bounds is not None:
+            total = self.target_points
+        if self.density_mode:
+            accumulator = density.DensityAccumulator(bounds=self.bounds or ())
+        else:
+            xs = np.empty(total)
+            ys = np.empty(total)
+        filled = 0
+        reported = None
+        last_update = 0
+        for chunk_xs, chunk_ys in simulator.iter_chunks():
+            if self.cancelled:
+                return
+            if self.density_mode:
+                accumulator.add(chunk_xs, chunk_ys)
+                filled = accumulator.n_points
+            else:
+                if self.bounds is not None:
+                    chunk_xs, chunk_ys = self.crop(chunk_xs, chunk_ys, total - filled)
+                xs[filled:filled + chunk_xs.size] = chunk_xs
+                ys[filled:filled + chunk_ys.size] = chunk_ys
+                filled += chunk_xs.size
+            fraction = simulator.metrics.iterations / iterations
+            if self.bounds is not None:
+                fraction = max(fraction, filled / total)
+            self.progress.emit(min(100, int(100 * fraction)))
+            if time.monotonic() - last_update >= self.update_interval:
+                self.report(accumulator if self.density_mode else (xs[:filled], ys[:filled]))
+                reported = filled
+                last_update = time.monotonic()
+            if self.bounds is not None and filled >= total:
+                break
+        if reported != filled:
+            self.report(accumulator if self.density_mode else (xs[:filled], ys[:filled]))
+        if self.cache is not None:
+            if self.density_mode:
+                self.cache.put(key, (accumulator.image(), np.array(accumulator.bounds)))
+            else:
+                self.cache.put(key, (xs[:filled], ys[:filled]))
+        self.done.emit()
+
+    def crop(self, xs: np.ndarray, ys: np.ndarray, capacity: int) -> tuple:
+        '''
+        Keep at most capacity points of a chunk inside of the bounds.
+
+        :param xs: np.ndarray x values
+        :param ys: np.ndarray y values
+        :param capacity: int maximum number of points to keep
+        :return: tuple of kept xs (np.ndarray) and ys (np.ndarray)
+        '''
+        xmin, xmax, ymin, ymax = self.bounds
+        inside = (xs >= xmin) & (xs <= xmax) & (ys >= ymin) & (ys <= ymax)
+        return xs[inside][:capacity], ys[inside][:capacity]
+
+    def report(self, result) -> None:
+        '''
+        Report the points simulated so far.
+
+        :param result: DensityAccumulator in density mode, otherwise tuple of xs and ys
+        :return: None
+        '''
+        if self.density_mode:
+            self.image_ready.emit(result.image(), result.bounds)
+        else:
+            self.points_ready.emit(*result)
+
+
 class MainWindow(QtWidgets.QMainWindow):
     '''
     Represents the main window of the program.
@@ -24,14 +196,41 @@ class MainWindow(QtWidgets.QMainWindow):
         # Set initial map to TinkerBell Map.
         self.selected_map = self.default_maps['TinkerBell Map']()
 
+        # Plot every point as a scatter symbol unless density mode is on.
+        self.density_mode = False
+        # Simulations run in a background SimulationWorker.
+        # Workers that were cancelled are kept until their thread finishes.
+        self.worker = None
+        self.cancelled_workers = []
+        self.auto_range_pending = False
+        # After the view was zoomed or panned, only its visible rectangle
+        # (xmin, xmax, ymin, ymax) is simulated, see draw_viewport.
+        self.viewport = None
+        self.lyapunov_shown = False
+        self.viewport_timer = self.create_viewport_timer()
+        # Slider changes are coalesced by a throttling preview timer
+        # and a debouncing refine timer, see change_slider.
+        self.preview_timer = self.create_timer(PREVIEW_DELAY_MS, lambda: self.draw_map(preview=True))
+        self.refine_timer = self.create_timer(REFINE_DELAY_MS, self.draw_map)
+        # Finished results are cached, so revisiting a map is instant.
+        self.result_cache = result_cache.ResultCache()
+
         self.setWindowTitle("Draw Chaotic Map")
         self.title = self.create_title()
         self.dropdown_list_box = self.create_dropdown_list_box_maps()
+        self.new_map_button = self.create_new_map_button()
+        self.density_check_box = self.create_density_check_box()
+        self.lyapunov_button = self.create_lyapunov_button()
         # Create main text boxes with labels a, b, c, d, x0, y0.
         # The text boxes are always visible.
         # Note, when changing a text of a given text box, the effect will be seen
         # in the main window.
         self.main_text_boxes = self.create_labeled_main_text_boxes()
+        # Create a slider next to every main text box.
+        # Sliders span the current value of their attribute and are
+        # centered on it again whenever the value is set otherwise.
+        self.slider_ranges = {}
+        self.sliders = self.create_sliders(self.main_text_boxes)
         # Create sub text boxes with labels xmin, xmax, ymin, ymax, step
         # These boxes are important for changing sim range for maps that
         # require multi point sim.
@@ -40,29 +239,277 @@ class MainWindow(QtWidgets.QMainWindow):
         # in the main window.
         self.sub_text_boxes = self.create_labeled_sub_text_boxes()
         # Create containers for proper layout
-        self.container_lable_text_box = self.create_container_label_text_boxes(self.main_text_boxes)
+        self.container_lable_text_box = self.create_container_label_text_boxes(self.main_text_boxes, self.sliders)
         self.container_sub_text_boxes = self.create_container_sub_text_boxes(self.sub_text_boxes)
         self.plot_widget = self.create_graph_space()
+        # The plot items are created once and updated in place with setData,
+        # see plot_points and show_image.
+        self.points_item, self.image_item = self.create_plot_items()
+        self.progress_bar = self.create_progress_bar()
 
-        self.set_main_layout([self.title, self.dropdown_list_box, self.container_lable_text_box, self.container_sub_text_boxes, self.plot_widget])
+        self.set_main_layout([self.title, self.dropdown_list_box, self.new_map_button, self.density_check_box, self.lyapunov_button, self.container_lable_text_box, self.container_sub_text_boxes, self.plot_widget, self.progress_bar])
 
-        xs, ys = self.simulate_map()
-        self.plot_widget.clear()
-        self.plot_widget.plot(xs, ys, pen=None, symbol='o', symbolSize=1)
+        self.draw_map()
 
-    def simulate_map(self, n: int = 50000) -> tuple[list[int], list[int]]:
+    def simulate_map(self, n: int = 50000) -> tuple[np.ndarray, np.ndarray]:
         '''
         Simulate current map with a given number of iterations.
 
         :param n: int number of iterations for simulation
         :return: tuple in format (xs, ys)
-            where xs is the list of points on x-axis
-            and ys is the list of points on y-axis
+            where xs is the np.ndarray of points on x-axis
+            and ys is the np.ndarray of points on y-axis
         '''
-        simulator = chaotic_maps.Simulator(self.selected_map, n)
+        simulator = chaotic_maps.Simulator(self.selected_map, n, escape_radius=ESCAPE_RADIUS)
         xs, ys = simulator.simulate()
         return xs,ys
 
+    def draw_map(self, auto_range: bool = False, preview: bool = False) -> None:
+        '''
+        Start simulating current map in the background.
+        The plot is redrawn, either as a scatter plot or as a density image,
+        whenever the simulation reports new points.
+        A simulation that is still running is cancelled.
+        A preview simulates only a fraction of the usual number of iterations.
+
+        If the view was zoomed or panned, only points inside of it are kept,
+        and the simulation runs until the view holds as many points
+        as a full simulation would have.
+
+        :param auto_range: bool whether to fit the view to the new plot
+        :param preview: bool whether to draw a preview
+        :return: None
+        '''
+        self.cancel_simulation()
+        self.viewport_timer.stop()
+        if not preview:
+            self.refine_timer.stop()
+        self.lyapunov_shown = False
+        self.auto_range_pending = self.auto_range_pending or auto_range
+        if auto_range:
+            self.viewport = None
+        n = 1000000 if self.density_mode else 50000
+        if preview:
+            n //= PREVIEW_ITERATIONS_DIVISOR
+        if self.viewport is None:
+            worker = SimulationWorker(self.selected_map, n, self.density_mode, cache=self.result_cache)
+        else:
+            worker = SimulationWorker(
+                self.selected_map, n * VIEWPORT_ITERATIONS_FACTOR, self.density_mode,
+                cache=self.result_cache, bounds=self.viewport, target_points=n
+            )
+        worker.points_ready.connect(self.plot_points)
+        worker.image_ready.connect(self.plot_image)
+        worker.progress.connect(self.update_progress)
+        worker.done.connect(self.finish_simulation)
+        self.worker = worker
+        self.progress_bar.setValue(0)
+        worker.start()
+
+    def create_viewport_timer(self) -> QTimer:
+        '''
+        Create a timer drawing the visible rectangle of the view once
+        it stopped changing. Every change of the view restarts it.
+
+        :return: QTimer single shot viewport timer
+        '''
+        return self.create_timer(VIEWPORT_DELAY_MS, self.draw_viewport)
+
+    def create_timer(self, interval: int, callback) -> QTimer:
+        '''
+        Create a single shot timer.
+
+        :param interval: int number of milliseconds
+        :param callback: function called when the timer times out
+        :return: QTimer single shot timer
+        '''
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(interval)
+        timer.timeout.connect(callback)
+        return timer
+
+    def change_view_range(self) -> None:
+        '''
+        Process a zoom or pan of the view. Range changes of automatic
+        fitting are ignored, and so is the view of a Lyapunov heatmap.
+
+        :return: None
+        '''
+        view_box = self.plot_widget.plotItem.vb
+        if self.auto_range_pending or self.lyapunov_shown or any(view_box.autoRangeEnabled()):
+            return
+        self.viewport_timer.start()
+
+    def draw_viewport(self) -> None:
+        '''
+        Simulate current map again for the visible rectangle of the view.
+
+        :return: None
+        '''
+        (xmin, xmax), (ymin, ymax) = self.plot_widget.plotItem.vb.viewRange()
+        self.viewport = (xmin, xmax, ymin, ymax)
+        self.draw_map()
+
+    def cancel_simulation(self) -> None:
+        '''
+        Cancel the running simulation, if there is one.
+        Its thread is kept until it finishes.
+
+        :return: None
+        '''
+        worker = self.worker
+        if worker is None:
+            return
+        worker.cancel()
+        worker.points_ready.disconnect()
+        worker.image_ready.disconnect()
+        worker.progress.disconnect()
+        worker.done.disconnect()
+        self.worker = None
+        # finished is connected before the thread is checked, so a thread
+        # finishing in between is still released.
+        self.cancelled_workers.append(worker)
+        worker.finished.connect(lambda worker=worker: self.release_worker(worker))
+        if worker.isFinished():
+            self.release_worker(worker)
+
+    def release_worker(self, worker) -> None:
+        '''
+        Forget a cancelled worker whose thread finished.
+        Releasing a worker twice does nothing.
+
+        :param worker: SimulationWorker that was cancelled
+        :return: None
+        '''
+        if worker in self.cancelled_workers:
+            self.cancelled_workers.remove(worker)
+
+    def is_current_worker(self) -> bool:
+        '''
+        Check whether the signal being processed comes from the running
+        simulation. Signals of cancelled workers can still be queued.
+
+        :return: bool
+        '''
+        return self.worker is not None and self.sender() is self.worker
+
+    def update_progress(self, percent: int) -> None:
+        '''
+        Show the progress of the running simulation.
+
+        :param percent: int progress in range [0, 100]
+        :return: None
+        '''
+        if self.is_current_worker():
+            self.progress_bar.setValue(percent)
+
+    def finish_simulation(self) -> None:
+        '''
+        Process the end of the running simulation.
+
+        :return: None
+        '''
+        if not self.is_current_worker():
+            return
+        self.worker = None
+        self.auto_range_pending = False
+
+    def plot_points(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        '''
+        Redraw the plot as a scatter plot of given points.
+        The arrays are passed to the scatter item as they are,
+        without converting or copying them.
+
+        :param xs: np.ndarray points on x-axis
+        :param ys: np.ndarray points on y-axis
+        :return: None
+        '''
+        if not self.is_current_worker():
+            return
+        self.image_item.clear()
+        self.image_item.hide()
+        self.points_item.setData(xs, ys)
+        self.points_item.show()
+        self.apply_auto_range()
+
+    def plot_image(self, image: np.ndarray, bounds: tuple) -> None:
+        '''
+        Redraw the plot as a density image.
+
+        :param image: np.ndarray image indexed as image[x, y]
+        :param bounds: tuple of format (xmin, xmax, ymin, ymax)
+        :return: None
+        '''
+        if not self.is_current_worker():
+            return
+        self.show_image(image, bounds)
+        self.apply_auto_range()
+
+    def apply_auto_range(self) -> None:
+        '''
+        Fit the view to the plot while a simulation that
+        requested it is running.
+
+        :return: None
+        '''
+        if self.auto_range_pending:
+            self.plot_widget.plotItem.vb.autoRange()
+
+    def show_image(self, image: np.ndarray, bounds: tuple, lookup_table: np.ndarray = None) -> None:
+        '''
+        Show an image with values in range [0, 1] in the graph space
+        instead of the scatter plot. By default higher values are drawn darker.
+
+        :param image: np.ndarray image indexed as image[x, y]
+        :param bounds: tuple of format (xmin, xmax, ymin, ymax)
+        :param lookup_table: np.ndarray of uint8 colors for values from 0 to 1, or None
+        :return: None
+        '''
+        self.points_item.clear()
+        self.points_item.hide()
+        if lookup_table is None:
+            lookup_table = GRAYSCALE_LOOKUP_TABLE
+        self.image_item.setLookupTable(lookup_table, update=False)
+        self.image_item.setImage(image, levels=(0, 1))
+        xmin, xmax, ymin, ymax = bounds
+        self.image_item.setRect(QRectF(xmin, ymin, xmax - xmin, ymax - ymin))
+        self.image_item.show()
+
+    def show_lyapunov(self, x_attribute: str = None, y_attribute: str = None, span: float = 1, resolution: int = 100, iter_n: int = 300) -> np.ndarray:
+        '''
+        Show the largest Lyapunov exponent of current map over a grid of two
+        of its attributes, centered on their current values, as a heatmap.
+        By default the grid spans the first two constants of the map,
+        a map with fewer constants raises ValueError.
+        Chaotic regions are drawn red, ordered ones blue.
+        A simulation that is still running is cancelled.
+
+        :param x_attribute: str attribute along x-axis or None
+        :param y_attribute: str attribute along y-axis or None
+        :param span: float distance from the current values to the edges of the grid
+        :param resolution: int number of grid points along each axis
+        :param iter_n: int number of iterations the exponents are averaged over
+        :return: np.ndarray exponents indexed as exponents[x, y]
+        '''
+        if x_attribute is None or y_attribute is None:
+            constants = self.selected_map.get_constants()
+            if len(constants) < 2:
+                raise ValueError(f'A Lyapunov map needs two constants, the map has {len(constants)}.')
+            x_attribute, y_attribute = constants[:2]
+        self.cancel_simulation()
+        x_center = self.selected_map.get_attribute(x_attribute)
+        y_center = self.selected_map.get_attribute(y_attribute)
+        x_values = np.linspace(x_center - span, x_center + span, resolution)
+        y_values = np.linspace(y_center - span, y_center + span, resolution)
+        exponents = lyapunov.lyapunov_grid(self.selected_map, x_attribute, x_values, y_attribute, y_values, iter_n=iter_n)
+        step = 2*span / max(resolution - 1, 1)
+        bounds = (x_values[0] - step/2, x_values[-1] + step/2, y_values[0] - step/2, y_values[-1] + step/2)
+        self.lyapunov_shown = True
+        self.show_image(lyapunov.normalize(exponents), bounds, lyapunov.HEATMAP_LOOKUP_TABLE)
+        self.plot_widget.plotItem.vb.autoRange()
+        return exponents
+
     def set_main_layout(self, widgets) -> None:
         '''
         Set the main layout for the main window.
@@ -77,13 +524,14 @@ class MainWindow(QtWidgets.QMainWindow):
         widget.setLayout(layout)
         self.setCentralWidget(widget)
     
-    def create_container_text_boxes(self, text_boxes: dict[str, QtWidgets.QLineEdit], layout_type: Union[QtWidgets.QVBoxLayout, QtWidgets.QHBoxLayout]) -> QtWidgets.QWidget:
+    def create_container_text_boxes(self, text_boxes: dict[str, QtWidgets.QLineEdit], layout_type: Union[QtWidgets.QVBoxLayout, QtWidgets.QHBoxLayout], sliders: dict[str, QtWidgets.QSlider] = None) -> QtWidgets.QWidget:
         '''
         Create a container of labeled text boxes with a specific layout type
         out of a provided dictionary of str labels and coresponding text boxes.
 
         :param text_boxes: dict of format [str: QLineEdit]
         :param layout_type: QtWidgets.QVBoxLayout or QtWidgets.QHBoxLayout - preferred layout type
+        :param sliders: dict of format [str: QSlider] or None
         :return: QWidget a widget out of text_boxes with preferred layout type
         '''
         valid_layout = (QtWidgets.QVBoxLayout, QtWidgets.QHBoxLayout)
@@ -93,18 +541,21 @@ class MainWindow(QtWidgets.QMainWindow):
         widget = QtWidgets.QWidget()
         layout = layout_type()
         for label_text, widget_textbox in text_boxes.items():
-            container_text_box = self.create_container_text_box(label_text, widget_textbox)
+            widget_slider = sliders.get(label_text) if sliders else None
+            container_text_box = self.create_container_text_box(label_text, widget_textbox, widget_slider)
             layout.addWidget(container_text_box)
         widget.setLayout(layout)
         return widget
     
-    def create_container_text_box(self, label_text: str, widget_textbox: QtWidgets.QLineEdit) -> QtWidgets.QWidget:
+    def create_container_text_box(self, label_text: str, widget_textbox: QtWidgets.QLineEdit, widget_slider: QtWidgets.QSlider = None) -> QtWidgets.QWidget:
         '''
         Create a container widget out of str label name and textbox widget.
-        Label name is placed to the left of the textbox.
+        Label name is placed to the left of the textbox,
+        and a slider, if one is given, to the right of it.
 
         :param label_text: str label name
         :param widget_textbox: QLineEdit textbox
+        :param widget_slider: QSlider slider or None
         :return: QWidget container widget with textbox and its label to the left of it.
         '''
         widget = QtWidgets.QWidget()
@@ -115,19 +566,22 @@ class MainWindow(QtWidgets.QMainWindow):
         widget_label = QtWidgets.QLabel(label_text)
         layout.addWidget(widget_label)
         layout.addWidget(widget_textbox)
+        if widget_slider is not None:
+            layout.addWidget(widget_slider)
         widget.setLayout(layout)
         return widget
     
-    def create_container_label_text_boxes(self, text_boxes):
+    def create_container_label_text_boxes(self, text_boxes, sliders=None):
         '''
         Create a container of labeled text boxes with a QVBoxLayout
         out of a provided dictionary of str labels and coresponding text boxes.
         The container is inteded to be later used inside other layout.
 
         :param text_boxes: dict of format [str: QLineEdit].
+        :param sliders: dict of format [str: QSlider] or None
         :return: QWidget a widget out of text_boxes with QVBoxLayout
         '''
-        return self.create_container_text_boxes(text_boxes, QtWidgets.QVBoxLayout)
+        return self.create_container_text_boxes(text_boxes, QtWidgets.QVBoxLayout, sliders)
 
     def create_container_sub_text_boxes(self, text_boxes):
         '''
@@ -190,13 +644,71 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def change_text_boxes(self) -> None:
         '''
-        Update text box values with current map constants.
+        Update text box values and sliders with current map constants.
 
         :return: None
         '''
         attributes = self.selected_map.get_attributes()
         for attribute, value in attributes.items():
             self.main_text_boxes[attribute].setText(str(value))
+            self.center_slider(attribute)
+
+    def create_sliders(self, text_boxes: dict[str, QtWidgets.QLineEdit]) -> dict[str, QtWidgets.QSlider]:
+        '''
+        Create a dictionary of labels and corresponding sliders.
+        Moving a slider updates the selected map and its text box,
+        see change_slider.
+
+        :param text_boxes: dict of format [str: QLineEdit]
+        :return: dict in format {str: QtWidgets.QSlider}
+        '''
+        sliders = {}
+        for label_text in text_boxes:
+            widget = QtWidgets.QSlider(Qt.Horizontal)
+            widget.setRange(0, SLIDER_STEPS)
+            widget.valueChanged.connect(lambda position, label_text=label_text: self.change_slider(label_text, position))
+            sliders[label_text] = widget
+        for label_text in sliders:
+            self.center_slider(label_text, sliders)
+        return sliders
+
+    def center_slider(self, label_text: str, sliders: dict[str, QtWidgets.QSlider] = None) -> None:
+        '''
+        Center a slider on the current value of its attribute.
+        The slider spans the value plus or minus its magnitude, at least 1.
+
+        :param label_text: str name of the attribute
+        :param sliders: dict of format [str: QSlider], by default the sliders of the window
+        :return: None
+        '''
+        widget = (sliders or self.sliders)[label_text]
+        value = float(self.selected_map.get_attribute(label_text))
+        span = max(1.0, abs(value))
+        self.slider_ranges[label_text] = (value - span, value + span)
+        widget.blockSignals(True)
+        widget.setValue(SLIDER_STEPS // 2)
+        widget.blockSignals(False)
+
+    def change_slider(self, label_text: str, position: int) -> None:
+        '''
+        Process a slider change. The selected map is updated at once,
+        while drawing is coalesced: a preview is drawn at most once
+        per frame, and the full plot once the slider stopped moving.
+        A newer change cancels both a running preview and a running
+        refinement.
+
+        :param label_text: str name of the attribute
+        :param position: int position of the slider in range [0, SLIDER_STEPS]
+        :return: None
+        '''
+        low, high = self.slider_ranges[label_text]
+        # Round to what the text box shows, so both agree.
+        value = float(f'{low + (high - low) * position / SLIDER_STEPS:.6g}')
+        self.selected_map.set_attribute(label_text, value)
+        self.main_text_boxes[label_text].setText(str(value))
+        if not self.preview_timer.isActive():
+            self.preview_timer.start()
+        self.refine_timer.start()
 
     def create_dropdown_list_box_maps(self) -> QtWidgets.QComboBox:
         '''
@@ -212,6 +724,106 @@ class MainWindow(QtWidgets.QMainWindow):
         widget.currentTextChanged.connect(self.change_map_selection)
         return widget
 
+    def create_new_map_button(self) -> QtWidgets.QPushButton:
+        '''
+        Create a button defining a new map from expressions of x_new and y_new,
+        see ask_expression_map.
+
+        :return: QtWidgets.QPushButton new map button
+        '''
+        widget = QtWidgets.QPushButton('New map from expressions')
+        widget.clicked.connect(self.ask_expression_map)
+        return widget
+
+    def ask_expression_map(self) -> None:
+        '''
+        Ask for the name and the expressions of a new map and select it.
+        Invalid expressions are reported and no map is added.
+
+        :return: None
+        '''
+        fields = []
+        for label in ['Name', 'x_new (of x, y, a, b, c, d)', 'y_new (of x, y, a, b, c, d)']:
+            text, accepted = QtWidgets.QInputDialog.getText(self, 'New map', label)
+            if not accepted or not text.strip():
+                return
+            fields.append(text.strip())
+        try:
+            self.add_expression_map(*fields)
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self, 'New map', str(error))
+
+    def add_expression_map(self, map_name: str, x_expression: str, y_expression: str) -> None:
+        '''
+        Register a map defined by expressions, add it to the dropdown box
+        and select it. Its constants start at 0 and can be changed
+        in the text boxes. Raises ValueError for an invalid expression
+        or a name that is taken by a built-in map.
+
+        :param map_name: str name of the map
+        :param x_expression: str expression of x_new
+        :param y_expression: str expression of y_new
+        :return: None
+        '''
+        expression_maps.register_map(map_name, x_expression, y_expression, replace=True)
+        if self.dropdown_list_box.findText(map_name) < 0:
+            self.dropdown_list_box.addItem(map_name)
+        if self.dropdown_list_box.currentText() == map_name:
+            self.change_map_selection(map_name)
+        else:
+            self.dropdown_list_box.setCurrentText(map_name)
+
+    def create_density_check_box(self) -> QtWidgets.QCheckBox:
+        '''
+        Create a check box switching between scatter plot and density image.
+        When it is toggled, the map plot will be redrawn.
+
+        :return: QtWidgets.QCheckBox density mode check box
+        '''
+        widget = QtWidgets.QCheckBox('Density')
+        widget.setChecked(self.density_mode)
+        widget.toggled.connect(self.change_density_mode)
+        return widget
+
+    def create_lyapunov_button(self) -> QtWidgets.QPushButton:
+        '''
+        Create a button showing the Lyapunov exponents of current map
+        over its first two constants, see update_lyapunov_button.
+        Changing the map or its constants draws the map again.
+
+        :return: QtWidgets.QPushButton Lyapunov button
+        '''
+        widget = QtWidgets.QPushButton()
+        widget.clicked.connect(lambda: self.show_lyapunov())
+        self.update_lyapunov_button(widget)
+        return widget
+
+    def update_lyapunov_button(self, widget: QtWidgets.QPushButton = None) -> None:
+        '''
+        Label the Lyapunov button with the constants of current map
+        it spans, and disable it for maps with fewer than two constants.
+
+        :param widget: QtWidgets.QPushButton, by default the Lyapunov button of the window
+        :return: None
+        '''
+        widget = widget or self.lyapunov_button
+        constants = self.selected_map.get_constants()
+        if len(constants) >= 2:
+            widget.setText(f'Lyapunov {constants[0]} × {constants[1]}')
+        else:
+            widget.setText('Lyapunov (needs two constants)')
+        widget.setEnabled(len(constants) >= 2)
+
+    def change_density_mode(self, checked: bool) -> None:
+        '''
+        Switch density mode and redraw the plot.
+
+        :param checked: bool whether density mode is on
+        :return: None
+        '''
+        self.density_mode = checked
+        self.draw_map(auto_range=True)
+
     def change_map_selection(self, map_name: str) -> None:
         '''
         Process map selection change by running a new simulation
@@ -221,13 +833,11 @@ class MainWindow(QtWidgets.QMainWindow):
         :return: None
         '''
         self.selected_map = self.default_maps[map_name]()
-        xs, ys = self.simulate_map()
         self.change_text_boxes()
         self.change_sub_text_boxes()
-        self.plot_widget.clear()
-        self.plot_widget.plot(xs, ys, pen=None, symbol='o', symbolSize=1)
+        self.update_lyapunov_button()
         # Reset zoom of the plot_widget to fill the plot fully with graph
-        self.plot_widget.plotItem.vb.autoRange()
+        self.draw_map(auto_range=True)
     
     def change_sub_text_boxes(self) -> None:
         '''
@@ -257,6 +867,16 @@ class MainWindow(QtWidgets.QMainWindow):
         widget.setAlignment(Qt.AlignHCenter | Qt.AlignVCenter)
         return widget
     
+    def create_progress_bar(self) -> QtWidgets.QProgressBar:
+        '''
+        Create progress bar widget for background simulations.
+
+        :return: QProgressBar progress bar in range [0, 100]
+        '''
+        widget = QtWidgets.QProgressBar()
+        widget.setRange(0, 100)
+        return widget
+
     def create_graph_space(self) -> pg.PlotWidget:
         '''
         Create graph space widget.
@@ -265,7 +885,24 @@ class MainWindow(QtWidgets.QMainWindow):
         '''
         plot_widget = pg.PlotWidget()
         plot_widget.setBackground('w')
+        plot_widget.sigRangeChanged.connect(self.change_view_range)
         return plot_widget
+
+    def create_plot_items(self) -> tuple:
+        '''
+        Create the scatter item and the image item of the graph space.
+        Only one of them is visible at a time.
+
+        :return: tuple of PlotDataItem scatter item and ImageItem image item
+        '''
+        # Points of escaped orbits are dropped before they are plotted,
+        # so the finite check and the range limiting can be skipped.
+        points_item = pg.PlotDataItem(pen=None, symbol='o', symbolSize=1, skipFiniteCheck=True, dynamicRangeLimit=None)
+        image_item = pg.ImageItem()
+        image_item.hide()
+        self.plot_widget.addItem(image_item)
+        self.plot_widget.addItem(points_item)
+        return points_item, image_item
     
     def update_map(self, label_text: str, entered_text: str) -> None:
         '''
@@ -284,11 +921,32 @@ class MainWindow(QtWidgets.QMainWindow):
                 entered_value = 0
                 self.main_text_boxes[label_text].setText(str(0))
             Map.set_attribute(label_text, entered_value)
-            xs, ys = self.simulate_map()
-            self.plot_widget.clear()
-            self.plot_widget.plot(xs, ys, pen=None, symbol='o', symbolSize=1)
+            if label_text in self.sliders:
+                self.center_slider(label_text)
+            self.draw_map()
         else:
-            self.plot_widget.clear()
+            self.clear_plot()
+
+    def clear_plot(self) -> None:
+        '''
+        Remove all points and images from the graph space.
+
+        :return: None
+        '''
+        self.points_item.clear()
+        self.image_item.clear()
+
+    def closeEvent(self, event) -> None:
+        '''
+        Cancel the running simulation and wait for all
+        simulation threads before the window closes.
+
+        :return: None
+        '''
+        self.cancel_simulation()
+        for worker in list(self.cancelled_workers):
+            worker.wait()
+        super(MainWindow, self).closeEvent(event)
 
 def main():
     app = QtWidgets.QApplication(sys.argv)
@@ -0,0 +1,157 @@
+import copy
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from chaotic_maps import ChaoticMap
+from sweeps import SWEEP_ATTRIBUTES
+
+# Diverging colors from blue (ordered, negative exponents)
+# over white (zero) to red (chaotic, positive exponents).
+_t = np.linspace(-1, 1, 256)
+HEATMAP_LOOKUP_TABLE = np.round(255 * np.stack([
+    np.where(_t < 0, 1 + _t, 1),
+    1 - np.abs(_t),
+    np.where(_t < 0, 1, 1 - _t)
+], axis=1)).astype(np.uint8)
+
+
+def lyapunov_grid(
+    chaotic_map: ChaoticMap,
+    x_attribute: str,
+    x_values,
+    y_attribute: str,
+    y_values,
+    iter_n: int = 1000,
+    burn_in: int = 100,
+    tile_size: int = 65536,
+    workers: int = 1
+):
+    '''
+    Calculate the largest Lyapunov exponent of a map over a 2D grid
+    of attribute values, such as a x b. Attributes are a, b, c, d, x0, y0.
+    The grid is split into tiles of at most tile_size points, so memory
+    is bounded by the tile size rather than by the size of the grid.
+    Tiles run in worker processes if workers is not 1.
+
+    :param chaotic_map: instance inheriting from the abstract ChaoticMap class
+        with step_batch and jacobian_batch methods
+    :param x_attribute: str name of the attribute along the first axis
+    :param x_values: sequence of float values of x_attribute
+    :param y_attribute: str name of the attribute along the second axis
+    :param y_values: sequence of float values of y_attribute
+    :param iter_n: int number of iterations the exponent is averaged over
+    :param burn_in: int number of iterations calculated before
+    :param tile_size: int maximum number of grid points stepped together
+    :param workers: int number of worker processes, None for one per CPU
+    :return: np.ndarray exponents indexed as exponents[x, y],
+        nan where the orbit diverged
+    '''
+    for attribute in [x_attribute, y_attribute]:
+        if attribute not in SWEEP_ATTRIBUTES:
+            raise ValueError(f'Cannot sweep {attribute!r}. Expected one of {", ".join(SWEEP_ATTRIBUTES)}.')
+    if x_attribute == y_attribute:
+        raise ValueError('Attributes of the grid axes must be different.')
+    if not callable(getattr(chaotic_map, 'jacobian_batch', None)):
+        raise ValueError(f'{type(chaotic_map).__name__} has no jacobian_batch method.')
+    grid_xs, grid_ys = np.meshgrid(np.asarray(x_values, dtype=float), np.asarray(y_values, dtype=float), indexing='ij')
+    grid_xs, grid_ys = grid_xs.ravel(), grid_ys.ravel()
+    starts = range(0, len(grid_xs), tile_size)
+    tiles = [
+        (chaotic_map, {x_attribute: grid_xs[start:start + tile_size], y_attribute: grid_ys[start:start + tile_size]}, iter_n, burn_in)
+        for start in starts
+    ]
+    if workers == 1:
+        exponents = [lyapunov_tile(*tile) for tile in tiles]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            exponents = list(pool.map(lyapunov_tile, *zip(*tiles)))
+    exponents = np.concatenate(exponents) if exponents else np.empty(0)
+    return exponents.reshape(len(x_values), len(y_values))
+
+
+def lyapunov_tile(chaotic_map: ChaoticMap, values: dict, iter_n: int, burn_in: int):
+    '''
+    Calculate the largest Lyapunov exponent for a tile of attribute values.
+    A tangent vector per point is multiplied by the Jacobian of the map
+    every iteration and renormalized, the exponent is the average
+    logarithm of its growth.
+
+    :param chaotic_map: instance inheriting from the abstract ChaoticMap class
+    :param values: dict of attribute names and np.ndarray values of the same length
+    :param iter_n: int number of iterations the exponent is averaged over
+    :param burn_in: int number of iterations calculated before
+    :return: np.ndarray exponents, nan where the orbit diverged
+    '''
+    chaotic_map = copy.copy(chaotic_map)
+    n = len(next(iter(values.values())))
+    xs = np.full(n, float(chaotic_map.x0))
+    ys = np.full(n, float(chaotic_map.y0))
+    for attribute, attribute_values in values.items():
+        if attribute == 'x0':
+            xs = np.array(attribute_values, dtype=float)
+        elif attribute == 'y0':
+            ys = np.array(attribute_values, dtype=float)
+        else:
+            setattr(chaotic_map, attribute, attribute_values)
+    us = np.full(n, np.sqrt(0.5))
+    vs = np.full(n, np.sqrt(0.5))
+    total = np.zeros(n)
+    tiny = np.finfo(float).tiny
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        for _ in range(burn_in):
+            xs, ys = chaotic_map.step_batch(xs, ys)
+        for _ in range(iter_n):
+            dx_dx, dx_dy, dy_dx, dy_dy = chaotic_map.jacobian_batch(xs, ys)
+            us, vs = dx_dx*us + dx_dy*vs, dy_dx*us + dy_dy*vs
+            # A zero vector (superstable orbit) counts as the smallest float.
+            norms = np.maximum(np.hypot(us, vs), tiny)
+            total += np.log(norms)
+            us /= norms
+            vs /= norms
+            xs, ys = chaotic_map.step_batch(xs, ys)
+    exponents = total / max(iter_n, 1)
+    exponents[~(np.isfinite(xs) & np.isfinite(ys))] = np.nan
+    return exponents
+
+
+def normalize(exponents, limit: float = None):
+    '''
+    Scale exponents to range [0, 1] with zero at 0.5,
+    so they can be drawn with HEATMAP_LOOKUP_TABLE.
+    Diverged points (nan) are drawn like a zero exponent.
+
+    :param exponents: np.ndarray exponents
+    :param limit: float absolute exponent drawn at 0 and 1, by default the largest one
+    :return: np.ndarray image
+    '''
+    finite = np.isfinite(exponents)
+    if limit is None:
+        limit = np.abs(exponents[finite]).max() if finite.any() else 1
+    limit = limit or 1
+    image = np.clip(0.5 + exponents / (2*limit), 0, 1)
+    image[~finite] = 0.5
+    return image
+
+
+def to_rgb(exponents, limit: float = None):
+    '''
+    Convert exponents indexed as exponents[x, y] into RGB image rows,
+    with y growing upwards like in the plot.
+
+    :param exponents: np.ndarray exponents
+    :param limit: float see normalize
+    :return: np.ndarray of uint8 with shape (height, width, 3)
+    '''
+    indices = np.round(normalize(exponents, limit) * 255).astype(int)
+    return HEATMAP_LOOKUP_TABLE[indices].transpose(1, 0, 2)[::-1]
+
+
+def save_heatmap(exponents, path: str, limit: float = None) -> None:
+    '''
+    Save exponents as a PNG heatmap.
+
+    :param exponents: np.ndarray exponents indexed as exponents[x, y]
+    :param path: str path of the PNG file
+    :param limit: float see normalize
+    '''
+    Image.fromarray(np.ascontiguousarray(to_rgb(exponents, limit))).save(path, format='PNG')
@@ -0,0 +1,294 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+class ResultCache:
+    '''
+    Represents an in-memory cache of simulation results.
+    Results are tuples of numpy arrays stored under hashable keys,
+    see Simulator.cache_key. When the cached arrays take more
+    than max_bytes, the least recently used results are evicted.
+    The cache can be shared between threads.
+    '''
+    def __init__(self, max_bytes: int = 256 * 2**20) -> None:
+        '''
+        Initialize an empty result cache with a given byte budget.
+        By default, the budget is 256 MiB.
+
+        :param max_bytes: int maximum number of bytes of cached arrays
+        '''
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''
+        Get the result cached under a given key and mark it
+        as the most recently used one.
+
+        :param key: hashable key
+        :return: tuple of np.ndarray, otherwise None
+        '''
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result) -> tuple:
+        '''
+        Cache a result under a given key. The cache keeps read-only views
+        of the arrays of the result, so later users can't change the cached
+        values, while the arrays of the caller stay writable.
+        Arrays that are views, such as the trajectories of a simulator,
+        are copied, so the cache doesn't keep larger buffers alive
+        that don't count towards its budget.
+        Least recently used results are evicted until the cache fits
+        into its byte budget. A result larger than the budget is not cached.
+
+        :param key: hashable key
+        :param result: tuple of np.ndarray
+        :return: the result as a tuple of read-only arrays
+        '''
+        result = tuple(np.asarray(array) for array in result)
+        result = tuple(array.view() if array.base is None else array.copy() for array in result)
+        for array in result:
+            array.setflags(write=False)
+        nbytes = sum(array.nbytes for array in result)
+        with self._lock:
+            if key in self._results:
+                self.nbytes -= self._nbytes(self._results.pop(key))
+            if nbytes > self.max_bytes:
+                return result
+            self._results[key] = result
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._results.popitem(last=False)
+                self.nbytes -= self._nbytes(evicted)
+                self.evictions += 1
+        return result
+
+    def clear(self) -> None:
+        '''
+        Remove all cached results. Counters are kept.
+        '''
+        with self._lock:
+            self._results.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        '''
+        Get cache counters.
+
+        :return: dict with hits, misses, evictions, entries and nbytes
+        '''
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._results),
+                'nbytes': self.nbytes
+            }
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._results
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._results)
+
+    def _nbytes(self, result) -> int:
+        return sum(array.nbytes for array in result)
+
+
+class DiskCache:
+    '''
+    Represents a persistent cache of simulation results in a directory.
+    It has the same get and put methods as ResultCache, so it can be
+    given to a Simulator, and it can be shared between sessions
+    and processes.
+    Every result is stored as one .npy file per array, named after
+    a hash of its key, next to a small .json index entry.
+    Cached arrays are memory-mapped read-only, so a hit doesn't copy
+    or recompute anything. When the stored arrays take more than
+    max_bytes, the least recently used results are deleted.
+    '''
+    def __init__(self, directory: str, max_bytes: int = 2 * 2**30) -> None:
+        '''
+        Initialize a disk cache in a given directory. The directory
+        is created if it doesn't exist. By default, the budget is 2 GiB.
+
+        :param directory: str path of the cache directory
+        :param max_bytes: int maximum number of bytes of stored arrays
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        '''
+        Get the result stored under a given key and mark it
+        as the most recently used one.
+
+        :param key: hashable key
+        :return: tuple of read-only np.memmap, otherwise None
+        '''
+        digest = key_digest(key)
+        try:
+            with open(self._path(digest, '.json')) as file:
+                entry = json.load(file)
+            result = tuple(
+                np.load(self._path(digest, f'_{i}.npy'), mmap_mode='r')
+                for i in range(entry['arrays'])
+            )
+            os.utime(self._path(digest, '.json'))
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key, result) -> tuple:
+        '''
+        Store a result under a given key. The index entry is written
+        after the arrays, so a partly written result is never read.
+        Least recently used results are deleted until the cache fits
+        into its byte budget. A result larger than the budget is not stored.
+        The arrays of the caller stay writable.
+
+        :param key: hashable key
+        :param result: tuple of np.ndarray
+        :return: the result as a tuple of read-only views
+        '''
+        result = tuple(np.asarray(array).view() for array in result)
+        for array in result:
+            array.setflags(write=False)
+        nbytes = sum(array.nbytes for array in result)
+        if nbytes > self.max_bytes:
+            return result
+        digest = key_digest(key)
+        for i, array in enumerate(result):
+            self._write(self._path(digest, f'_{i}.npy'), lambda file, array=array: np.save(file, array))
+        entry = {'key': repr(key), 'arrays': len(result), 'nbytes': nbytes}
+        self._write(self._path(digest, '.json'), lambda file: file.write(json.dumps(entry).encode()))
+        self.evict()
+        return result
+
+    def evict(self) -> None:
+        '''
+        Delete least recently used results until the stored
+        arrays fit into the byte budget.
+        '''
+        entries = self.entries()
+        total = sum(entry['nbytes'] for entry in entries)
+        for entry in sorted(entries, key=lambda entry: entry['last_used']):
+            if total <= self.max_bytes:
+                break
+            self._remove(entry['digest'], entry['arrays'])
+            total -= entry['nbytes']
+            self.evictions += 1
+
+    def entries(self) -> list:
+        '''
+        Read the index entries of all stored results.
+
+        :return: list of dicts with digest, arrays, nbytes and last_used
+        '''
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path) as file:
+                    entry = json.load(file)
+                entry['last_used'] = os.path.getmtime(path)
+            except (OSError, ValueError):
+                continue
+            entry['digest'] = name[:-len('.json')]
+            entries.append(entry)
+        return entries
+
+    def clear(self) -> None:
+        '''
+        Delete all stored results. Counters are kept.
+        '''
+        for entry in self.entries():
+            self._remove(entry['digest'], entry['arrays'])
+
+    def stats(self) -> dict:
+        '''
+        Get cache counters.
+
+        :return: dict with hits, misses, evictions, entries and nbytes
+        '''
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'nbytes': sum(entry['nbytes'] for entry in entries)
+        }
+
+    def __contains__(self, key) -> bool:
+        return os.path.exists(self._path(key_digest(key), '.json'))
+
+    def __len__(self) -> int:
+        return len(self.entries())
+
+    def _path(self, digest: str, suffix: str) -> str:
+        return os.path.join(self.directory, digest + suffix)
+
+    def _write(self, path: str, write) -> None:
+        # Write to a temporary file first, so readers in other
+        # processes never see a partly written file.
+        temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'wb') as file:
+            write(file)
+        os.replace(temporary_path, path)
+
+    def _remove(self, digest: str, arrays: int) -> None:
+        # The index entry goes first, so the result is a miss from now on.
+        for suffix in ['.json'] + [f'_{i}.npy' for i in range(arrays)]:
+            try:
+                os.remove(self._path(digest, suffix))
+            except OSError:
+                pass
+
+
+def key_digest(key) -> str:
+    '''
+    Get a stable hash of a cache key, which is the same
+    in every process and session.
+    Numbers are compared by value, so 0, 0.0 and np.float64(0) are the same.
+
+    :param key: tuple key of str, numbers and tuples
+    :return: str hexadecimal digest
+    '''
+    return hashlib.sha256(json.dumps(_normalize_key(key)).encode()).hexdigest()
+
+
+def _normalize_key(key):
+    if isinstance(key, (tuple, list)):
+        return [_normalize_key(item) for item in key]
+    if isinstance(key, (bool, np.bool_)):
+        return bool(key)
+    if isinstance(key, (int, float, np.integer, np.floating)):
+        return repr(float(key))
+    return str(key)
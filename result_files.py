@@ -0,0 +1,297 @@
+'''
+Chunked binary files of simulation results.
+
+A result file starts with a header, followed by chunks of points:
+
+    b'CHAOSRES', uint32 format version, uint32 header length,
+    JSON header (map, class, constants, origin, sim range, iterations, dtype ...),
+    padded with spaces to a multiple of ALIGNMENT bytes
+    then for every chunk:
+    b'CHNK', uint32 number of columns (2), uint64 number of points,
+    the x column, the y column, each padded to a multiple of ALIGNMENT bytes
+
+All numbers are little-endian, columns are stored in the dtype of the header.
+Chunks can be appended while a simulation streams, see ResultWriter, and any
+slice of points can be read through memory mapping without loading the whole
+file, see ResultReader. A chunk that was not written completely, such as the
+last one of a crashed writer, is ignored by readers and dropped by appending
+writers.
+'''
+import json
+import os
+import struct
+import numpy as np
+
+FILE_MAGIC = b'CHAOSRES'
+CHUNK_MAGIC = b'CHNK'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_FILE_HEADER = struct.Struct('<8sII')
+_CHUNK_HEADER = struct.Struct('<4sIQ')
+
+
+def simulation_header(simulator) -> dict:
+    '''
+    Describe a simulation for the header of a result file.
+
+    :param simulator: Simulator of the chaotic map
+    :return: dict of map identity and class, constants, origin, sim range,
+        escape radius, burn in, decimation, number of iterations and
+        starting points, and dtype
+    '''
+    chaotic_map = simulator.chaotic_map
+    map_class = type(chaotic_map)
+    x0s, _ = simulator.get_origins()
+    return {
+        'map': chaotic_map.get_identity(),
+        'map_class': f'{map_class.__module__}.{map_class.__qualname__}',
+        'constants': {name: float(getattr(chaotic_map, name)) for name in ['a', 'b', 'c', 'd']},
+        'origin': [float(chaotic_map.x0), float(chaotic_map.y0)],
+        'sim_range': [float(value) for value in chaotic_map.sim_range or chaotic_map.default_range],
+        'escape_radius': simulator.escape_radius,
+        'burn_in': simulator.burn_in,
+        'decimate': simulator.decimate,
+        'iter_n': simulator.iter_n,
+        'lanes': int(x0s.size),
+        'dtype': simulator.dtype.name
+    }
+
+
+def write_simulation(simulator, path: str, chunk_size: int = 65536, metadata: dict = None) -> int:
+    '''
+    Simulate the chaotic map of a simulator and write its points into a new
+    result file chunk by chunk, in the order of Simulator.iter_chunks:
+    row by row, every row holding a point of every starting point.
+    Only one chunk is in memory at a time.
+
+    :param simulator: Simulator of the chaotic map
+    :param path: str path of the result file
+    :param chunk_size: int maximum number of points per chunk
+    :param metadata: dict of additional JSON serializable header entries or None
+    :return: int number of written points
+    '''
+    header = {**simulation_header(simulator), **(metadata or {})}
+    with ResultWriter(path, header, simulator.dtype) as writer:
+        for xs, ys in simulator.iter_chunks(chunk_size):
+            writer.append(xs, ys)
+        return writer.n_points
+
+
+def _padded(nbytes: int) -> int:
+    return -(-nbytes // ALIGNMENT) * ALIGNMENT
+
+
+def _read_header(file) -> tuple:
+    # Returns the header dict and the offset of the first chunk.
+    prefix = file.read(_FILE_HEADER.size)
+    if len(prefix) < _FILE_HEADER.size:
+        raise ValueError('Not a result file, the header is incomplete.')
+    magic, version, length = _FILE_HEADER.unpack(prefix)
+    if magic != FILE_MAGIC:
+        raise ValueError('Not a result file.')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported result file version {version}, expected {FORMAT_VERSION}.')
+    header = json.loads(file.read(length).decode())
+    return header, _padded(_FILE_HEADER.size + length)
+
+
+def _scan_chunks(file, offset: int, itemsize: int) -> tuple:
+    # Returns offsets and numbers of points of complete chunks from offset on,
+    # and the offset after the last complete chunk.
+    size = os.fstat(file.fileno()).st_size
+    offsets, counts = [], []
+    while offset + _CHUNK_HEADER.size <= size:
+        file.seek(offset)
+        magic, columns, count = _CHUNK_HEADER.unpack(file.read(_CHUNK_HEADER.size))
+        if magic != CHUNK_MAGIC or columns != 2:
+            raise ValueError(f'Corrupt chunk at byte {offset}.')
+        end = offset + _CHUNK_HEADER.size + 2 * _padded(count * itemsize)
+        if end > size:
+            break
+        offsets.append(offset + _CHUNK_HEADER.size)
+        counts.append(count)
+        offset = end
+    return offsets, counts, offset
+
+
+class ResultWriter:
+    '''
+    Represents a result file that chunks of points are appended to.
+    Every appended chunk is flushed, so readers in other processes
+    see it as soon as append returns.
+    '''
+    def __init__(self, path: str, header: dict = None, dtype=np.float64) -> None:
+        '''
+        Initialize a result writer. With a header, a new file is created
+        and an existing one is replaced. Without a header, chunks are
+        appended to an existing file in its dtype, and an incomplete last
+        chunk is dropped.
+
+        :param path: str path of the result file
+        :param header: dict JSON serializable header, see simulation_header, or None
+        :param dtype: np.float64 or np.float32 dtype of new files
+        '''
+        self.path = path
+        if header is None:
+            self.file = open(path, 'r+b')
+            try:
+                self.header, offset = _read_header(self.file)
+                self.dtype = np.dtype(self.header['dtype'])
+                _, counts, end = _scan_chunks(self.file, offset, self.dtype.itemsize)
+                self.file.truncate(end)
+                self.file.seek(end)
+            except Exception:
+                self.file.close()
+                raise
+            self.n_points = sum(counts)
+            return
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float64, np.float32):
+            raise ValueError(f'Unsupported dtype {self.dtype}. Expected float64 or float32.')
+        self.header = {**header, 'dtype': self.dtype.name}
+        encoded = json.dumps(self.header).encode()
+        prefix = _FILE_HEADER.pack(FILE_MAGIC, FORMAT_VERSION, len(encoded)) + encoded
+        self.file = open(path, 'wb')
+        self.file.write(prefix.ljust(_padded(len(prefix)), b' '))
+        self.file.flush()
+        self.n_points = 0
+
+    def append(self, xs, ys) -> None:
+        '''
+        Append a chunk of points.
+
+        :param xs: np.ndarray x values
+        :param ys: np.ndarray y values of the same length
+        '''
+        xs = np.ascontiguousarray(xs, dtype=self.dtype.newbyteorder('<')).ravel()
+        ys = np.ascontiguousarray(ys, dtype=self.dtype.newbyteorder('<')).ravel()
+        if xs.size != ys.size:
+            raise ValueError(f'Columns have different lengths {xs.size} and {ys.size}.')
+        padding = b'\0' * (_padded(xs.nbytes) - xs.nbytes)
+        self.file.write(_CHUNK_HEADER.pack(CHUNK_MAGIC, 2, xs.size))
+        for column in (xs, ys):
+            self.file.write(memoryview(column).cast('B'))
+            self.file.write(padding)
+        self.file.flush()
+        self.n_points += xs.size
+
+    def close(self) -> None:
+        '''
+        Close the file.
+        '''
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ResultReader:
+    '''
+    Represents a memory-mapped result file.
+    Slices of points are read-only views of the mapped file where they
+    lie in a single chunk, so reading doesn't load the whole file.
+    Chunks appended by a writer after the file was opened are
+    picked up by refresh.
+    '''
+    def __init__(self, path: str) -> None:
+        '''
+        Open a result file and index its chunks.
+
+        :param path: str path of the result file
+        '''
+        self.path = path
+        with open(path, 'rb') as file:
+            self.header, self._next_offset = _read_header(file)
+        self.dtype = np.dtype(self.header['dtype']).newbyteorder('<')
+        self._offsets = []
+        self._counts = []
+        self._starts = np.zeros(1, dtype=np.int64)
+        self._map = None
+        self.refresh()
+
+    def refresh(self) -> int:
+        '''
+        Index chunks that were appended since the file was opened
+        or last refreshed.
+
+        :return: int number of points
+        '''
+        with open(self.path, 'rb') as file:
+            offsets, counts, self._next_offset = _scan_chunks(file, self._next_offset, self.dtype.itemsize)
+        if offsets or self._map is None:
+            self._offsets += offsets
+            self._counts += counts
+            self._starts = np.concatenate([[0], np.cumsum(self._counts, dtype=np.int64)])
+            self._map = np.memmap(self.path, dtype=np.uint8, mode='r')
+        return len(self)
+
+    def __len__(self) -> int:
+        return int(self._starts[-1])
+
+    def n_chunks(self) -> int:
+        '''
+        Get the number of complete chunks.
+
+        :return: int number of chunks
+        '''
+        return len(self._offsets)
+
+    def chunk(self, i: int) -> tuple:
+        '''
+        Get the points of a chunk.
+
+        :param i: int index of the chunk
+        :return: tuple of read-only xs (np.ndarray) and ys (np.ndarray) views
+        '''
+        offset, count = self._offsets[i], self._counts[i]
+        xs = np.frombuffer(self._map, self.dtype, count, offset)
+        ys = np.frombuffer(self._map, self.dtype, count, offset + _padded(count * self.dtype.itemsize))
+        return xs, ys
+
+    def iter_chunks(self):
+        '''
+        Generate the points of the file chunk by chunk.
+
+        :return: generator of tuples of xs (np.ndarray) and ys (np.ndarray) views
+        '''
+        for i in range(self.n_chunks()):
+            yield self.chunk(i)
+
+    def read(self, start: int = 0, stop: int = None) -> tuple:
+        '''
+        Read points start to stop (excluded). Negative indices count from
+        the end like in a slice. A slice inside of a single chunk is a view
+        of the mapped file, a slice over several chunks is copied.
+
+        :param start: int index of the first point
+        :param stop: int index after the last point, by default the end
+        :return: tuple of xs (np.ndarray) and ys (np.ndarray)
+        '''
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if stop <= start:
+            return np.empty(0, dtype=self.dtype), np.empty(0, dtype=self.dtype)
+        first = int(np.searchsorted(self._starts, start, side='right')) - 1
+        last = int(np.searchsorted(self._starts, stop, side='left')) - 1
+        pieces = []
+        for i in range(first, last + 1):
+            xs, ys = self.chunk(i)
+            chunk_start = self._starts[i]
+            pieces.append((xs[max(start - chunk_start, 0):stop - chunk_start], ys[max(start - chunk_start, 0):stop - chunk_start]))
+        if len(pieces) == 1:
+            return pieces[0]
+        return np.concatenate([xs for xs, _ in pieces]), np.concatenate([ys for _, ys in pieces])
+
+    def close(self) -> None:
+        '''
+        Unmap the file. Views read before stay valid.
+        '''
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,204 @@
+import copy
+import numpy as np
+from chaotic_maps import ChaoticMap
+
+SWEEP_ATTRIBUTES = ['a', 'b', 'c', 'd', 'x0', 'y0']
+
+class ParameterSweep:
+    '''
+    Represents a sweep of a chaotic map over many values of one of its attributes.
+    Instead of simulating a new map per value, the attribute itself becomes
+    an array, so all values are stepped together by the step_batch method
+    of the map. Orbits have shape (iterations, origins, values), which makes
+    bifurcation diagrams and per value summaries available after a single run.
+    '''
+    def __init__(
+        self,
+        chaotic_map: ChaoticMap,
+        attribute: str,
+        values,
+        iter_n: int,
+        burn_in: int = 0,
+        origins: list = None,
+        batch: bool = True
+    ) -> None:
+        '''
+        Initialize a parameter sweep.
+        The attribute is a constant the map uses, see
+        ChaoticMap.get_constants, or x0 or y0. Sweeping x0 or y0
+        moves the origin of every orbit instead of a constant.
+        Origins can be specified as a list of (x0, y0) tuples, every value
+        is then simulated from every origin. If they are not, the origin
+        of the map is used.
+        The first burn_in iterations are calculated but not kept.
+
+        :param chaotic_map: instance inheriting from the abstract ChaoticMap class
+        :param attribute: str name of the swept attribute
+        :param values: sequence of float values of the attribute
+        :param iter_n: int number of kept iterations
+        :param burn_in: int number of iterations calculated before the kept ones
+        :param origins: list of (x0, y0) tuples or None
+        :param batch: bool whether to use the step_batch method of the map
+        '''
+        if attribute not in SWEEP_ATTRIBUTES:
+            raise ValueError(f'Cannot sweep {attribute!r}. Expected one of {", ".join(SWEEP_ATTRIBUTES)}.')
+        if attribute not in ['x0', 'y0'] and attribute not in chaotic_map.get_constants():
+            raise ValueError(f'{type(chaotic_map).__name__} does not use {attribute!r}. Expected one of {", ".join(chaotic_map.get_constants() + ["x0", "y0"])}.')
+        self.chaotic_map = chaotic_map
+        self.attribute = attribute
+        self.values = np.asarray(values, dtype=float)
+        self.iter_n = iter_n
+        self.burn_in = burn_in
+        self.origins = list(origins) if origins else [(chaotic_map.x0, chaotic_map.y0)]
+        self.batch = batch
+        self.xs = None
+        self.ys = None
+
+    def run(self):
+        '''
+        Simulate all values and origins. Orbits that overflow are
+        continued as nan values.
+
+        :return: self, with xs and ys arrays of shape (iter_n, origins, values)
+        '''
+        x0s, y0s = self.get_starting_points()
+        shape = (self.iter_n, len(self.origins), len(self.values))
+        self.xs = np.empty(shape)
+        self.ys = np.empty(shape)
+        if self.has_batch_step():
+            self.run_batch(x0s, y0s)
+        else:
+            self.run_scalar(x0s, y0s)
+        return self
+
+    def get_starting_points(self):
+        '''
+        Get starting points of all orbits.
+
+        :return: tuple of np.ndarray x and y values of shape (origins, values)
+        '''
+        origins = np.asarray(self.origins, dtype=float)
+        x0s = np.repeat(origins[:, :1], len(self.values), axis=1)
+        y0s = np.repeat(origins[:, 1:], len(self.values), axis=1)
+        if self.attribute == 'x0':
+            x0s[:] = self.values
+        elif self.attribute == 'y0':
+            y0s[:] = self.values
+        return x0s, y0s
+
+    def get_map(self, value):
+        '''
+        Get a copy of the map with the swept attribute set to a value.
+        Trajectory buffers of the map are shared, not copied.
+
+        :param value: float or np.ndarray value of the attribute
+        :return: instance inheriting from the abstract ChaoticMap class
+        '''
+        chaotic_map = copy.copy(self.chaotic_map)
+        if self.attribute not in ['x0', 'y0']:
+            setattr(chaotic_map, self.attribute, value)
+        return chaotic_map
+
+    def run_batch(self, x0s, y0s) -> None:
+        '''
+        Step all orbits together, the swept attribute broadcasting over the last axis.
+
+        :param x0s: np.ndarray x values of shape (origins, values)
+        :param y0s: np.ndarray y values of shape (origins, values)
+        '''
+        step_batch = self.get_map(self.values).step_batch
+        xs, ys = x0s, y0s
+        with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+            for _ in range(self.burn_in):
+                xs, ys = step_batch(xs, ys)
+            for i in range(self.iter_n):
+                self.xs[i] = xs
+                self.ys[i] = ys
+                xs, ys = step_batch(xs, ys)
+
+    def run_scalar(self, x0s, y0s) -> None:
+        '''
+        Step every orbit on its own with the step method of the map.
+
+        :param x0s: np.ndarray x values of shape (origins, values)
+        :param y0s: np.ndarray y values of shape (origins, values)
+        '''
+        for j, value in enumerate(self.values):
+            step = self.get_map(float(value)).step
+            for k in range(len(self.origins)):
+                x, y = float(x0s[k, j]), float(y0s[k, j])
+                for i in range(-self.burn_in, self.iter_n):
+                    if i >= 0:
+                        self.xs[i, k, j] = x
+                        self.ys[i, k, j] = y
+                    try:
+                        x, y = step(x, y)
+                    except (OverflowError, ValueError, ZeroDivisionError):
+                        x, y = float('nan'), float('nan')
+
+    def bifurcation_points(self, axis: str = 'x'):
+        '''
+        Get points of a bifurcation diagram, values of the swept attribute
+        against x or y values of the kept iterations. Points of diverged
+        orbits are dropped. Points can be plotted as they are or added
+        to a density.DensityAccumulator.
+
+        :param axis: str 'x' or 'y'
+        :return: tuple of np.ndarray attribute values and coordinates
+        '''
+        coordinates = self.xs if axis == 'x' else self.ys
+        values = np.broadcast_to(self.values, coordinates.shape)
+        finite = np.isfinite(coordinates)
+        return values[finite], coordinates[finite]
+
+    def summary(self, tolerance: float = 1e-6, max_period: int = 64) -> dict:
+        '''
+        Summarize the kept iterations of every value of the swept attribute
+        over all of its origins.
+
+        :param tolerance: float distance under which points are equal, see period
+        :param max_period: int longest detected period, see period
+        :return: dict of np.ndarray with one entry per value:
+            mean_x, mean_y, std_x, std_y, min_x, max_x, min_y, max_y,
+            diverged (fraction of orbits that diverged) and period
+        '''
+        xs = self.xs.reshape(-1, len(self.values))
+        ys = self.ys.reshape(-1, len(self.values))
+        summary = {'values': self.values}
+        with np.errstate(over='ignore', invalid='ignore'):
+            for name, coordinates in [('x', xs), ('y', ys)]:
+                masked = np.ma.masked_invalid(coordinates)
+                summary[f'mean_{name}'] = masked.mean(axis=0).filled(np.nan)
+                summary[f'std_{name}'] = masked.std(axis=0).filled(np.nan)
+                summary[f'min_{name}'] = masked.min(axis=0).filled(np.nan)
+                summary[f'max_{name}'] = masked.max(axis=0).filled(np.nan)
+        last = np.isfinite(self.xs[-1]) & np.isfinite(self.ys[-1])
+        summary['diverged'] = 1 - last.mean(axis=0)
+        summary['period'] = self.period(tolerance, max_period)
+        return summary
+
+    def period(self, tolerance: float = 1e-6, max_period: int = 64):
+        '''
+        Estimate the period of the orbits of every value of the swept attribute.
+        The period is the smallest p for which the last point of every orbit
+        is within tolerance of the point p iterations before it.
+        Values whose orbits are chaotic, diverged or have a longer period get 0.
+
+        :param tolerance: float distance under which points are equal
+        :param max_period: int longest detected period
+        :return: np.ndarray of int periods
+        '''
+        periods = np.zeros(len(self.values), dtype=int)
+        with np.errstate(invalid='ignore'):
+            for p in range(min(max_period, self.iter_n - 1), 0, -1):
+                distance = np.hypot(self.xs[-1] - self.xs[-1 - p], self.ys[-1] - self.ys[-1 - p])
+                periods[np.all(distance <= tolerance, axis=0)] = p
+        return periods
+
+    def has_batch_step(self) -> bool:
+        '''
+        Check whether all values can be stepped together.
+
+        :return: bool
+        '''
+        return self.batch and callable(getattr(self.chaotic_map, 'step_batch', None))
@@ -0,0 +1,89 @@
+from unittest import TestCase, skipIf
+from animation import parse_keyframe, interpolate, make_frame_jobs, iter_frames, render_frame, export_animation, open_writer, GifWriter
+from PIL import Image
+import numpy as np
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+class TestAnimation(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_parse_keyframe(self):
+        self.assertEqual(parse_keyframe('a=0.5,b=-1'), {'a': 0.5, 'b': -1.0})
+        with self.assertRaises(ValueError):
+            parse_keyframe('k=1')
+        with self.assertRaises(ValueError):
+            parse_keyframe('a=1,b')
+
+    def test_interpolate(self):
+        frames = interpolate([{'a': 0}, {'a': 1}, {'a': 3}], 5)
+        self.assertEqual([frame['a'] for frame in frames], [0, 0.5, 1, 2, 3])
+        self.assertEqual(interpolate([{'a': 2}], 2), [{'a': 2}, {'a': 2}])
+        with self.assertRaises(ValueError):
+            interpolate([{'a': 0}, {'b': 1}], 2)
+        with self.assertRaises(ValueError):
+            interpolate([], 2)
+
+    def test_make_frame_jobs(self):
+        jobs = make_frame_jobs('Clifford Attractor', [{'a': -1.4}, {'a': -1.8}], 3, 100, 8, 8)
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(jobs[1]['values'], {'a': -1.6})
+        self.assertEqual(len({job['bounds'] for job in jobs}), 1)
+        jobs = make_frame_jobs('Clifford Attractor', [{'a': -1.4}], 1, 100, 8, 8, bounds=(-1, 1, -1, 1))
+        self.assertEqual(jobs[0]['bounds'], (-1, 1, -1, 1))
+        with self.assertRaises(ValueError):
+            make_frame_jobs('Clifford Attractor', [{'xmin': 0}], 2, 100, 8, 8, bounds=(-1, 1, -1, 1))
+        with self.assertRaises(ValueError):
+            make_frame_jobs('Standard Map', [{'b': 0}, {'b': 1}], 2, 100, 8, 8, bounds=(-1, 1, -1, 1))
+        with self.assertRaises(ValueError):
+            make_frame_jobs('Unknown Map', [{'a': 0}], 2, 100, 8, 8)
+
+    def test_iter_frames_in_order(self):
+        jobs = make_frame_jobs('Ikeda Map', [{'a': 0.6}, {'a': 0.9}], 5, 500, 24, 16)
+        frames = list(iter_frames(jobs, workers=2, in_flight=2))
+        self.assertEqual(len(frames), 5)
+        for job, frame in zip(jobs, frames):
+            self.assertEqual(frame.shape, (16, 24))
+            self.assertEqual(frame.dtype, np.uint8)
+            np.testing.assert_array_equal(frame, render_frame(job))
+
+    def test_export_gif(self):
+        jobs = make_frame_jobs('Clifford Attractor', [{'a': -1.4}, {'a': -1.8}], 4, 1000, 32, 16)
+        path = os.path.join(self.directory.name, 'out', 'clifford.gif')
+        self.assertEqual(export_animation(jobs, path, fps=10, workers=1), 4)
+        with Image.open(path) as image:
+            self.assertEqual(image.n_frames, 4)
+            self.assertEqual(image.size, (32, 16))
+            self.assertEqual(image.info['duration'], 100)
+            for i, job in enumerate(jobs):
+                image.seek(i)
+                np.testing.assert_array_equal(np.asarray(image.convert('L')), render_frame(job))
+
+    def test_gif_writer_rejects_other_sizes(self):
+        with GifWriter(os.path.join(self.directory.name, 'sizes.gif')) as writer:
+            writer.write(np.zeros((4, 4), dtype=np.uint8))
+            with self.assertRaises(ValueError):
+                writer.write(np.zeros((4, 5), dtype=np.uint8))
+
+    def test_open_writer(self):
+        with self.assertRaises(ValueError):
+            open_writer(os.path.join(self.directory.name, 'out.avi'))
+
+    @skipIf(shutil.which('ffmpeg') is None, 'ffmpeg is not installed')
+    def test_export_mp4(self):
+        jobs = make_frame_jobs('Clifford Attractor', [{'a': -1.4}, {'a': -1.8}], 3, 1000, 31, 16)
+        path = os.path.join(self.directory.name, 'clifford.mp4')
+        self.assertEqual(export_animation(jobs, path, workers=2), 3)
+        self.assertGreater(os.path.getsize(path), 0)
+
+    def test_does_not_import_qt(self):
+        code = 'import sys, animation; sys.exit("PyQt5" in sys.modules or "pyqtgraph" in sys.modules)'
+        directory = os.path.dirname(os.path.abspath(__file__))
+        self.assertEqual(subprocess.run([sys.executable, '-c', code], cwd=directory).returncode, 0)
@@ -0,0 +1,59 @@
+from unittest import TestCase
+from batch_render import parse_param, make_jobs, job_file_name, render_jobs
+from PIL import Image
+import os
+import subprocess
+import sys
+import tempfile
+
+class TestBatchRender(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_parse_param(self):
+        self.assertEqual(parse_param('a=0.5'), ('a', [0.5]))
+        self.assertEqual(parse_param('b=1,2'), ('b', [1.0, 2.0]))
+        self.assertEqual(parse_param('x0=0:1:3'), ('x0', [0.0, 0.5, 1.0]))
+        with self.assertRaises(ValueError):
+            parse_param('k=1')
+        with self.assertRaises(ValueError):
+            parse_param('a')
+
+    def test_make_jobs(self):
+        jobs = make_jobs('Clifford Attractor', [('a', [-2, -1]), ('b', [1, 2, 3])], 100, 8, 8, self.directory.name)
+        self.assertEqual(len(jobs), 6)
+        self.assertEqual(jobs[1]['values'], {'a': -2, 'b': 2})
+        with self.assertRaises(ValueError):
+            make_jobs('Clifford Attractor', [('xmin', [0])], 100, 8, 8, self.directory.name)
+        for map_name, name in [('Gingerbread Map', 'a'), ('Ikeda Map', 'b'), ('Bogdanov Map', 'd'), ('Ikeda Map', 'x0')]:
+            with self.assertRaises(ValueError):
+                make_jobs(map_name, [(name, [0])], 100, 8, 8, self.directory.name)
+        with self.assertRaises(ValueError):
+            make_jobs('Unknown Map', [], 100, 8, 8, self.directory.name)
+
+    def test_job_file_name(self):
+        self.assertEqual(job_file_name('Gumowski-Mira Attractor', {'a': -0.2, 'b': 1.0}), 'gumowski_mira_attractor_a=-0.2_b=1.png')
+        self.assertEqual(job_file_name('Ikeda Map', {'a': 1e-20}), 'ikeda_map_a=1e-20.png')
+
+    def test_close_values_get_own_files(self):
+        jobs = make_jobs('Clifford Attractor', [('b', [0.9, 0.9000001])], 100, 10, 10, 'out')
+        self.assertEqual(len({job['path'] for job in jobs}), 2)
+        with self.assertRaises(ValueError):
+            make_jobs('Clifford Attractor', [('b', [0.9, 0.9])], 100, 10, 10, 'out')
+
+    def test_render_jobs(self):
+        jobs = make_jobs('Ikeda Map', [('a', [0.8, 0.9])], 1000, 32, 16, os.path.join(self.directory.name, 'out'))
+        paths = render_jobs(jobs, workers=2)
+        self.assertEqual(len(paths), 2)
+        with Image.open(paths[0]) as image:
+            self.assertEqual(image.size, (32, 16))
+            self.assertEqual(image.mode, 'L')
+        self.assertEqual(render_jobs(jobs, workers=1, skip_existing=True), [])
+
+    def test_does_not_import_qt(self):
+        code = 'import sys, batch_render; sys.exit("PyQt5" in sys.modules or "pyqtgraph" in sys.modules)'
+        directory = os.path.dirname(os.path.abspath(__file__))
+        self.assertEqual(subprocess.run([sys.executable, '-c', code], cwd=directory).returncode, 0)
@@ -0,0 +1,47 @@
+from unittest import TestCase
+from chaotic_maps import IkedaMap, CliffordAttractor
+from benchmarks import run_kernel_benchmarks, run_precision_comparison, compare_results, get_sim_range, total_variation
+import numpy as np
+
+class TestBenchmarks(TestCase):
+    def test_run_kernel_benchmarks(self):
+        records = run_kernel_benchmarks([200], [1], ['scalar', 'batch'], {'Ikeda Map': IkedaMap}, repeat=1)
+        self.assertEqual([record['name'] for record in records], [
+            'Ikeda Map|single|scalar|iter_n=200|density=None',
+            'Ikeda Map|in_range|scalar|iter_n=200|density=1',
+            'Ikeda Map|in_range|batch|iter_n=200|density=1'
+        ])
+        self.assertEqual(records[0]['points'], 201)
+        self.assertEqual(records[1]['points'], 3 * 144)
+        self.assertTrue(all(record['points_per_second'] > 0 for record in records))
+
+    def test_get_sim_range(self):
+        self.assertEqual(get_sim_range(IkedaMap(), 2), (-3, 3, -3, 3, 0.25))
+        xmin, xmax, ymin, ymax, step_size = get_sim_range(CliffordAttractor(), 1)
+        self.assertAlmostEqual(xmin, -0.1)
+        self.assertAlmostEqual(ymax, 0.3)
+
+    def test_compare_results(self):
+        baseline = [{'name': 'a', 'points_per_second': 100}, {'name': 'b', 'points_per_second': 100}]
+        results = [
+            {'name': 'a', 'points_per_second': 80},
+            {'name': 'b', 'points_per_second': 50},
+            {'name': 'c', 'points_per_second': 1}
+        ]
+        regressions = compare_results(results, baseline, tolerance=0.25)
+        self.assertEqual([regression['name'] for regression in regressions], ['b'])
+        self.assertAlmostEqual(regressions[0]['ratio'], 0.5)
+
+    def test_run_precision_comparison(self):
+        records = run_precision_comparison({'Ikeda Map': IkedaMap, 'Clifford Attractor': CliffordAttractor}, iter_n=2000, size=32)
+        self.assertEqual([record['map'] for record in records], ['Ikeda Map', 'Clifford Attractor'])
+        self.assertEqual([record['compute'] for record in records], ['float32', 'float64, rounded'])
+        for record in records:
+            self.assertEqual(record['bytes_float64'], 2 * record['bytes_float32'])
+            self.assertTrue(0 <= record['difference'] <= 1)
+            self.assertTrue(0 <= record['reference'] <= 1)
+
+    def test_total_variation(self):
+        self.assertEqual(total_variation(np.array([1, 1]), np.array([2, 2])), 0)
+        self.assertEqual(total_variation(np.array([1, 0]), np.array([0, 3])), 1)
+        self.assertAlmostEqual(total_variation(np.array([3, 1]), np.array([1, 1])), 0.25)
@@ -1,6 +1,8 @@
 from unittest import TestCase
-from chaotic_maps import TinkerbellMap, ChaoticMap, IkedaMap, BogdanovMap, GingerbreadMap, StandardMap, CliffordAttractor, GumowskiMiraAttractor
+from chaotic_maps import TinkerbellMap, ChaoticMap, IkedaMap, BogdanovMap, GingerbreadMap, StandardMap, CliffordAttractor, GumowskiMiraAttractor, Simulator, SimulationMetrics, default_maps
 from math import sin, cos
+import numpy as np
+from result_cache import ResultCache
 
 class TestChaoticMap(TestCase):
     def setUp(self) -> None:
@@ -9,6 +11,20 @@ class TestChaoticMap(TestCase):
         self.chaotic_map.reset_origin(1, 1)
         self.assertEqual(self.chaotic_map.xs[0], 1)
         self.assertEqual(self.chaotic_map.ys[0], 1)
+    def test_reserve_keeps_points(self):
+        self.chaotic_map.calculate(0)
+        self.chaotic_map.reserve(100)
+        self.assertGreaterEqual(len(self.chaotic_map.xs), 100)
+        xs, ys = self.chaotic_map.get_points()
+        self.assertEqual(len(xs), 2)
+        self.assertEqual(xs[1], 0)
+    def test_get_points_returns_views(self):
+        self.chaotic_map.reserve(10)
+        self.chaotic_map.calculate(0)
+        xs, ys = self.chaotic_map.get_points()
+        self.assertIsInstance(xs, np.ndarray)
+        self.assertIs(xs.base, self.chaotic_map.xs)
+        self.assertIs(ys.base, self.chaotic_map.ys)
 
 class TestTinkerbellMap(TestCase):
     def setUp(self):
@@ -325,3 +341,360 @@ class TestChaoticMapSetAttribute(TestCase):
         self.assertEqual(map_no_range.get_attribute('b'), 0.1)
         map_no_range.set_attribute('x0', 2.5)
         self.assertEqual(map_no_range.get_attribute('x0'), 2.5)
+
+class TestStepBatch(TestCase):
+    def test_step_batch_matches_step(self):
+        xs = np.array([-0.72, -0.1, 0.05, 0.5, 1.0])
+        ys = np.array([-0.64, 0.2, 0.05, -0.5, 1.0])
+        for map_name, Map in default_maps.items():
+            chaotic_map = Map()
+            xs_new, ys_new = chaotic_map.step_batch(xs, ys)
+            for i in range(len(xs)):
+                x, y = chaotic_map.step(float(xs[i]), float(ys[i]))
+                self.assertAlmostEqual(xs_new[i], x, msg=map_name)
+                self.assertAlmostEqual(ys_new[i], y, msg=map_name)
+
+    def test_jacobian_batch_matches_finite_differences(self):
+        xs = np.array([-0.72, -0.1, 0.05, 0.5, 1.0])
+        ys = np.array([-0.64, 0.2, 0.05, -0.5, 1.0])
+        h = 1e-6
+        for map_name, Map in default_maps.items():
+            chaotic_map = Map()
+            dx_dx, dy_dx = [(plus - minus) / (2*h) for plus, minus in zip(chaotic_map.step_batch(xs + h, ys), chaotic_map.step_batch(xs - h, ys))]
+            dx_dy, dy_dy = [(plus - minus) / (2*h) for plus, minus in zip(chaotic_map.step_batch(xs, ys + h), chaotic_map.step_batch(xs, ys - h))]
+            for derivative, expected in zip(chaotic_map.jacobian_batch(xs, ys), [dx_dx, dx_dy, dy_dx, dy_dy]):
+                np.testing.assert_allclose(np.broadcast_to(derivative, xs.shape), expected, atol=1e-6, err_msg=map_name)
+
+class TestSimulator(TestCase):
+    def test_simulate_in_range_matches_single(self):
+        sim_range = (-0.25, 0.2, -0.22, 0.2, 0.1)
+        simulator = Simulator(BogdanovMap(), 20)
+        xs, ys = simulator.simulate_in_range(sim_range)
+        x0s, y0s = simulator.grid_origins(sim_range)
+        self.assertEqual(len(x0s), 5 * 5)
+        self.assertEqual(len(xs), 21 * len(x0s))
+        # Every column of the (iterations x origins) result is one orbit.
+        lanes_xs = xs.reshape(21, -1)
+        lanes_ys = ys.reshape(21, -1)
+
+        scalar_map = BogdanovMap()
+        for lane, (x0, y0) in enumerate(zip(x0s, y0s)):
+            scalar_map.reset_origin(x0, y0)
+            for i in range(20):
+                scalar_map.calculate(i)
+            expected_xs, expected_ys = scalar_map.get_points()
+            np.testing.assert_allclose(lanes_xs[:, lane], expected_xs)
+            np.testing.assert_allclose(lanes_ys[:, lane], expected_ys)
+
+    def test_simulate_lanes_without_step_batch(self):
+        simulator = Simulator(ChaoticMap(0, 0), 3)
+        xs, ys = simulator.simulate_lanes(np.array([1.0, 2.0]), np.array([3.0, 4.0]))
+        self.assertEqual(xs.shape, (4, 2))
+        np.testing.assert_array_equal(xs, [[1, 2]] * 4)
+        np.testing.assert_array_equal(ys, [[3, 4]] * 4)
+
+    def test_parallel_pool_is_reused(self):
+        with Simulator(IkedaMap(), 5000, workers=2) as simulator:
+            first = simulator.simulate()
+            pool = simulator._resources['pool']
+            simulator.change_iter_n(10000)
+            simulator.simulate()
+            self.assertIs(simulator._resources['pool'], pool)
+            np.testing.assert_array_equal(first[0], Simulator(IkedaMap(), 5000).simulate()[0])
+        self.assertIsNone(simulator._resources['pool'])
+        self.assertIsNone(simulator._resources['shm'])
+
+    def test_simulate_single_preallocates(self):
+        simulator = Simulator(TinkerbellMap(), 1000)
+        xs, ys = simulator.simulate_single()
+        self.assertEqual(len(xs), 1001)
+        self.assertEqual(xs.dtype, np.float64)
+        self.assertEqual(len(simulator.chaotic_map.xs), 1001)
+        self.assertEqual(xs[1], 0.1**2 - 0.1**2 + 0.9*0.1 + -0.6013*0.1)
+
+    def test_simulate_in_range_parallel_matches_serial(self):
+        sim_range = (-3, 3, -3, 3, 0.5)
+        serial_xs, serial_ys = Simulator(IkedaMap(), 50).simulate_in_range(sim_range)
+        parallel_xs, parallel_ys = Simulator(IkedaMap(), 50, workers=3).simulate_in_range(sim_range)
+        np.testing.assert_array_equal(parallel_xs, serial_xs)
+        np.testing.assert_array_equal(parallel_ys, serial_ys)
+
+    def test_iter_chunks_single(self):
+        expected_xs, expected_ys = Simulator(CliffordAttractor(), 1000).simulate()
+        chunks = list(Simulator(CliffordAttractor(), 1000).iter_chunks(100))
+        self.assertTrue(all(len(xs) <= 100 for xs, ys in chunks))
+        self.assertEqual(len(chunks), 11)
+        np.testing.assert_array_equal(np.concatenate([xs for xs, ys in chunks]), expected_xs)
+        np.testing.assert_array_equal(np.concatenate([ys for xs, ys in chunks]), expected_ys)
+
+    def test_iter_chunks_multi_point(self):
+        expected_xs, expected_ys = Simulator(IkedaMap(), 5000).simulate()
+        chunks = list(Simulator(IkedaMap(), 5000).iter_chunks(500))
+        # 144 starting points fit 3 times into a chunk of 500 points.
+        self.assertTrue(all(len(xs) == 3 * 144 for xs, ys in chunks[:-1]))
+        np.testing.assert_array_equal(np.concatenate([xs for xs, ys in chunks]), expected_xs)
+        np.testing.assert_array_equal(np.concatenate([ys for xs, ys in chunks]), expected_ys)
+
+    def test_iter_chunks_smaller_than_grid(self):
+        chunks = list(Simulator(IkedaMap(), 300).iter_chunks(10))
+        self.assertEqual(len(chunks), 4)
+        self.assertTrue(all(len(xs) == 144 for xs, ys in chunks))
+
+    def test_simulate_is_idempotent(self):
+        simulator = Simulator(IkedaMap(), 5000)
+        xs, ys = simulator.simulate()
+        again_xs, again_ys = simulator.simulate()
+        self.assertEqual(simulator.iter_n, 5000)
+        self.assertEqual(len(xs), 51 * 144)
+        np.testing.assert_array_equal(again_xs, xs)
+        np.testing.assert_array_equal(again_ys, ys)
+
+    def test_simulate_resumes(self):
+        for Map in [CliffordAttractor, IkedaMap]:
+            expected_xs, expected_ys = Simulator(Map(), 20000).simulate()
+            simulator = Simulator(Map(), 5000)
+            simulator.simulate()
+            state_xs, state_ys = simulator.get_state()
+            simulator.change_iter_n(20000)
+            calls = []
+            step = simulator.chaotic_map.step
+            simulator.chaotic_map.step = lambda x, y: calls.append(1) or step(x, y)
+            xs, ys = simulator.simulate()
+            np.testing.assert_array_equal(xs, expected_xs)
+            np.testing.assert_array_equal(ys, expected_ys)
+            if Map is CliffordAttractor:
+                self.assertEqual(len(calls), 15000)
+                self.assertEqual(state_xs[0], expected_xs[5000])
+
+    def test_simulate_shorter_after_longer(self):
+        simulator = Simulator(TinkerbellMap(), 1000)
+        simulator.simulate()
+        simulator.change_iter_n(10)
+        xs, ys = simulator.simulate()
+        np.testing.assert_array_equal(xs, Simulator(TinkerbellMap(), 10).simulate()[0])
+
+    def test_simulate_restarts_after_map_change(self):
+        chaotic_map = TinkerbellMap()
+        simulator = Simulator(chaotic_map, 100)
+        simulator.simulate()
+        chaotic_map.set_attribute('a', 0.8)
+        xs, ys = simulator.simulate()
+        np.testing.assert_array_equal(xs, Simulator(TinkerbellMap(a=0.8), 100).simulate()[0])
+
+    def test_simulate_single_resumes(self):
+        simulator = Simulator(TinkerbellMap(), 10)
+        simulator.simulate_single()
+        simulator.simulate_single()
+        self.assertEqual(simulator.chaotic_map.n_points, 11)
+        simulator.change_iter_n(20)
+        xs, ys = simulator.simulate_single()
+        np.testing.assert_array_equal(xs, Simulator(TinkerbellMap(), 20).simulate()[0])
+
+    def test_simulate_single_rejects_options(self):
+        for options in [{'dtype': np.float32}, {'burn_in': 10}, {'decimate': 2}, {'escape_radius': 10}]:
+            with self.assertRaises(ValueError):
+                Simulator(TinkerbellMap(), 10, **options).simulate_single()
+
+    def test_scalar_lanes_diverge_to_nan(self):
+        simulator = Simulator(TinkerbellMap(), 100, batch=False)
+        xs, ys = simulator.simulate_lanes(np.array([0.1, 5.0]), np.array([0.1, 5.0]))
+        self.assertTrue(np.isfinite(xs[:, 0]).all())
+        self.assertTrue(np.isnan(xs[-1, 1]))
+        self.assertTrue(np.isnan(ys[-1, 1]))
+
+    def test_escape_radius_retires_lanes(self):
+        x0s, y0s = np.array([0.1, 5.0, 50.0]), np.array([0.1, 5.0, 0.0])
+        for batch in [True, False]:
+            simulator = Simulator(TinkerbellMap(), 100, batch=batch, escape_radius=10)
+            xs, ys = simulator.simulate_lanes(x0s, y0s)
+            np.testing.assert_array_equal(xs[:, 0], Simulator(TinkerbellMap(), 100).simulate_lanes(x0s, y0s)[0][:, 0])
+            # The first point beyond the radius is already dropped.
+            self.assertEqual(xs[0, 1], 5.0)
+            self.assertTrue(np.isnan(xs[1:, 1]).all())
+            self.assertTrue(np.isnan(ys[1:, 2]).all())
+
+    def test_escape_times_and_dropped_points(self):
+        bogdanov = BogdanovMap()
+        bogdanov.sim_range = [-1, 1.5, -1, 1, 0.1]
+        simulator = Simulator(bogdanov, 3000, escape_radius=10)
+        xs, ys = simulator.simulate()
+        escape_times = simulator.get_escape_times()
+        self.assertEqual(escape_times.shape, (simulator.get_origins()[0].size,))
+        self.assertTrue((escape_times > 0).any())
+        self.assertTrue((escape_times < 0).any())
+        self.assertTrue(np.all(np.hypot(xs, ys) <= 10))
+        # Every starting point keeps the points before its escape time.
+        kept = np.where(escape_times < 0, 31, escape_times)
+        self.assertEqual(len(xs), kept.sum())
+
+        chunks = list(simulator.iter_chunks(chunk_size=500))
+        np.testing.assert_array_equal(np.concatenate([chunk[0] for chunk in chunks]), xs)
+        np.testing.assert_array_equal(simulator.get_escape_times(), escape_times)
+
+        for other in [Simulator(bogdanov, 3000, escape_radius=10, batch=False), Simulator(bogdanov, 3000, escape_radius=10, workers=2)]:
+            np.testing.assert_array_equal(other.simulate()[0], xs)
+            np.testing.assert_array_equal(other.get_escape_times(), escape_times)
+
+        resumed = Simulator(bogdanov, 1000, escape_radius=10)
+        resumed.simulate()
+        resumed.change_iter_n(3000)
+        np.testing.assert_array_equal(resumed.simulate()[0], xs)
+        np.testing.assert_array_equal(resumed.get_escape_times(), escape_times)
+
+    def test_escape_times_without_radius(self):
+        simulator = Simulator(TinkerbellMap(), 100)
+        simulator.simulate_lanes(np.array([0.1]), np.array([0.1]))
+        self.assertIsNone(simulator.get_escape_times())
+        simulator.simulate()
+        np.testing.assert_array_equal(simulator.get_escape_times(), [-1])
+
+    def test_burn_in_and_decimate(self):
+        for Map, iter_n in [(CliffordAttractor, 1000), (IkedaMap, 5000)]:
+            for batch in [True, False]:
+                reference = Simulator(Map(), iter_n, batch=batch)
+                full_xs, full_ys = reference.advance(reference.get_lane_iter_n())
+                simulator = Simulator(Map(), iter_n, batch=batch, burn_in=7, decimate=3)
+                xs, ys = simulator.simulate()
+                np.testing.assert_array_equal(xs, full_xs[7::3].ravel())
+                np.testing.assert_array_equal(ys, full_ys[7::3].ravel())
+                chunks = list(simulator.iter_chunks(chunk_size=100))
+                np.testing.assert_array_equal(np.concatenate([chunk[0] for chunk in chunks]), xs)
+                np.testing.assert_array_equal(simulator.simulate_lanes(*simulator.get_origins(), simulator.get_lane_iter_n())[0].ravel(), xs)
+        parallel = Simulator(IkedaMap(), 5000, burn_in=7, decimate=3, workers=2)
+        np.testing.assert_array_equal(parallel.simulate()[0], Simulator(IkedaMap(), 5000, burn_in=7, decimate=3).simulate()[0])
+
+    def test_burn_in_and_decimate_resume(self):
+        simulator = Simulator(CliffordAttractor(), 500, burn_in=100, decimate=4)
+        self.assertEqual(len(simulator.simulate()[0]), 101)
+        simulator.change_iter_n(1000)
+        xs, ys = simulator.simulate()
+        np.testing.assert_array_equal(xs, Simulator(CliffordAttractor(), 1000, burn_in=100, decimate=4).simulate()[0])
+        self.assertEqual(simulator.result_xs.shape[0], 226)
+
+    def test_shorter_than_burn_in(self):
+        simulator = Simulator(IkedaMap(), 1000, burn_in=20)
+        self.assertEqual(len(simulator.simulate()[0]), 0)
+        self.assertEqual(list(simulator.iter_chunks()), [])
+        with self.assertRaises(ValueError):
+            Simulator(IkedaMap(), 1000, decimate=0)
+        with self.assertRaises(ValueError):
+            Simulator(IkedaMap(), 1000, burn_in=-1)
+
+    def test_escape_times_with_decimate(self):
+        simulator = Simulator(TinkerbellMap(x0=5.0, y0=5.0), 100, escape_radius=100, burn_in=4, decimate=3)
+        simulator.simulate()
+        # Escapes during the burn in are reported at its end.
+        np.testing.assert_array_equal(simulator.get_escape_times(), [4])
+        simulator = Simulator(TinkerbellMap(x0=0.5, y0=0.5), 100, escape_radius=1, decimate=3)
+        xs, ys = simulator.simulate()
+        self.assertEqual(simulator.get_escape_times()[0], 3 * len(xs))
+
+    def test_float32(self):
+        for kwargs in [{}, {'workers': 2}, {'batch': False}, {'escape_radius': 100}]:
+            simulator = Simulator(IkedaMap(), 2000, dtype=np.float32, **kwargs)
+            xs, ys = simulator.simulate()
+            self.assertEqual(xs.dtype, np.float32)
+            self.assertEqual(ys.dtype, np.float32)
+            self.assertEqual(simulator.result_xs.nbytes, Simulator(IkedaMap(), 2000).advance(20)[0].nbytes // 2)
+            expected_xs, expected_ys = Simulator(IkedaMap(), 2000).simulate()
+            self.assertEqual(len(xs), len(expected_xs))
+            # Orbits part over time, but the first iterations agree to single precision.
+            np.testing.assert_allclose(xs[:144 * 3], expected_xs[:144 * 3], rtol=1e-4, atol=1e-4)
+            chunks = list(simulator.iter_chunks(chunk_size=500))
+            self.assertEqual(chunks[0][0].dtype, np.float32)
+            np.testing.assert_array_equal(np.concatenate([chunk[0] for chunk in chunks]), xs)
+        self.assertNotEqual(Simulator(IkedaMap(), 10, dtype=np.float32).cache_key(), Simulator(IkedaMap(), 10).cache_key())
+        with self.assertRaises(ValueError):
+            Simulator(IkedaMap(), 10, dtype=np.int32)
+
+    def test_has_batch_step(self):
+        self.assertFalse(Simulator(IkedaMap(), 10, batch=False).has_batch_step())
+        self.assertTrue(Simulator(IkedaMap(), 10).has_batch_step())
+        self.assertFalse(Simulator(ChaoticMap(0, 0), 10).has_batch_step())
+
+class TestGetConstants(TestCase):
+    def test_get_constants(self):
+        self.assertEqual(CliffordAttractor().get_constants(), ['a', 'b', 'c', 'd'])
+        self.assertEqual(GumowskiMiraAttractor().get_constants(), ['a', 'b'])
+        self.assertEqual(IkedaMap().get_constants(), ['a'])
+        self.assertEqual(StandardMap().get_constants(), ['a'])
+        self.assertEqual(GingerbreadMap().get_constants(), [])
+
+    def test_get_parameters(self):
+        self.assertEqual(GumowskiMiraAttractor().get_parameters(), ['a', 'b', 'xmin', 'xmax', 'ymin', 'ymax', 'step_size'])
+        self.assertEqual(CliffordAttractor().get_parameters(), ['a', 'b', 'c', 'd', 'x0', 'y0'])
+
+class TestSimulationMetrics(TestCase):
+    def test_metrics_off_by_default(self):
+        self.assertIsNone(Simulator(IkedaMap(), 100).metrics)
+
+    def test_simulate_metrics(self):
+        simulator = Simulator(IkedaMap(), 5000, metrics=True)
+        xs, ys = simulator.simulate()
+        metrics = simulator.metrics.as_dict()
+        self.assertEqual(metrics['iterations'], 50 * 144)
+        self.assertEqual(metrics['points'], len(xs))
+        self.assertEqual(metrics['peak_buffer_bytes'], 2 * 51 * 144 * 8)
+        self.assertEqual(metrics['diverged'], 0)
+        self.assertGreater(metrics['iterations_per_second'], 0)
+        self.assertGreater(metrics['wall_seconds'], 0)
+        self.assertEqual(set(metrics['phase_seconds']), {'grid_setup', 'allocate', 'step'})
+
+    def test_diverged(self):
+        chaotic_map = TinkerbellMap()
+        chaotic_map.is_multi_point_sim = True
+        chaotic_map.default_range = (-3, 3, -3, 3, 1)
+        simulator = Simulator(chaotic_map, 10000, metrics=True)
+        simulator.simulate()
+        self.assertGreater(simulator.metrics.diverged, 0)
+        self.assertLess(simulator.metrics.diverged, 36)
+
+    def test_diverged_adds_up(self):
+        chaotic_map = TinkerbellMap()
+        chaotic_map.is_multi_point_sim = True
+        chaotic_map.default_range = (-3, 3, -3, 3, 1)
+        cache = ResultCache()
+        simulator = Simulator(chaotic_map, 10000, metrics=True, cache=cache)
+        simulator.simulate()
+        diverged = simulator.metrics.diverged
+        simulator.simulate()
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(simulator.metrics.diverged, diverged)
+        simulator.change_iter_n(20000)
+        simulator.simulate()
+        self.assertEqual(simulator.metrics.diverged, int(np.count_nonzero(simulator.get_escape_times() >= 0)))
+
+    def test_diverged_counts_new_escapes_only(self):
+        simulator = Simulator(BogdanovMap(), 1000, metrics=True, escape_radius=0.5)
+        simulator.simulate()
+        diverged = simulator.metrics.diverged
+        self.assertGreater(diverged, 0)
+        simulator.simulate()
+        self.assertEqual(simulator.metrics.diverged, diverged)
+        simulator.change_iter_n(2000)
+        simulator.simulate()
+        self.assertEqual(simulator.metrics.diverged, int(np.count_nonzero(simulator.get_escape_times() >= 0)))
+
+    def test_iter_chunks_metrics_and_callbacks(self):
+        simulator = Simulator(CliffordAttractor(), 1000, metrics=True)
+        events = []
+        simulator.add_callback('start', lambda simulator: events.append('start'))
+        simulator.add_callback('chunk', lambda simulator, xs, ys: events.append(len(xs)))
+        simulator.add_callback('finish', lambda simulator: events.append('finish'))
+        for xs, ys in simulator.iter_chunks(500):
+            pass
+        self.assertEqual(events, ['start', 500, 500, 1, 'finish'])
+        self.assertEqual(simulator.metrics.points, 1001)
+        self.assertEqual(simulator.metrics.iterations, 1000)
+
+    def test_unknown_event(self):
+        with self.assertRaises(ValueError):
+            Simulator(IkedaMap(), 10).add_callback('plot', print)
+
+    def test_reset(self):
+        metrics = SimulationMetrics()
+        with metrics.measure('step'):
+            metrics.iterations += 10
+        metrics.reset()
+        self.assertEqual(metrics.as_dict()['iterations'], 0)
+        self.assertEqual(metrics.phase_seconds, {})
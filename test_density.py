@@ -0,0 +1,95 @@
+from unittest import TestCase
+from chaotic_maps import Simulator, CliffordAttractor, IkedaMap, BogdanovMap
+from density import DensityAccumulator, accumulate, to_grayscale, escape_time_image
+from result_cache import ResultCache
+import numpy as np
+
+class TestDensityAccumulator(TestCase):
+    def setUp(self):
+        self.accumulator = DensityAccumulator(4, 2, (0, 4, 0, 2))
+
+    def test_add(self):
+        self.accumulator.add(np.array([0.5, 0.5, 3.5]), np.array([0.5, 0.5, 1.5]))
+        self.assertEqual(self.accumulator.counts[0, 0], 2)
+        self.assertEqual(self.accumulator.counts[3, 1], 1)
+        self.assertEqual(self.accumulator.counts.sum(), 3)
+        self.assertEqual(self.accumulator.n_points, 3)
+
+    def test_add_drops_outside_and_non_finite(self):
+        self.accumulator.add(np.array([-1, 5, np.nan, np.inf, 1]), np.array([1, 1, 1, 1, 1]))
+        self.assertEqual(self.accumulator.n_points, 1)
+        self.assertEqual(self.accumulator.counts[1, 1], 1)
+
+    def test_image(self):
+        self.accumulator.add(np.array([0.5, 0.5, 3.5]), np.array([0.5, 0.5, 1.5]))
+        image = self.accumulator.image()
+        self.assertEqual(image.shape, (4, 2))
+        self.assertEqual(image[0, 0], 1)
+        self.assertAlmostEqual(image[3, 1], np.log(2) / np.log(3))
+        self.assertEqual(image[1, 0], 0)
+
+    def test_bounds_from_first_chunk(self):
+        accumulator = DensityAccumulator(8, 8)
+        accumulator.add(np.linspace(-1, 1, 1001), np.linspace(0, 2, 1001))
+        xmin, xmax, ymin, ymax = accumulator.bounds
+        self.assertLess(xmin, -0.9)
+        self.assertGreater(xmax, 0.9)
+        self.assertLess(ymin, 0.1)
+        self.assertGreater(ymax, 1.9)
+
+    def test_to_grayscale(self):
+        self.accumulator.add(np.array([0.5, 0.5, 3.5]), np.array([0.5, 0.5, 1.5]))
+        pixels = to_grayscale(self.accumulator.image())
+        self.assertEqual(pixels.shape, (2, 4))
+        self.assertEqual(pixels.dtype, np.uint8)
+        self.assertEqual(pixels[1, 0], 0)
+        self.assertEqual(pixels[0, 1], 255)
+
+class TestAccumulate(TestCase):
+    def test_accumulate_single(self):
+        simulator = Simulator(CliffordAttractor(), 10000)
+        accumulator = accumulate(simulator, DensityAccumulator(64, 64, (-3, 3, -3, 3)), chunk_size=999)
+        self.assertEqual(accumulator.n_points, 10001)
+        expected = DensityAccumulator(64, 64, (-3, 3, -3, 3))
+        expected.add(*Simulator(CliffordAttractor(), 10000).simulate())
+        np.testing.assert_array_equal(accumulator.counts, expected.counts)
+
+    def test_accumulate_multi_point(self):
+        simulator = Simulator(IkedaMap(), 1000)
+        accumulator = accumulate(simulator, DensityAccumulator(64, 64, (-10, 10, -10, 10)), chunk_size=500)
+        # 144 starting points, 10 iterations each plus the starting points.
+        self.assertEqual(accumulator.n_points, 144 * 11)
+
+class TestEscapeTimeImage(TestCase):
+    def test_escape_time_image(self):
+        bogdanov = BogdanovMap()
+        bogdanov.sim_range = [-1, 1.5, -1, 1, 0.1]
+        simulator = Simulator(bogdanov, 3000, escape_radius=10)
+        image, bounds = escape_time_image(simulator)
+        x0s, y0s = simulator.get_origins()
+        self.assertEqual(image.size, x0s.size)
+        self.assertEqual(image[0, 0] == 1, simulator.get_escape_times()[0] < 0)
+        self.assertAlmostEqual(bounds[0], x0s.min() - 0.05)
+        self.assertAlmostEqual(bounds[3], y0s.max() + 0.05)
+        self.assertTrue(np.all((image > 0) & (image <= 1)))
+
+    def test_escape_time_image_with_cache(self):
+        cache = ResultCache()
+        Simulator(BogdanovMap(), 1000, cache=cache, escape_radius=10).simulate()
+        simulator = Simulator(BogdanovMap(), 1000, cache=cache, escape_radius=10)
+        simulator.simulate()
+        self.assertEqual(cache.stats()['hits'], 1)
+        image, _ = escape_time_image(simulator)
+        self.assertEqual(image.size, simulator.get_origins()[0].size)
+
+    def test_escape_time_image_after_sim_range_change(self):
+        bogdanov = BogdanovMap()
+        simulator = Simulator(bogdanov, 1000, escape_radius=10)
+        escape_time_image(simulator)
+        bogdanov.sim_range = [-1, 1.5, -1, 1, 0.1]
+        image, _ = escape_time_image(simulator)
+        self.assertEqual(image.shape, (25, 20))
+
+    def test_requires_multi_point_sim(self):
+        with self.assertRaises(ValueError):
+            escape_time_image(Simulator(CliffordAttractor(), 100, escape_radius=10))
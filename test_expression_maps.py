@@ -0,0 +1,126 @@
+from unittest import TestCase
+from expression_maps import ExpressionMap, parse_expression, compile_kernels, register_map
+from chaotic_maps import CliffordAttractor, GumowskiMiraAttractor, Simulator, default_maps
+import lyapunov
+import math
+import numpy as np
+import pickle
+
+CLIFFORD = ('sin(a*y) + c*cos(a*x)', 'sin(b*x) + d*cos(b*y)')
+
+class TestParseExpression(TestCase):
+    def test_valid(self):
+        for expression in ['x', '-x**2 + 1.5*y', 'a*sin(x) % 2', 'atan2(y, x) // pi', 'abs(x) - e']:
+            parse_expression(expression)
+
+    def test_invalid(self):
+        for expression in [
+            'x +', 'z', '__import__("os")', 'x.real', 'x if y else a', 'x < y', '[x]', 'sin', 'sin(x, y)',
+            'atan2(x)', 'sin(x=1)', 'print(x)', '"x"', 'lambda: x', '(x).__class__', 'sin(*[x])', 'True'
+        ]:
+            with self.assertRaises(ValueError, msg=expression):
+                parse_expression(expression)
+
+class TestExpressionMap(TestCase):
+    def test_matches_built_in_map(self):
+        expression_map = ExpressionMap(*CLIFFORD, a=-2, b=-2.4, c=1.1, d=-0.9)
+        built_in = CliffordAttractor()
+        xs = np.array([-0.72, -0.1, 0.05, 0.5, 1.0])
+        ys = np.array([-0.64, 0.2, 0.05, -0.5, 1.0])
+        np.testing.assert_allclose(expression_map.step_batch(xs, ys), built_in.step_batch(xs, ys))
+        self.assertEqual(expression_map.step(0.3, -0.2), built_in.step(0.3, -0.2))
+        for batch in [True, False]:
+            np.testing.assert_allclose(
+                Simulator(expression_map, 500, batch=batch).simulate(),
+                Simulator(built_in, 500, batch=batch).simulate()
+            )
+
+    def test_multi_point(self):
+        expression = 'a*x + 2*(1 - a)*x**2*(1 + x**2)**(-2)'
+        expression_map = ExpressionMap(
+            f'b*y + {expression}', f'{expression.replace("x", "(b*y + " + expression + ")")} - x',
+            a=-0.192, b=0.982, default_range=(-3, 3, -3, 3, 0.7)
+        )
+        self.assertTrue(expression_map.is_multi_point_sim)
+        np.testing.assert_allclose(Simulator(expression_map, 2000).simulate(), Simulator(GumowskiMiraAttractor(), 2000).simulate())
+
+    def test_kernels_are_cached(self):
+        first = ExpressionMap(*CLIFFORD)
+        second = ExpressionMap('sin(a * y)+c*cos(a*x)', 'sin(b*x) + d*cos(b*y)')
+        self.assertIs(first.batch_kernel, second.batch_kernel)
+        self.assertIs(first.scalar_kernel, compile_kernels(first.x_expression, first.y_expression)[0])
+
+    def test_scalar_errors(self):
+        expression_map = ExpressionMap('x / y', 'sqrt(x)')
+        self.assertTrue(all(math.isnan(value) for value in expression_map.step(1.0, 0.0)))
+        self.assertTrue(all(math.isnan(value) for value in expression_map.step(-1.0, 1.0)))
+        self.assertTrue(math.isnan(ExpressionMap('(-x)**0.5', 'y').step(1.0, 1.0)[0]))
+        with self.assertRaises(OverflowError):
+            ExpressionMap('exp(x)', 'y').step(1000.0, 1.0)
+
+    def test_power_tower_overflows(self):
+        expression_map = ExpressionMap('x + 9**9**9', 'y')
+        with np.errstate(over='ignore'):
+            xs, _ = expression_map.step_batch(np.zeros(3), np.zeros(3))
+        np.testing.assert_array_equal(xs, [np.inf] * 3)
+        with self.assertRaises(OverflowError):
+            expression_map.step(0.0, 0.0)
+        with self.assertRaises(ValueError):
+            ExpressionMap('x + 1' + '0' * 400, 'y')
+
+    def test_constant_expression(self):
+        expression_map = ExpressionMap('a', 'x')
+        expression_map.a = 2
+        xs, ys = expression_map.step_batch(np.zeros(3), np.zeros(3))
+        np.testing.assert_array_equal(xs, [2, 2, 2])
+
+    def test_get_constants(self):
+        self.assertEqual(ExpressionMap(*CLIFFORD).get_constants(), ['a', 'b', 'c', 'd'])
+        self.assertEqual(ExpressionMap('y - b*x', 'x').get_constants(), ['b'])
+
+    def test_pickle(self):
+        expression_map = ExpressionMap(*CLIFFORD, a=-2, b=-2.4, c=1.1, d=-0.9)
+        copy = pickle.loads(pickle.dumps(expression_map))
+        self.assertEqual(copy.step(0.3, -0.2), expression_map.step(0.3, -0.2))
+        self.assertEqual(copy.a, -2)
+
+    def test_parallel(self):
+        expression_map = ExpressionMap('a*x*(1 - x) + 0*y', 'y', a=3.7, default_range=(0.1, 0.9, 0, 0, 0.1))
+        serial = Simulator(expression_map, 200).simulate()
+        np.testing.assert_allclose(Simulator(expression_map, 200, workers=2).simulate(), serial)
+
+    def test_cache_key(self):
+        first = Simulator(ExpressionMap('x', 'y'), 10).cache_key()
+        second = Simulator(ExpressionMap('y', 'x'), 10).cache_key()
+        self.assertNotEqual(first, second)
+
+    def test_jacobian_batch(self):
+        expression_map = ExpressionMap(*CLIFFORD, a=-2, b=-2.4, c=1.1, d=-0.9)
+        xs = np.array([-0.72, -0.1, 0.05, 0.5, 1.0])
+        ys = np.array([-0.64, 0.2, 0.05, -0.5, 1.0])
+        np.testing.assert_allclose(expression_map.jacobian_batch(xs, ys), CliffordAttractor().jacobian_batch(xs, ys), atol=1e-6)
+        values = np.linspace(-2, -1, 3)
+        np.testing.assert_allclose(
+            lyapunov.lyapunov_grid(expression_map, 'a', values, 'b', values, iter_n=200),
+            lyapunov.lyapunov_grid(CliffordAttractor(), 'a', values, 'b', values, iter_n=200),
+            atol=1e-3
+        )
+
+class TestRegisterMap(TestCase):
+    def test_register_map(self):
+        self.addCleanup(default_maps.pop, 'Custom Clifford', None)
+        register_map('Custom Clifford', *CLIFFORD, a=-2, b=-2.4, c=1.1, d=-0.9)
+        chaotic_map = default_maps['Custom Clifford']()
+        self.assertIsInstance(chaotic_map, ExpressionMap)
+        self.assertEqual(chaotic_map.get_attribute('c'), 1.1)
+        with self.assertRaises(ValueError):
+            register_map('Custom Clifford', 'x', 'y')
+        register_map('Custom Clifford', 'x', 'y', replace=True)
+        self.assertEqual(default_maps['Custom Clifford']().x_expression, 'x')
+
+    def test_register_map_rejects_invalid(self):
+        with self.assertRaises(ValueError):
+            register_map('Clifford Attractor', 'x', 'y', replace=True)
+        with self.assertRaises(ValueError):
+            register_map('Invalid', 'import os', 'y')
+        self.assertNotIn('Invalid', default_maps)
@@ -0,0 +1,55 @@
+from unittest import TestCase
+from chaotic_maps import TinkerbellMap, IkedaMap, CliffordAttractor, ChaoticMap
+from lyapunov import lyapunov_grid, normalize, save_heatmap
+from PIL import Image
+import numpy as np
+import os
+import tempfile
+
+class TestLyapunovGrid(TestCase):
+    def test_known_exponents(self):
+        exponents = lyapunov_grid(TinkerbellMap(), 'a', [0.9], 'b', [-0.6013], iter_n=5000)
+        self.assertAlmostEqual(exponents[0, 0], 0.19, delta=0.03)
+        # A stable fixed point contracts by a every iteration.
+        exponents = lyapunov_grid(IkedaMap(), 'a', [0.1], 'x0', [1], iter_n=1000)
+        self.assertAlmostEqual(exponents[0, 0], np.log(0.1), delta=0.01)
+
+    def test_shape_and_tiles(self):
+        a_values = np.linspace(-2, 2, 7)
+        b_values = np.linspace(-2, 2, 5)
+        exponents = lyapunov_grid(CliffordAttractor(), 'a', a_values, 'b', b_values, iter_n=100)
+        self.assertEqual(exponents.shape, (7, 5))
+        tiled = lyapunov_grid(CliffordAttractor(), 'a', a_values, 'b', b_values, iter_n=100, tile_size=3)
+        np.testing.assert_array_equal(exponents, tiled)
+        parallel = lyapunov_grid(CliffordAttractor(), 'a', a_values, 'b', b_values, iter_n=100, tile_size=8, workers=2)
+        np.testing.assert_array_equal(exponents, parallel)
+        single = lyapunov_grid(CliffordAttractor(), 'a', [a_values[3]], 'b', [b_values[1]], iter_n=100)
+        self.assertEqual(exponents[3, 1], single[0, 0])
+
+    def test_diverged(self):
+        exponents = lyapunov_grid(TinkerbellMap(), 'a', [0.9, 1.5], 'b', [-0.6013], iter_n=200)
+        self.assertTrue(np.isfinite(exponents[0, 0]))
+        self.assertTrue(np.isnan(exponents[1, 0]))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            lyapunov_grid(TinkerbellMap(), 'a', [1], 'a', [1])
+        with self.assertRaises(ValueError):
+            lyapunov_grid(TinkerbellMap(), 'a', [1], 'step_size', [1])
+        with self.assertRaises(ValueError):
+            lyapunov_grid(ChaoticMap(0, 0), 'a', [1], 'b', [1])
+
+class TestHeatmap(TestCase):
+    def test_normalize(self):
+        image = normalize(np.array([[-2, 0], [1, np.nan]]))
+        np.testing.assert_array_equal(image, [[0, 0.5], [0.75, 0.5]])
+
+    def test_save_heatmap(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'heatmap.png')
+            save_heatmap(np.array([[1.0, -1.0, 0.0], [np.nan, 0.5, -0.5]]), path)
+            with Image.open(path) as image:
+                self.assertEqual(image.size, (2, 3))
+                self.assertEqual(image.mode, 'RGB')
+                # Bottom left pixel is exponents[0, 0], the most chaotic one.
+                self.assertEqual(image.getpixel((0, 2)), (255, 0, 0))
@@ -0,0 +1,151 @@
+from unittest import TestCase
+from chaotic_maps import Simulator, TinkerbellMap, IkedaMap
+from result_cache import ResultCache, DiskCache, key_digest
+import numpy as np
+import os
+import tempfile
+import time
+
+class TestResultCache(TestCase):
+    def setUp(self):
+        self.cache = ResultCache(max_bytes=3 * 800)
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get('a'))
+        result = self.cache.put('a', (np.zeros(50), np.ones(50)))
+        self.assertIs(self.cache.get('a'), result)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        self.assertEqual(self.cache.nbytes, 800)
+
+    def test_put_makes_read_only(self):
+        xs, ys = self.cache.put('a', (np.zeros(5), np.zeros(5)))
+        with self.assertRaises(ValueError):
+            xs[0] = 1
+
+    def test_put_keeps_arrays_of_caller_writable(self):
+        array = np.zeros(5)
+        xs, ys = self.cache.put('a', (array, array))
+        self.assertTrue(array.flags.writeable)
+        self.assertFalse(xs.flags.writeable)
+
+    def test_lru_eviction(self):
+        for key in 'abc':
+            self.cache.put(key, (np.zeros(50), np.zeros(50)))
+        self.cache.get('a')
+        self.cache.put('d', (np.zeros(50), np.zeros(50)))
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertEqual(len(self.cache), 3)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertLessEqual(self.cache.nbytes, self.cache.max_bytes)
+
+    def test_result_over_budget_not_cached(self):
+        self.cache.put('a', (np.zeros(1000),))
+        self.assertNotIn('a', self.cache)
+        self.assertEqual(self.cache.nbytes, 0)
+
+    def test_put_copies_views(self):
+        buffer = np.zeros(1000)
+        xs, = self.cache.put('a', (buffer[:10],))
+        self.assertIsNone(xs.base)
+        self.assertFalse(np.shares_memory(xs, buffer))
+        self.assertEqual(self.cache.nbytes, 80)
+        buffer[0] = 1
+        self.assertEqual(xs[0], 0)
+
+    def test_replace(self):
+        self.cache.put('a', (np.zeros(50),))
+        self.cache.put('a', (np.zeros(10),))
+        self.assertEqual(self.cache.nbytes, 80)
+
+class TestSimulatorCache(TestCase):
+    def test_simulate_uses_cache(self):
+        cache = ResultCache()
+        xs, ys = Simulator(TinkerbellMap(), 1000, cache=cache).simulate()
+        cached_xs, cached_ys = Simulator(TinkerbellMap(), 1000, cache=cache).simulate()
+        self.assertIs(cached_xs, xs)
+        self.assertEqual(cache.stats()['hits'], 1)
+        Simulator(TinkerbellMap(a=0.8), 1000, cache=cache).simulate()
+        Simulator(TinkerbellMap(), 2000, cache=cache).simulate()
+        self.assertEqual(cache.stats()['misses'], 3)
+
+    def test_cached_single_result_is_a_copy(self):
+        cache = ResultCache()
+        chaotic_map = TinkerbellMap()
+        xs, ys = Simulator(chaotic_map, 100, cache=cache).simulate()
+        expected = xs.copy()
+        chaotic_map.reset_origin(5, 5)
+        np.testing.assert_array_equal(xs, expected)
+
+    def test_cached_result_does_not_keep_buffers(self):
+        cache = ResultCache(10**6)
+        simulator = Simulator(IkedaMap(), 100000, cache=cache)
+        simulator.simulate()
+        simulator.change_iter_n(1000)
+        for xs, ys in [simulator.simulate(), cache.get(simulator.cache_key())]:
+            self.assertIsNone(xs.base)
+            self.assertIsNone(ys.base)
+            self.assertFalse(np.shares_memory(xs, simulator.result_xs))
+
+    def test_cache_key(self):
+        ikeda = IkedaMap()
+        key = Simulator(ikeda, 100).cache_key()
+        self.assertEqual(key[0], 'chaotic_maps.IkedaMap')
+        ikeda.set_attribute('xmin', -2)
+        self.assertNotEqual(Simulator(ikeda, 100).cache_key(), key)
+
+class TestDiskCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(self.directory.name, max_bytes=3 * 800)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get(('a', 1.0)))
+        self.cache.put(('a', 1.0), (np.arange(50.0), np.ones(50)))
+        xs, ys = self.cache.get(('a', 1.0))
+        self.assertIsInstance(xs, np.memmap)
+        np.testing.assert_array_equal(xs, np.arange(50.0))
+        with self.assertRaises(ValueError):
+            xs[0] = 1
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        self.assertEqual(self.cache.stats()['nbytes'], 800)
+
+    def test_put_keeps_arrays_of_caller_writable(self):
+        array = np.zeros(5)
+        xs, = self.cache.put(('a',), (array,))
+        self.assertTrue(array.flags.writeable)
+        self.assertFalse(xs.flags.writeable)
+
+    def test_persists_across_instances(self):
+        self.cache.put(('a',), (np.arange(5.0),))
+        other = DiskCache(self.directory.name)
+        np.testing.assert_array_equal(other.get(('a',))[0], np.arange(5.0))
+
+    def test_lru_eviction(self):
+        for i, key in enumerate('abc'):
+            self.cache.put((key,), (np.zeros(50), np.zeros(50)))
+            # Keep last use times apart on coarse file systems.
+            last_used = time.time() - 10 + i
+            os.utime(os.path.join(self.directory.name, key_digest((key,)) + '.json'), (last_used, last_used))
+        self.cache.get(('a',))
+        self.cache.put(('d',), (np.zeros(50), np.zeros(50)))
+        self.assertIn(('a',), self.cache)
+        self.assertNotIn(('b',), self.cache)
+        self.assertEqual(len(self.cache), 3)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertEqual(len(os.listdir(self.directory.name)), 3 * 3)
+
+    def test_key_digest_by_value(self):
+        self.assertEqual(key_digest(('a', 0, np.float64(0.5))), key_digest(('a', 0.0, 0.5)))
+        self.assertNotEqual(key_digest(('a', 0.5)), key_digest(('a', 0.25)))
+
+    def test_simulate_uses_disk_cache(self):
+        xs, ys = Simulator(IkedaMap(), 1000, cache=DiskCache(self.directory.name)).simulate()
+        cached_xs, cached_ys = Simulator(IkedaMap(), 1000, cache=DiskCache(self.directory.name)).simulate()
+        np.testing.assert_array_equal(cached_xs, xs)
+        self.assertIsInstance(cached_xs, np.memmap)
@@ -0,0 +1,96 @@
+from unittest import TestCase
+from chaotic_maps import Simulator, TinkerbellMap, GumowskiMiraAttractor
+from result_files import ResultWriter, ResultReader, write_simulation, simulation_header
+import numpy as np
+import os
+import tempfile
+
+class TestResultFiles(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'result.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_write_simulation(self):
+        simulator = Simulator(GumowskiMiraAttractor(), 1000)
+        n_points = write_simulation(simulator, self.path, chunk_size=200, metadata={'note': 'test'})
+        xs, ys = simulator.simulate()
+        self.assertEqual(n_points, xs.size)
+        with ResultReader(self.path) as reader:
+            self.assertEqual(len(reader), xs.size)
+            self.assertGreater(reader.n_chunks(), 1)
+            self.assertEqual(reader.header['map'], 'chaotic_maps.GumowskiMiraAttractor')
+            self.assertEqual(reader.header['lanes'], 81)
+            self.assertEqual(reader.header['constants']['a'], -0.192)
+            self.assertEqual(reader.header['note'], 'test')
+            read_xs, read_ys = reader.read()
+            np.testing.assert_array_equal(read_xs, xs)
+            np.testing.assert_array_equal(read_ys, ys)
+
+    def test_read_slices(self):
+        xs = np.arange(100, dtype=float)
+        with ResultWriter(self.path, {}) as writer:
+            for start in range(0, 100, 30):
+                writer.append(xs[start:start + 30], -xs[start:start + 30])
+            writer.append([], [])
+        with ResultReader(self.path) as reader:
+            self.assertEqual(reader.n_chunks(), 5)
+            for start, stop in [(0, 10), (25, 65), (30, 60), (95, None), (-5, None), (50, 40), (0, 1000)]:
+                read_xs, read_ys = reader.read(start, stop)
+                np.testing.assert_array_equal(read_xs, xs[start:stop])
+                np.testing.assert_array_equal(read_ys, -xs[start:stop])
+            read_xs, _ = reader.read(31, 59)
+            self.assertFalse(read_xs.flags.owndata)
+            self.assertFalse(read_xs.flags.writeable)
+
+    def test_append_while_reading(self):
+        with ResultWriter(self.path, {'map': 'test'}, np.float32) as writer:
+            writer.append(np.ones(10), np.zeros(10))
+            reader = ResultReader(self.path)
+            self.assertEqual(len(reader), 10)
+            writer.append(np.full(5, 2), np.zeros(5))
+            self.assertEqual(len(reader), 10)
+            self.assertEqual(reader.refresh(), 15)
+            self.assertEqual(reader.dtype, np.float32)
+            np.testing.assert_array_equal(reader.read(8, 12)[0], [1, 1, 2, 2])
+
+    def test_append_to_existing_file(self):
+        with ResultWriter(self.path, {'map': 'test'}, np.float32) as writer:
+            writer.append(np.arange(3), np.arange(3))
+        with ResultWriter(self.path) as writer:
+            self.assertEqual(writer.n_points, 3)
+            self.assertEqual(writer.dtype, np.float32)
+            writer.append(np.arange(3, 5), np.arange(3, 5))
+        with ResultReader(self.path) as reader:
+            np.testing.assert_array_equal(reader.read()[0], np.arange(5))
+            self.assertEqual(reader.header['map'], 'test')
+
+    def test_incomplete_chunk(self):
+        with ResultWriter(self.path, {}) as writer:
+            writer.append(np.arange(4), np.arange(4))
+            writer.append(np.arange(4), np.arange(4))
+        with open(self.path, 'r+b') as file:
+            file.truncate(os.path.getsize(self.path) - 8)
+        with ResultReader(self.path) as reader:
+            self.assertEqual(len(reader), 4)
+        with ResultWriter(self.path) as writer:
+            writer.append(np.arange(2), np.arange(2))
+        with ResultReader(self.path) as reader:
+            np.testing.assert_array_equal(reader.read()[0], [0, 1, 2, 3, 0, 1])
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'not a result file')
+        with self.assertRaises(ValueError):
+            ResultReader(self.path)
+        with self.assertRaises(ValueError):
+            ResultWriter(self.path, {}, np.int32)
+
+    def test_simulation_header(self):
+        header = simulation_header(Simulator(TinkerbellMap(), 100, escape_radius=10, burn_in=5, decimate=2))
+        self.assertEqual(header['origin'], [0.1, 0.1])
+        self.assertEqual(header['sim_range'], [])
+        self.assertEqual((header['escape_radius'], header['burn_in'], header['decimate'], header['iter_n']), (10, 5, 2, 100))
+        self.assertEqual(header['lanes'], 1)
@@ -0,0 +1,53 @@
+from unittest import TestCase
+from chaotic_maps import Simulator, CliffordAttractor, IkedaMap, TinkerbellMap, GumowskiMiraAttractor, GingerbreadMap
+from sweeps import ParameterSweep
+import numpy as np
+
+class TestParameterSweep(TestCase):
+    def test_matches_single_simulations(self):
+        values = [-2, -1.5]
+        sweep = ParameterSweep(CliffordAttractor(), 'a', values, 50).run()
+        self.assertEqual(sweep.xs.shape, (50, 1, 2))
+        for j, value in enumerate(values):
+            xs, ys = Simulator(CliffordAttractor(a=value), 49).simulate()
+            np.testing.assert_allclose(sweep.xs[:, 0, j], xs, atol=1e-9)
+            np.testing.assert_allclose(sweep.ys[:, 0, j], ys, atol=1e-9)
+
+    def test_batch_matches_scalar(self):
+        values = np.linspace(-0.5, 0.5, 7)
+        origins = [(0.1, 0.1), (1, -1)]
+        batch = ParameterSweep(GumowskiMiraAttractor(), 'a', values, 20, burn_in=5, origins=origins).run()
+        scalar = ParameterSweep(GumowskiMiraAttractor(), 'a', values, 20, burn_in=5, origins=origins, batch=False).run()
+        self.assertEqual(batch.xs.shape, (20, 2, 7))
+        np.testing.assert_allclose(batch.xs, scalar.xs, atol=1e-9)
+        np.testing.assert_allclose(batch.ys, scalar.ys, atol=1e-9)
+
+    def test_origin_sweep(self):
+        sweep = ParameterSweep(IkedaMap(y0=0.5), 'x0', [0, 1, 2], 3).run()
+        np.testing.assert_array_equal(sweep.xs[0, 0], [0, 1, 2])
+        np.testing.assert_array_equal(sweep.ys[0, 0], [0.5, 0.5, 0.5])
+
+    def test_invalid_attribute(self):
+        with self.assertRaises(ValueError):
+            ParameterSweep(IkedaMap(), 'step_size', [1], 10)
+        with self.assertRaises(ValueError):
+            ParameterSweep(IkedaMap(), 'b', [1], 10)
+        with self.assertRaises(ValueError):
+            ParameterSweep(GingerbreadMap(), 'a', [1], 10)
+
+    def test_period(self):
+        sweep = ParameterSweep(IkedaMap(), 'a', [0.1, 0.5, 0.7], 200, burn_in=2000).run()
+        periods = sweep.period()
+        self.assertEqual(periods[0], 1)
+        self.assertEqual(periods[1], 2)
+        self.assertEqual(periods[2], 0)
+
+    def test_diverged_and_bifurcation_points(self):
+        sweep = ParameterSweep(TinkerbellMap(), 'a', [0.9, 1.5], 100).run()
+        summary = sweep.summary()
+        np.testing.assert_array_equal(summary['diverged'], [0, 1])
+        self.assertTrue(np.isfinite(summary['mean_x'][0]))
+        values, xs = sweep.bifurcation_points()
+        self.assertEqual(len(values), len(xs))
+        self.assertTrue(np.all(np.isfinite(xs)))
+        self.assertEqual(np.sum(values == 0.9), 100)
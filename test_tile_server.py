@@ -0,0 +1,121 @@
+from unittest import TestCase, IsolatedAsyncioTestCase
+from tile_server import TileServer, parse_tile_request, get_tile_bounds, get_tile_iterations, render_world, NotFound, MAX_ITERATIONS, MAX_TILE_ITERATIONS
+from PIL import Image
+import asyncio
+import chaotic_maps
+import expression_maps
+import io
+import json
+import numpy as np
+
+async def fetch(port: int, target: str, method: str = 'GET') -> tuple:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'{method} {target} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    lines = head.decode().split('\r\n')
+    headers = dict(line.split(': ', 1) for line in lines[1:])
+    return int(lines[0].split()[1]), headers, body
+
+class TestTileRequests(TestCase):
+    def test_parse_tile_request(self):
+        self.assertEqual(
+            parse_tile_request('Clifford Attractor', '2', '1', '3.png', {'b': '1', 'a': '-1.5', 'iter_n': '100'}),
+            ('Clifford Attractor', (('a', -1.5), ('b', 1.0)), 100, 2, 1, 3)
+        )
+        with self.assertRaises(NotFound):
+            parse_tile_request('Unknown Map', '0', '0', '0.png', {})
+        with self.assertRaises(NotFound):
+            parse_tile_request('Clifford Attractor', '1', '2', '0.png', {})
+        with self.assertRaises(NotFound):
+            parse_tile_request('Clifford Attractor', '0', '0', 'top.png', {})
+        with self.assertRaises(ValueError):
+            parse_tile_request('Clifford Attractor', '0', '0', '0.png', {'xmin': '0'})
+        with self.assertRaises(ValueError):
+            parse_tile_request('Clifford Attractor', '0', '0', '0.png', {'a': 'one'})
+        with self.assertRaises(ValueError):
+            parse_tile_request('Ikeda Map', '0', '0', '0.png', {'b': '1'})
+        with self.assertRaises(ValueError):
+            parse_tile_request('Gingerbread Map', '0', '0', '0.png', {'a': '1'})
+        with self.assertRaises(ValueError):
+            parse_tile_request('Clifford Attractor', '0', '0', '0.png', {'iter_n': '0'})
+        with self.assertRaises(ValueError):
+            parse_tile_request('Clifford Attractor', '0', '0', '0.png', {'iter_n': str(MAX_ITERATIONS + 1)})
+
+    def test_get_tile_bounds(self):
+        self.assertEqual(get_tile_bounds((0, 4, 0, 4), 0, 0, 0), (0, 4, 0, 4))
+        self.assertEqual(get_tile_bounds((0, 4, 0, 4), 1, 1, 0), (2, 4, 2, 4))
+        self.assertEqual(get_tile_bounds((0, 4, 0, 4), 2, 0, 3), (0, 1, 0, 1))
+
+    def test_get_tile_iterations(self):
+        self.assertEqual(get_tile_iterations(1000, 0), 1000)
+        self.assertEqual(get_tile_iterations(1000, 1), 4000)
+        self.assertEqual(get_tile_iterations(1000, 10), 16000)
+        self.assertEqual(get_tile_iterations(MAX_ITERATIONS, 10), MAX_TILE_ITERATIONS)
+
+    def test_render_world_is_square(self):
+        (xmin, xmax, ymin, ymax), peak = render_world('Clifford Attractor', (), 1000)
+        self.assertAlmostEqual(xmax - xmin, ymax - ymin)
+        self.assertGreater(peak, 0)
+
+class TestTileServer(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = TileServer(port=0, workers=2)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_tile(self):
+        status, headers, body = await fetch(self.server.port, '/tiles/Clifford%20Attractor/1/0/1.png?a=-1.8&iter_n=2000')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Type'], 'image/png')
+        with Image.open(io.BytesIO(body)) as image:
+            self.assertEqual(image.size, (256, 256))
+            self.assertLess(np.asarray(image).min(), 255)
+        self.assertEqual(self.server.renders, 1)
+        _, _, cached = await fetch(self.server.port, '/tiles/Clifford%20Attractor/1/0/1.png?iter_n=2000&a=-1.8')
+        self.assertEqual(cached, body)
+        self.assertEqual(self.server.renders, 1)
+        self.assertEqual(self.server.cache.stats()['hits'], 1)
+
+    async def test_concurrent_requests_are_coalesced(self):
+        target = '/tiles/Ikeda%20Map/2/1/1.png?iter_n=5000'
+        responses = await asyncio.gather(*[fetch(self.server.port, target) for _ in range(6)])
+        self.assertEqual({status for status, _, _ in responses}, {200})
+        self.assertEqual(len({body for _, _, body in responses}), 1)
+        self.assertEqual(self.server.renders, 1)
+
+    async def test_tiles_share_scale(self):
+        bodies = await asyncio.gather(*[
+            fetch(self.server.port, f'/tiles/Clifford%20Attractor/1/{x}/{y}.png?iter_n=5000') for x in range(2) for y in range(2)
+        ])
+        images = [np.asarray(Image.open(io.BytesIO(body))) for _, _, body in bodies]
+        self.assertEqual(self.server.renders, 4)
+        # Only the densest tile reaches black.
+        self.assertLessEqual(sum(image.min() == 0 for image in images), 1)
+
+    async def test_maps(self):
+        status, headers, body = await fetch(self.server.port, '/maps')
+        self.assertEqual(status, 200)
+        maps = json.loads(body)
+        self.assertEqual(maps['Clifford Attractor']['a'], -2)
+        self.assertEqual(maps['Gumowski-Mira Attractor']['sim_range'], [-3, 3, -3, 3, 0.7])
+
+    async def test_registered_map(self):
+        expression_maps.register_map('Tile Test Map', 'sin(a*y) + c*cos(a*x)', 'sin(b*x) + d*cos(b*y)', a=-2, b=-2.4, c=1.1, d=-0.9)
+        self.addCleanup(chaotic_maps.default_maps.pop, 'Tile Test Map')
+        async with TileServer(port=0, workers=1) as server:
+            status, _, _ = await fetch(server.port, '/tiles/Tile%20Test%20Map/0/0/0.png?iter_n=2000')
+        self.assertEqual(status, 200)
+
+    async def test_errors(self):
+        port = self.server.port
+        self.assertEqual((await fetch(port, '/tiles/Unknown/0/0/0.png'))[0], 404)
+        self.assertEqual((await fetch(port, '/tiles/Ikeda%20Map/0/1/0.png'))[0], 404)
+        self.assertEqual((await fetch(port, '/tiles/Ikeda%20Map/0/0/0.png?k=1'))[0], 400)
+        self.assertEqual((await fetch(port, '/other'))[0], 404)
+        self.assertEqual((await fetch(port, '/maps', 'POST'))[0], 405)
+        self.assertEqual(self.server.renders, 0)
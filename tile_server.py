@@ -0,0 +1,410 @@
+'''
+Local HTTP server of density tiles of chaotic maps.
+
+Serves 256 x 256 PNG tiles in the z/x/y scheme of web maps, so a map
+viewer can pan and zoom over an attractor without loading its points:
+
+    py tile_server.py --port 8000
+    GET /maps
+    GET /tiles/Clifford%20Attractor/2/1/3.png?a=-1.8&b=-2.0
+
+Zoom level z splits the square around the attractor into 2^z x 2^z tiles,
+x grows to the right and y downwards. The square is fitted to a simulation
+of the map at zoom level 0. Query parameters are the parameters the map
+uses (its constants and x0, y0 or, for maps that require multi point sim,
+xmin, xmax, ymin, ymax, step_size, see ChaoticMap.get_parameters) and
+iter_n, the number of iterations at zoom level 0. Deeper tiles simulate up
+to ZOOM_ITERATIONS_FACTOR times as many iterations, at most
+MAX_TILE_ITERATIONS, and keep the points inside of them. Tiles of a zoom
+level share one density scale, so they fit together without seams.
+
+Tiles are rendered in a pool of worker processes. Concurrent requests for
+the same tile wait for a single rendering, and rendered tiles are kept in
+an LRU cache.
+'''
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import sys
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+import chaotic_maps
+import density
+import result_cache
+from animation import make_map
+
+TILE_SIZE = 256
+TILE_ITERATIONS = 100000
+ZOOM_ITERATIONS_FACTOR = 16
+# Limits of the iterations a request can ask for at zoom level 0 and of
+# a single tile, so no request can keep a worker busy for long.
+# A million scalar iterations take about a second and a half.
+MAX_ITERATIONS = 500000
+MAX_TILE_ITERATIONS = 2000000
+MAX_ZOOM = 24
+# Number of fitted squares (one per map and parameter set) that are kept.
+MAX_WORLDS = 256
+# Request heads longer than this are rejected.
+MAX_REQUEST_BYTES = 16384
+STATUS_TEXTS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class NotFound(Exception):
+    '''
+    Raised for a request of an unknown path or map.
+    '''
+
+
+def parse_tile_request(map_name: str, z: str, x: str, y: str, query: dict) -> tuple:
+    '''
+    Parse and validate the parts of a tile request.
+
+    :param map_name: str name of a map in chaotic_maps.default_maps
+    :param z: str zoom level
+    :param x: str column of the tile
+    :param y: str row of the tile, with or without a .png extension
+    :param query: dict of str query parameters
+    :return: tuple of map_name, values (tuple of sorted name and value pairs),
+        iter_n, z, x and y, usable as a cache key
+    '''
+    if map_name not in chaotic_maps.default_maps:
+        raise NotFound(f'Unknown map {map_name!r}.')
+    if y.endswith('.png'):
+        y = y[:-len('.png')]
+    try:
+        z, x, y = int(z), int(x), int(y)
+    except ValueError:
+        raise NotFound('Tile coordinates have to be integers.') from None
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2**z and 0 <= y < 2**z):
+        raise NotFound(f'Tile {z}/{x}/{y} is out of range.')
+    query = dict(query)
+    iter_n = int(query.pop('iter_n', TILE_ITERATIONS))
+    if not 1 <= iter_n <= MAX_ITERATIONS:
+        raise ValueError(f'iter_n has to be in range [1, {MAX_ITERATIONS}].')
+    parameters = chaotic_maps.default_maps[map_name]().get_parameters()
+    values = {}
+    for name, value in query.items():
+        if name not in parameters:
+            raise ValueError(f'{map_name} has no parameter {name}.')
+        values[name] = float(value)
+    return map_name, tuple(sorted(values.items())), iter_n, z, x, y
+
+
+def render_world(map_name: str, values: tuple, iter_n: int) -> tuple:
+    '''
+    Fit the square split into tiles to a simulation of a map,
+    and find the density peak of its zoom level 0 tile.
+
+    :param map_name: str name of a map in chaotic_maps.default_maps
+    :param values: tuple of parameter name and value pairs
+    :param iter_n: int number of iterations
+    :return: tuple of bounds (xmin, xmax, ymin, ymax) and int peak count
+    '''
+    xs, ys = chaotic_maps.Simulator(make_map(map_name, dict(values)), iter_n).simulate()
+    finite = np.isfinite(xs) & np.isfinite(ys)
+    xs, ys = xs[finite], ys[finite]
+    if not xs.size:
+        raise ValueError(f'All orbits of {map_name} diverged.')
+    accumulator = density.DensityAccumulator(TILE_SIZE, TILE_SIZE)
+    xmin, xmax, ymin, ymax = accumulator.fit_bounds(xs, ys)
+    half = max(xmax - xmin, ymax - ymin) / 2
+    x_center, y_center = (xmin + xmax) / 2, (ymin + ymax) / 2
+    accumulator.bounds = (x_center - half, x_center + half, y_center - half, y_center + half)
+    accumulator.add(xs, ys)
+    return accumulator.bounds, int(accumulator.counts.max())
+
+
+def get_tile_bounds(world_bounds: tuple, z: int, x: int, y: int) -> tuple:
+    '''
+    Get the bounds of a tile.
+
+    :param world_bounds: tuple of format (xmin, xmax, ymin, ymax) of zoom level 0
+    :param z: int zoom level
+    :param x: int column of the tile, from the left
+    :param y: int row of the tile, from the top
+    :return: tuple of format (xmin, xmax, ymin, ymax)
+    '''
+    xmin, xmax, ymin, ymax = world_bounds
+    width, height = (xmax - xmin) / 2**z, (ymax - ymin) / 2**z
+    return (xmin + x*width, xmin + (x + 1)*width, ymax - (y + 1)*height, ymax - y*height)
+
+
+def get_tile_iterations(iter_n: int, z: int) -> int:
+    '''
+    Get the number of iterations simulated for a tile of a zoom level,
+    at most MAX_TILE_ITERATIONS.
+
+    :param iter_n: int number of iterations at zoom level 0
+    :param z: int zoom level
+    :return: int number of iterations
+    '''
+    return min(iter_n * min(4**z, ZOOM_ITERATIONS_FACTOR), MAX_TILE_ITERATIONS)
+
+
+def render_tile(map_name: str, values: tuple, iter_n: int, world: tuple, z: int, x: int, y: int) -> bytes:
+    '''
+    Simulate a map and render the density of its points inside of a tile.
+    Counts are scaled by the count the peak of zoom level 0 is expected
+    to have in a bin of this zoom level, so all tiles of a zoom level
+    share one scale.
+
+    :param map_name: str name of a map in chaotic_maps.default_maps
+    :param values: tuple of parameter name and value pairs
+    :param iter_n: int number of iterations at zoom level 0
+    :param world: tuple of bounds and peak, see render_world
+    :param z: int zoom level
+    :param x: int column of the tile
+    :param y: int row of the tile
+    :return: bytes PNG image
+    '''
+    world_bounds, peak = world
+    tile_iter_n = get_tile_iterations(iter_n, z)
+    simulator = chaotic_maps.Simulator(make_map(map_name, dict(values)), tile_iter_n)
+    accumulator = density.DensityAccumulator(TILE_SIZE, TILE_SIZE, get_tile_bounds(world_bounds, z, x, y))
+    density.accumulate(simulator, accumulator)
+    reference = max(peak * (tile_iter_n / iter_n) / 4**z, 1)
+    image = np.log1p(accumulator.counts, dtype=float) / np.log1p(reference)
+    file = io.BytesIO()
+    Image.fromarray(density.to_grayscale(image)).save(file, format='PNG')
+    return file.getvalue()
+
+
+def _init_worker(maps: dict) -> None:
+    # Spawned workers only know the built-in maps, maps registered by
+    # expression_maps.register_map are handed over here.
+    chaotic_maps.default_maps.update(maps)
+
+
+class TileServer:
+    '''
+    Represents an asyncio HTTP server of density tiles.
+    Tiles are rendered in a pool of worker processes, concurrent requests
+    for the same tile share one rendering, and rendered tiles are kept in
+    a result_cache.ResultCache.
+    '''
+    def __init__(self, host: str = '127.0.0.1', port: int = 8000, workers: int = None, cache_bytes: int = 64 * 2**20) -> None:
+        '''
+        Initialize a tile server. It listens once it is started.
+
+        :param host: str host to listen on
+        :param port: int port to listen on, 0 for any free port
+        :param workers: int number of worker processes, None for one per CPU
+        :param cache_bytes: int maximum number of bytes of cached tiles
+        '''
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.cache = result_cache.ResultCache(cache_bytes)
+        self.renders = 0
+        self.pool = None
+        self.server = None
+        self._pending = {}
+        self._worlds = OrderedDict()
+
+    async def start(self) -> None:
+        '''
+        Start the worker processes and listen for requests.
+        If the port is 0, port is set to the chosen one.
+        Workers know the maps registered before the server was started.
+        '''
+        # Workers are spawned rather than forked: a worker forked while the
+        # server runs would inherit its threads' locks and open connections.
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(dict(chaotic_maps.default_maps),)
+        )
+        self.server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_REQUEST_BYTES)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        '''
+        Stop listening and shut the worker processes down.
+        '''
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.pool is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.pool.shutdown)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def get_tile(self, map_name: str, values: tuple, iter_n: int, z: int, x: int, y: int) -> bytes:
+        '''
+        Get a tile from the cache, from a rendering that is already
+        running, or render it.
+
+        :param map_name: str name of a map in chaotic_maps.default_maps
+        :param values: tuple of parameter name and value pairs
+        :param iter_n: int number of iterations at zoom level 0
+        :param z: int zoom level
+        :param x: int column of the tile
+        :param y: int row of the tile
+        :return: bytes PNG image
+        '''
+        key = (map_name, values, iter_n, z, x, y)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0].tobytes()
+        png = await self._share(key, lambda: self._render_tile(key))
+        return png
+
+    async def get_world(self, map_name: str, values: tuple, iter_n: int) -> tuple:
+        '''
+        Get the fitted square and density peak of a map and parameter set,
+        see render_world.
+
+        :param map_name: str name of a map in chaotic_maps.default_maps
+        :param values: tuple of parameter name and value pairs
+        :param iter_n: int number of iterations at zoom level 0
+        :return: tuple of bounds and peak
+        '''
+        key = (map_name, values, iter_n)
+        world = self._worlds.get(key)
+        if world is None:
+            loop = asyncio.get_running_loop()
+            world = await self._share(('world',) + key, lambda: loop.run_in_executor(self.pool, render_world, *key))
+            self._worlds[key] = world
+            while len(self._worlds) > MAX_WORLDS:
+                self._worlds.popitem(last=False)
+        self._worlds.move_to_end(key)
+        return world
+
+    async def _share(self, key, start):
+        # Concurrent calls with the same key await one task. The task
+        # is shielded, so a client that disconnects doesn't cancel it.
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(start())
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _render_tile(self, key: tuple) -> bytes:
+        map_name, values, iter_n, z, x, y = key
+        world = await self.get_world(map_name, values, iter_n)
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(self.pool, render_tile, map_name, values, iter_n, world, z, x, y)
+        self.renders += 1
+        self.cache.put(key, (np.frombuffer(png, dtype=np.uint8),))
+        return png
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''
+        Answer one HTTP request and close the connection.
+
+        :param reader: asyncio.StreamReader of the connection
+        :param writer: asyncio.StreamWriter of the connection
+        '''
+        try:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except asyncio.LimitOverrunError:
+                await self.respond(writer, 400, b'Request too long.')
+                return
+            except asyncio.IncompleteReadError:
+                return
+            request_line = head.split(b'\r\n', 1)[0].decode('latin-1').split()
+            if len(request_line) != 3:
+                await self.respond(writer, 400, b'Invalid request line.')
+                return
+            method, target, _ = request_line
+            if method != 'GET':
+                await self.respond(writer, 405, b'Only GET is supported.')
+                return
+            try:
+                content_type, body = await self.route(target)
+            except NotFound as error:
+                await self.respond(writer, 404, str(error).encode())
+            except ValueError as error:
+                await self.respond(writer, 400, str(error).encode())
+            except Exception as error:
+                await self.respond(writer, 500, f'{type(error).__name__}: {error}'.encode())
+            else:
+                await self.respond(writer, 200, body, content_type)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, target: str) -> tuple:
+        '''
+        Answer a request target.
+
+        :param target: str path with query
+        :return: tuple of str content type and bytes body
+        '''
+        url = urllib.parse.urlsplit(target)
+        parts = [urllib.parse.unquote(part) for part in url.path.strip('/').split('/')]
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if parts == ['maps']:
+            maps = {}
+            for map_name, Map in chaotic_maps.default_maps.items():
+                chaotic_map = Map()
+                maps[map_name] = {**chaotic_map.get_attributes(), 'sim_range': list(chaotic_map.default_range)}
+            return 'application/json', json.dumps(maps).encode()
+        if len(parts) == 5 and parts[0] == 'tiles':
+            png = await self.get_tile(*parse_tile_request(*parts[1:], query))
+            return 'image/png', png
+        raise NotFound(f'Unknown path {url.path!r}.')
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str = 'text/plain; charset=utf-8') -> None:
+        '''
+        Write an HTTP response.
+
+        :param writer: asyncio.StreamWriter of the connection
+        :param status: int HTTP status code
+        :param body: bytes body
+        :param content_type: str content type of the body
+        '''
+        head = (
+            f'HTTP/1.1 {status} {STATUS_TEXTS[status]}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Connection: close\r\n\r\n'
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(host: str, port: int, workers: int = None, cache_bytes: int = 64 * 2**20) -> None:
+    '''
+    Run a tile server until it is cancelled.
+
+    :param host: str host to listen on
+    :param port: int port to listen on
+    :param workers: int number of worker processes, None for one per CPU
+    :param cache_bytes: int maximum number of bytes of cached tiles
+    '''
+    async with TileServer(host, port, workers, cache_bytes) as server:
+        print(f'Serving tiles on http://{server.host}:{server.port}/tiles/<map>/<z>/<x>/<y>.png')
+        await server.server.serve_forever()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Serve density tiles of chaotic maps over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='host to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes, by default one per CPU')
+    parser.add_argument('--cache-mb', type=int, default=64, help='size of the tile cache in MiB')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.cache_mb * 2**20))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())